@@ -1,3 +1,130 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from donations.models import DonationClaim, DonationItem, User
+from donature import metrics, profiling
+
+TEST_METRICS_DIR = tempfile.mkdtemp(prefix="donature-test-metrics-")
+TEST_PROFILE_DIR = tempfile.mkdtemp(prefix="donature-test-profiles-")
+
+
+_test_settings = override_settings(METRICS_DIR=TEST_METRICS_DIR)
+
+
+def setUpModule():
+    _test_settings.enable()  # every request counts metrics; keep them out of BASE_DIR/var/metrics
+
+
+def tearDownModule():
+    metrics.reset()  # nothing left for the exit-time flush to write
+    _test_settings.disable()
+    shutil.rmtree(TEST_METRICS_DIR, ignore_errors=True)
+    shutil.rmtree(TEST_PROFILE_DIR, ignore_errors=True)
+
+
+@override_settings(METRICS_DIR=TEST_METRICS_DIR, METRICS_TOKEN="s3cret")
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        shutil.rmtree(TEST_METRICS_DIR, ignore_errors=True)
+        os.makedirs(TEST_METRICS_DIR)
+        metrics.reset()
+        self.admin = User.objects.create_user(username="admin", password="pass", user_type="admin")
+
+    def scrape(self, **headers):
+        return self.client.get("/panel/metrics/", headers=headers)
+
+    def test_requires_admin_or_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(Authorization="Bearer wrong").status_code, 403)
+        self.assertEqual(self.scrape(Authorization="s3cret").status_code, 403)
+        self.assertEqual(self.scrape(Authorization="Basic s3cret").status_code, 403)
+        self.assertEqual(self.scrape(Authorization="Bearer s3cret").status_code, 200)
+        self.client.force_login(self.admin)
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+    def test_request_and_business_metrics(self):
+        donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        claimant = User.objects.create_user(username="claimant", password="pass", user_type="donor/recipient")
+        item = DonationItem.objects.create(title="Chair", description="Chair", donor=donor, location="Dhaka")
+        claim = DonationClaim.objects.create(donation_item=item, claimant=claimant, message="Please")
+        claim.status = "approved"
+        claim.save()
+        claim.save()
+        self.client.get("/")
+
+        body = self.scrape(Authorization="Bearer s3cret").content.decode()
+        self.assertIn("donature_claims_created_total 1\n", body)
+        self.assertIn("donature_claims_approved_total 1\n", body)
+        self.assertIn('donature_http_requests_total{view="home",method="GET",status="200"} 1\n', body)
+        self.assertIn('donature_http_request_duration_seconds_count{view="home"} 1\n', body)
+        self.assertIn("# TYPE donature_notification_backlog gauge", body)
+
+    def test_counts_from_other_processes_are_merged(self):
+        metrics.CLAIMS_CREATED.inc()
+        other_worker = {"donature_claims_created": {json.dumps([]): 4}}
+        with open(os.path.join(TEST_METRICS_DIR, "99999.json"), "w") as f:
+            json.dump(other_worker, f)
+
+        body = self.scrape(Authorization="Bearer s3cret").content.decode()
+        self.assertIn("donature_claims_created_total 5\n", body)
+
+
+@override_settings(PROFILE_DIR=TEST_PROFILE_DIR)
+class RequestProfilerTests(TestCase):
+
+    def setUp(self):
+        shutil.rmtree(TEST_PROFILE_DIR, ignore_errors=True)
+        self.admin = User.objects.create_user(username="admin", password="pass", user_type="admin")
+
+    def test_signed_token_profiles_the_request(self):
+        response = self.client.get("/", {"_profile": profiling.make_token(self.admin)})
+        self.assertEqual(response.status_code, 200)
+        name = response["X-Profile"]
+        self.assertTrue(name.endswith(".prof"))
+        self.assertEqual([p["name"] for p in profiling.list_profiles()], [name])
+
+        self.client.force_login(self.admin)
+        summary = self.client.get(f"/panel/profiles/{name}/summary/")
+        self.assertEqual(summary.status_code, 200)
+        self.assertIn("cumulative", summary.content.decode())
+        download = self.client.get(f"/panel/profiles/{name}/")
+        self.assertEqual(download.status_code, 200)
+        self.assertIn("attachment", download["Content-Disposition"])
+
+    def test_sampling_mode_writes_folded_stacks(self):
+        response = self.client.get("/", {"_profile": profiling.make_token(self.admin, "sample")})
+        self.assertTrue(response["X-Profile"].endswith(".folded"))
+
+    def test_missing_or_forged_token_is_ignored(self):
+        self.assertNotIn("X-Profile", self.client.get("/"))
+        forged = profiling.make_token(self.admin)[:-1] + "x"
+        self.assertNotIn("X-Profile", self.client.get("/", {"_profile": forged}))
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_token_works_once_and_only_for_an_admin(self):
+        token = profiling.make_token(self.admin)
+        self.assertIn("X-Profile", self.client.get("/", {"_profile": token}))
+        self.assertNotIn("X-Profile", self.client.get("/", {"_profile": token}))
+
+        token = profiling.make_token(self.admin)
+        User.objects.filter(pk=self.admin.pk).update(user_type="donor/recipient")
+        self.assertNotIn("X-Profile", self.client.get("/", {"_profile": token}))
+
+    def test_panel_is_admin_only(self):
+        donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.client.force_login(donor)
+        self.assertEqual(self.client.get("/panel/profiles/").status_code, 403)
+
+        self.client.force_login(self.admin)
+        response = self.client.post("/panel/profiles/", {"path": "/ngos/explore-campaigns/", "mode": "sample"})
+        link = response.context["profile_link"]
+        self.assertTrue(link.startswith("/ngos/explore-campaigns/?_profile="))
+        self.assertEqual(profiling.read_token(link.split("=", 1)[1]), "sample")
+        self.assertEqual(self.client.get("/panel/profiles/../../etc/passwd/").status_code, 404)
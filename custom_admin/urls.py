@@ -55,9 +55,18 @@ urlpatterns = [
     
     # Statistics
     path('stats/', views.system_stats, name='system_stats'),
+    path('stats/performance/', views.performance_stats, name='performance_stats'),
+    path('metrics/', views.metrics_endpoint, name='metrics'),
+    path('profiles/', views.request_profiles, name='request_profiles'),
+    path('profiles/<str:filename>/', views.download_profile, name='download_profile'),
+    path('profiles/<str:filename>/summary/', views.profile_summary, name='profile_summary'),
 
     # Contact Messages
     path('contact-messages/', views.contact_messages, name='contact_messages'),
 
     path('rewards/', views.manage_rewards, name='manage_rewards'),
+
+    # Annual statements
+    path('statements/', views.donation_statements, name='donation_statements'),
+    path('statements/<str:filename>/', views.download_statements, name='download_statements'),
 ]
@@ -1,8 +1,11 @@
+import hmac
+import os
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.forms import PasswordChangeForm
 from django.utils import timezone
 from django.db.models import Count, Q
@@ -10,6 +13,10 @@ from donations.models import (
     User, RequestItem, Category, DonationItem, DonationClaim, DonationReview, Notification, ContactMessage,Reward, UserReward
 )
 from ngos.models import Campaign, NGOProfile, CampaignCategory
+from ngos import statements
+from donations import tasks
+from donature import metrics, perf, profiling
+from donature.db_router import replica_reads
 from datetime import timedelta
 from donations.models import DonationReview
 from django.urls import reverse
@@ -24,6 +31,7 @@ def admin_only(view_func):
 
 @login_required
 @admin_only
+@replica_reads
 def admin_dashboard(request):
     # Basic stats
     total_users = User.objects.count()
@@ -73,18 +81,21 @@ def admin_context(request):
 
 @login_required
 @admin_only
+@replica_reads
 def manage_users(request):
     users = User.objects.exclude(user_type="admin")
     return render(request, "custom_admin/manage_users.html", {"users": users})
 
 @login_required
 @admin_only
+@replica_reads
 def manage_ngos(request):
     ngos = User.objects.filter(user_type="ngo")
     return render(request, "custom_admin/manage_ngos.html", {"ngos": ngos})
 
 @login_required
 @admin_only
+@replica_reads
 def manage_donations(request):
     # Show both old and new donation systems
     old_donations = DonationItem.objects.all()
@@ -97,18 +108,21 @@ def manage_donations(request):
 
 @login_required
 @admin_only
+@replica_reads
 def manage_donation_claims(request):
     claims = DonationClaim.objects.all().select_related('donation_item', 'claimant')
     return render(request, "custom_admin/manage_donation_claims.html", {"claims": claims})
 
 @login_required
 @admin_only
+@replica_reads
 def manage_campaigns(request):
     campaigns = Campaign.objects.all()
     return render(request, "custom_admin/manage_campaigns.html", {"campaigns": campaigns})
 
 @login_required
 @admin_only
+@replica_reads
 def manage_categories(request):
     categories = Category.objects.all().annotate(
         donation_count=Count('donationitem')
@@ -117,12 +131,14 @@ def manage_categories(request):
 
 @login_required
 @admin_only
+@replica_reads
 def manage_admins(request):
     admins = User.objects.filter(user_type="admin")
     return render(request, "custom_admin/manage_admins.html", {"admins": admins})
 
 @login_required
 @admin_only
+@replica_reads
 def manage_reviews(request):
     reviews = DonationReview.objects.all().select_related('donation_item', 'claimant')
     return render(request, "custom_admin/manage_reviews.html", {"reviews": reviews})
@@ -426,6 +442,7 @@ def create_edit_category(request, category_id=None):
 
 @login_required
 @admin_only
+@replica_reads
 def system_stats(request):
     # Detailed statistics
     today = timezone.now().date()
@@ -568,3 +585,101 @@ def manage_rewards(request):
         return redirect('manage_rewards')
 
     return render(request, "custom_admin/manage_rewards.html", {"rewards": rewards})
+
+
+@login_required
+@admin_only
+def donation_statements(request):
+    if request.method == "POST":
+        try:
+            year = int(request.POST.get("year", ""))
+        except ValueError:
+            year = None
+        kind = request.POST.get("kind", "all")
+        if year is None or kind not in (*statements.KINDS, "all"):
+            messages.error(request, "Choose a valid year and statement type.")
+        elif os.path.exists(statements.archive_path(year, kind) + ".part"):
+            messages.info(request, f"Statements for {year} are already being generated.")
+        else:
+            tasks.submit(statements.generate_year, year, kind)
+            messages.success(request, f"Generating {kind} statements for {year}. Refresh this page to download the archive.")
+        return redirect('donation_statements')
+
+    return render(request, 'custom_admin/donation_statements.html', {
+        'archives': statements.list_archives(),
+        'default_year': timezone.now().year - 1,
+        'kinds': (*statements.KINDS, "all"),
+    })
+
+
+@login_required
+@admin_only
+def download_statements(request, filename):
+    archive = next((a for a in statements.list_archives() if a["name"] == filename), None)
+    if archive is None:
+        raise Http404("Archive not found")
+    path = os.path.join(settings.STATEMENT_OUTPUT_DIR, archive["name"])
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=archive["name"], content_type="application/zip")
+
+
+@login_required
+@admin_only
+def performance_stats(request):
+    """Per-URL-name latency histograms collected by PerformanceMiddleware in this process."""
+    return JsonResponse(perf.latency_snapshot())
+
+
+def _metrics_response():
+    return HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@admin_only
+def _admin_metrics(request):
+    return _metrics_response()
+
+
+def metrics_endpoint(request):
+    """Prometheus scrape target: a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``, or an admin."""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if token and scheme.lower() == "bearer" and hmac.compare_digest(credentials.strip().encode(), token.encode()):
+        return _metrics_response()
+    return _admin_metrics(request)
+
+
+@login_required
+@admin_only
+def request_profiles(request):
+    profile_link = None
+    if request.method == "POST":
+        path = request.POST.get("path", "").strip()
+        mode = request.POST.get("mode", "cprofile")
+        if not path.startswith("/") or path.startswith("//") or mode not in profiling.MODES:
+            messages.error(request, "Enter a site path starting with / and choose a profiler.")
+        else:
+            separator = "&" if "?" in path else "?"
+            profile_link = f"{path}{separator}{profiling.TOKEN_PARAM}={profiling.make_token(request.user, mode)}"
+
+    return render(request, 'custom_admin/request_profiles.html', {
+        'profiles': profiling.list_profiles(),
+        'profile_link': profile_link,
+        'modes': profiling.MODES,
+        'token_minutes': settings.PROFILER_TOKEN_MAX_AGE // 60,
+    })
+
+
+@login_required
+@admin_only
+def download_profile(request, filename):
+    path = profiling.profile_path(filename)
+    if path is None:
+        raise Http404("Profile not found")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=filename)
+
+
+@login_required
+@admin_only
+def profile_summary(request, filename):
+    if not filename.endswith(".prof") or profiling.profile_path(filename) is None:
+        raise Http404("Profile not found")
+    return HttpResponse(profiling.summary(filename), content_type="text/plain; charset=utf-8")
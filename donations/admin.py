@@ -4,15 +4,22 @@ from .models import ContactMessage
 # Register your models here.
 
 from django.contrib import admin
-from .models import Notification
+from .models import ArchivedNotification, Notification
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ("user", "message", "is_read", "created_at")
+    list_display = ("user", "message", "occurrences", "is_read", "created_at")
     list_filter = ("is_read", "created_at")
     search_fields = ("user__username", "message")
 
 
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ("user", "message", "occurrences", "created_at", "archived_at")
+    list_filter = ("created_at",)
+    search_fields = ("user__username", "message")
+
+
 
 
 
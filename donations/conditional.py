@@ -0,0 +1,97 @@
+# donations/conditional.py
+"""
+Conditional GET for detail pages.
+
+``@conditional_page(validators)`` wraps Django's ``condition`` decorator:
+``validators(request, *args, **kwargs)`` returns ``(parts, last_modified)``
+from a few cheap aggregate queries (or None to skip, e.g. for an unknown id),
+and a matching If-None-Match / If-Modified-Since gets a 304 before the view
+queries or renders anything.
+
+Pages show the visitor's navbar (notifications, unread count), so for logged-in
+users the ETag also covers their notification state and no Last-Modified is
+sent. Every page carries a CSRF token derived from the visitor's CSRF secret, so
+the ETag covers (a hash of) that secret too: a browser whose cookie was rotated
+gets a fresh page instead of a 304 with a stale token. Requests with pending
+flash messages are always rendered.
+PAGE_VALIDATOR_VERSION is part of every ETag; bump it when templates change.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max, Q
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from .models import DonationClaim, DonationItem, DonationReview, DonationToRequest, Notification, RequestItem
+
+
+def latest(*timestamps):
+    found = [ts for ts in timestamps if ts is not None]
+    return max(found) if found else None
+
+
+def activity(queryset, field):
+    """``(row count, newest <field>)`` of a queryset, in one query."""
+    summary = queryset.aggregate(count=Count("pk"), latest=Max(field))
+    return summary["count"], summary["latest"]
+
+
+def _user_parts(user):
+    summary = Notification.objects.filter(user=user).aggregate(
+        latest=Max("id"), unread=Count("id", filter=Q(is_read=False)), touched=Max("created_at")
+    )
+    return [user.pk, summary["latest"], summary["unread"], summary["touched"]]
+
+
+def _csrf_part(request):
+    get_token(request)  # on a first visit, create the secret the page will be rendered with
+    return hashlib.sha256(request.META["CSRF_COOKIE"].encode()).hexdigest()
+
+
+def _state(validators, request, args, kwargs):
+    if not hasattr(request, "_conditional_state"):
+        request._conditional_state = None
+        if request.method in ("GET", "HEAD") and not len(get_messages(request)):
+            found = validators(request, *args, **kwargs)
+            if found is not None:
+                parts, last_modified = found
+                parts = [getattr(settings, "PAGE_VALIDATOR_VERSION", 1), _csrf_part(request), *parts]
+                if request.user.is_authenticated:
+                    parts += _user_parts(request.user)
+                    last_modified = None
+                etag = hashlib.md5(repr(parts).encode()).hexdigest()
+                request._conditional_state = (etag, last_modified)
+    return request._conditional_state
+
+
+def conditional_page(validators):
+    def etag(request, *args, **kwargs):
+        state = _state(validators, request, args, kwargs)
+        return state[0] if state else None
+
+    def last_modified(request, *args, **kwargs):
+        state = _state(validators, request, args, kwargs)
+        return state[1] if state else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+# ===== Validators =====
+
+def donation_item_validators(request, item_id):
+    updated_at = DonationItem.objects.filter(pk=item_id).values_list("updated_at", flat=True).first()
+    if updated_at is None:
+        return None
+    reviews = activity(DonationReview.objects.filter(donation_item_id=item_id), "updated_at")
+    claims = activity(DonationClaim.objects.filter(donation_item_id=item_id), "updated_at")
+    return [updated_at, reviews, claims], latest(updated_at, reviews[1], claims[1])
+
+
+def request_item_validators(request, pk):
+    updated_at = RequestItem.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    if updated_at is None:
+        return None
+    donations = activity(DonationToRequest.objects.filter(request_item_id=pk), "updated_at")
+    return [updated_at, donations], latest(updated_at, donations[1])
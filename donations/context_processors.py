@@ -1,15 +1,27 @@
 # donations/context_processors.py
+from django.conf import settings
+
 from .models import Notification
+from .notifications import unread_count
 
 def notifications_context(request):
     if request.user.is_authenticated:
         notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:5]
-        unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
+        unread = unread_count(request.user)
     else:
         notifications = []
-        unread_count = 0
+        unread = 0
 
     return {
         'notifications': notifications,
-        'notifications_unread_count': unread_count
+        'notifications_unread_count': unread,
+        'live_notifications': getattr(settings, 'LIVE_NOTIFICATIONS', False),
+    }
+
+
+def card_cache_context(request):
+    """Timeout and version for the {% cache %} card fragments; bump the version when card markup changes."""
+    return {
+        'card_cache_timeout': getattr(settings, 'CARD_CACHE_TIMEOUT', 3600),
+        'card_cache_version': getattr(settings, 'CARD_CACHE_VERSION', 1),
     }
@@ -9,6 +9,8 @@ from .models import (
 
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.conf import settings
+from .uploads import BoundedImageField, MultipleImageField, MultipleImageInput
 
 
 
@@ -66,14 +68,15 @@ class DonorRecipientProfileForm(forms.ModelForm):
 # ===== DONATION ITEM FORM =====
 
 class DonationItemForm(forms.ModelForm):
-    # Single image upload field
-    image = forms.ImageField(
+    # Multiple image upload field (cleans to a list, first image becomes primary)
+    image = MultipleImageField(
         required=False,  # make optional for editing
-        label="Upload Image",
-        widget=forms.ClearableFileInput(attrs={
+        label="Upload Images",
+        max_files=settings.MAX_IMAGES_PER_DONATION,
+        widget=MultipleImageInput(attrs={
             'accept': 'image/*',
             'class': 'form-control',
-            'id': 'id_image',  # single image id
+            'id': 'id_image',
         })
     )
 
@@ -105,6 +108,18 @@ class DonationItemForm(forms.ModelForm):
         self.fields['category'].required = True
         self.fields['location'].required = True
 
+    def clean_image(self):
+        """New photos are added to the item's gallery, so the limit counts the ones it already has."""
+        images = self.cleaned_data.get('image') or []
+        existing = self.instance.images.count() if self.instance.pk else 0
+        limit = settings.MAX_IMAGES_PER_DONATION
+        if images and existing + len(images) > limit:
+            raise forms.ValidationError(
+                f"An item can have at most {limit} images; this one already has {existing}.",
+                code="too_many_files",
+            )
+        return images
+
 
 # ===== DONATION CLAIM FORM =====
 class DonationClaimForm(forms.ModelForm):
@@ -207,6 +222,7 @@ class RequestItemForm(forms.ModelForm):
             'notify_immediately',
             'urgency',
         ]
+        field_classes = {'image': BoundedImageField}
         widgets = {
             'title': forms.TextInput(attrs={
                 'placeholder': 'e.g., Need school supplies for underprivileged children'
@@ -310,6 +326,7 @@ class DonationToRequestForm(forms.ModelForm):
     class Meta:
         model = DonationToRequest
         fields = ['title', 'description', 'quantity', 'image']
+        field_classes = {'image': BoundedImageField}
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Donation Title'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Description (optional)'}),
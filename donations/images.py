@@ -0,0 +1,143 @@
+# donations/images.py
+"""
+Resized JPEG/WebP derivatives for uploaded photos.
+
+For every original (e.g. ``donation_images/chair.jpg``) we store one JPEG and one
+WebP per configured width right next to it (``donation_images/chair.w320.jpg``,
+``donation_images/chair.w320.webp`` ...). Generation happens on the background
+worker pool, templates fall back to the original until the variants exist.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANT_FORMATS = {
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+def variant_widths():
+    return tuple(sorted(getattr(settings, "IMAGE_VARIANT_WIDTHS", (320, 640))))
+
+
+def variant_name(name, width, ext):
+    root, _ = os.path.splitext(name)
+    return f"{root}.w{width}.{ext}"
+
+
+def variant_names(name):
+    return [variant_name(name, width, ext) for width in variant_widths() for ext in VARIANT_FORMATS]
+
+
+def is_variant_name(name):
+    root, ext = os.path.splitext(name)
+    marker = os.path.splitext(root)[1]
+    return ext.lstrip(".") in VARIANT_FORMATS and marker[2:].isdigit() and marker.startswith(".w")
+
+
+def has_variants(name, storage=None):
+    """Variants are written smallest first, so the largest WebP marks a complete set."""
+    storage = storage or default_storage
+    return storage.exists(variant_name(name, variant_widths()[-1], "webp"))
+
+
+def _flatten(img):
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def render_variants(source=None, base=None):
+    """Return ``{(width, ext): bytes}`` for a file-like ``source`` (or an already decoded ``base``)."""
+    quality = getattr(settings, "IMAGE_VARIANT_QUALITY", 80)
+    widths = variant_widths()
+    if base is None:
+        with Image.open(source) as img:
+            # Let the JPEG decoder downscale while decoding instead of inflating a full phone photo.
+            img.draft("RGB", (widths[-1] * 2, widths[-1] * 2))
+            base = _flatten(img)
+
+    rendered = {}
+    for width in widths:
+        resized = base.copy()
+        resized.thumbnail((width, width * 2), Image.LANCZOS)
+        for ext, (fmt, _) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt, quality=quality, optimize=True)
+            rendered[(width, ext)] = buffer.getvalue()
+    return rendered
+
+
+def generate_variants(name, storage=None, force=False):
+    """Create the derivatives of a stored image. Safe to call repeatedly."""
+    storage = storage or default_storage
+    if not name or is_variant_name(name) or not storage.exists(name):
+        return []
+    if not force and has_variants(name, storage):
+        return []
+
+    with storage.open(name, "rb") as source:
+        rendered = render_variants(source)
+    return store_variants(name, rendered, storage)
+
+
+def store_variants(name, rendered, storage):
+    written = []
+    for (width, ext), data in sorted(rendered.items()):
+        target = variant_name(name, width, ext)
+        if storage.exists(target):
+            storage.delete(target)
+        # ContentAddressedStorage would hash a thumbnail like an upload; keep it next to its original
+        save = getattr(storage, "save_variant", storage.save)
+        written.append(save(target, ContentFile(data)))
+    return written
+
+
+# ===== Upload processing =====
+
+_upload_pool = None
+
+
+def _get_upload_pool():
+    global _upload_pool
+    if _upload_pool is None:
+        _upload_pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_PROCESSING_WORKERS", 4),
+            thread_name_prefix="donature-img",
+        )
+    return _upload_pool
+
+
+def prepare_upload(upload):
+    """
+    Decode an uploaded photo once: auto-rotate, drop EXIF (GPS, camera serials),
+    cap its size, recompress it as JPEG and render its variants from the same pixels.
+    Returns ``(ContentFile, {(width, ext): bytes})``. Pure CPU work, no DB access.
+    """
+    max_dimension = getattr(settings, "IMAGE_UPLOAD_MAX_DIMENSION", 2048)
+    quality = getattr(settings, "IMAGE_UPLOAD_QUALITY", 85)
+    upload.seek(0)
+    with Image.open(upload) as img:
+        img.draft("RGB", (max_dimension, max_dimension))
+        base = _flatten(img)
+    base.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    base.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + ".jpg"
+    return ContentFile(buffer.getvalue(), name=name), render_variants(base=base)
+
+
+def process_uploads(uploads):
+    """Run prepare_upload for several uploads concurrently (Pillow releases the GIL while coding)."""
+    return list(_get_upload_pool().map(prepare_upload, uploads))
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from donations.models import User
+from donature.compression import compress
+
+LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("br", 1), ("br", 4), ("br", 6), ("br", 11)]
+
+
+class Command(BaseCommand):
+    help = "Render pages and compare CPU time against bytes saved for gzip and Brotli levels."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=["/", "/explore/", "/ngos/explore-campaigns/", "/my-donations/"])
+        parser.add_argument("--user", help="Render as this user (needed for pages behind login).")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost")
+        if options["user"]:
+            try:
+                client.force_login(User.objects.get(username=options["user"]))
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}")
+
+        current = {"br": settings.COMPRESSION_BROTLI_QUALITY, "gzip": settings.COMPRESSION_GZIP_LEVEL}
+        self.stdout.write(f"{'page':<28} {'coding':<9} {'bytes':>9} {'ratio':>7} {'ms':>8} {'MB/s':>8}")
+        for path in options["paths"]:
+            response = client.get(path, headers={"Accept-Encoding": "identity"})
+            if response.status_code != 200:
+                self.stdout.write(f"{path:<28} skipped (status {response.status_code})")
+                continue
+            body = response.content
+            self.stdout.write(f"{path:<28} {'identity':<9} {len(body):>9}")
+            for encoding, level in LEVELS:
+                started = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    compressed = compress(body, encoding, level)
+                elapsed = (time.perf_counter() - started) / options["repeat"]
+                marker = " *" if current[encoding] == level else ""
+                self.stdout.write(
+                    f"{'':<28} {f'{encoding}-{level}':<9} {len(compressed):>9} {len(body) / len(compressed):>7.1f}"
+                    f" {elapsed * 1000:>8.2f} {len(body) / elapsed / 1e6:>8.1f}{marker}"
+                )
+        self.stdout.write("* = configured level")
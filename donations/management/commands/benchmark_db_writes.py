@@ -0,0 +1,136 @@
+import statistics
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection, connections, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from donations.models import DonationClaim, DonationItem, Notification, User
+from ngos import payments
+from ngos.models import Campaign, NGODonation
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent write throughput of the claim and donation flows on a scratch "
+        "database: driver defaults (no pragmas, a connection per request) vs the configured profile."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=25, help="Flows per thread.")
+        parser.add_argument("--flows", default="claim,donation")
+
+    def handle(self, *args, **options):
+        configured = connection.settings_dict
+        variants = [
+            ("defaults", {"OPTIONS": {} if connection.vendor == "sqlite" else configured["OPTIONS"],
+                          "CONN_MAX_AGE": 0}),
+            ("profile", {"OPTIONS": configured["OPTIONS"], "CONN_MAX_AGE": configured["CONN_MAX_AGE"]}),
+        ]
+        self.stdout.write(
+            f"{connection.vendor}, {options['threads']} threads x {options['iterations']} flows\n"
+            f"{'variant':<10} {'flow':<9} {'flows/s':>8} {'mean ms':>8} {'p95 ms':>8} {'errors':>7}"
+        )
+        scratch = tempfile.TemporaryDirectory(prefix="donature-bench-db-")
+        try:
+            for name, overrides in variants:
+                self.run_variant(name, overrides, scratch.name, options)
+        finally:
+            scratch.cleanup()
+
+    def run_variant(self, name, overrides, scratch_dir, options):
+        connections.close_all()
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict[key] for key in ("OPTIONS", "CONN_MAX_AGE", "TEST")}
+        settings_dict.update(overrides)
+        if connection.vendor == "sqlite":
+            settings_dict["TEST"] = {**settings_dict["TEST"], "NAME": f"{scratch_dir}/{name}.sqlite3"}
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Only database writes are measured, not background PDF rendering
+            with override_settings(RECEIPT_WARMING=False):
+                fixtures = self.create_fixtures(options["threads"])
+                for flow in options["flows"].split(","):
+                    self.run_flow(name, flow.strip(), fixtures, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            settings_dict.update(saved)
+
+    def create_fixtures(self, threads):
+        ngo = User.objects.create_user(username="bench-ngo", password="x", user_type="ngo", is_approved=True)
+        campaign = Campaign.objects.create(ngo=ngo, title="Bench", description="Bench", status="approved")
+        return [
+            {
+                "campaign": campaign,
+                "donor": User.objects.create_user(username=f"bench-donor-{i}", password="x", user_type="donor/recipient"),
+                "claimant": User.objects.create_user(username=f"bench-claimant-{i}", password="x",
+                                                     user_type="donor/recipient"),
+            }
+            for i in range(threads)
+        ]
+
+    def run_flow(self, variant, flow, fixtures, options):
+        step = {"claim": self.claim_flow, "donation": self.donation_flow}[flow]
+        errors = []
+
+        def worker(fixture):
+            timings = []
+            try:
+                for _ in range(options["iterations"]):
+                    close_old_connections()  # request boundary: honours CONN_MAX_AGE
+                    started = time.perf_counter()
+                    try:
+                        step(fixture)
+                    except DatabaseError as exc:  # e.g. "database is locked"
+                        errors.append(exc)
+                        continue
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            return timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as pool:
+            timings = sorted(t for result in pool.map(worker, fixtures) for t in result)
+        elapsed = time.perf_counter() - started
+        if not timings:
+            self.stdout.write(f"{variant:<10} {flow:<9} {'-':>8} {'-':>8} {'-':>8} {len(errors):>7}")
+            return
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{variant:<10} {flow:<9} {len(timings) / elapsed:>8.0f} {statistics.mean(timings):>8.1f}"
+            f" {p95:>8.1f} {len(errors):>7}"
+        )
+
+    @staticmethod
+    def claim_flow(fixture):
+        """Item listed, claimed, approved: the writes of donate_item, claim_donation and handle_claim."""
+        donor, claimant = fixture["donor"], fixture["claimant"]
+        item = DonationItem.objects.create(title="Chair", description="Chair", donor=donor, location="Dhaka")
+        link = reverse("donation_detail", args=[item.id])
+        with transaction.atomic():
+            claim = DonationClaim.objects.create(donation_item=item, claimant=claimant, message="Please")
+            Notification.objects.create(user=donor, message="New claim", link=link)
+        with transaction.atomic():
+            claim.status = "approved"
+            item.status = "claimed"
+            Notification.objects.create(user=claimant, message="Claim approved", link=link)
+            claim.save()
+            item.save()
+
+    @staticmethod
+    def donation_flow(fixture):
+        """Pending donation at initiation, then settlement by the success callback."""
+        campaign, donor = fixture["campaign"], fixture["donor"]
+        tran_id = f"{campaign.id}_{donor.id}_{uuid.uuid4().hex[:8]}"
+        NGODonation.objects.create(campaign=campaign, donor=donor, amount=Decimal("100"), transaction_id=tran_id,
+                                   payment_method="SSLCommerz", payment_status="pending")
+        payments.settle_payment(tran_id, Decimal("100"))
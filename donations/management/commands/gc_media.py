@@ -0,0 +1,113 @@
+import os
+import shutil
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from donations.images import variant_names
+from donations.models import MediaBlob
+
+DEFAULT_APPS = ("donations", "ngos", "custom_admin")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark-and-sweep garbage collection for MEDIA_ROOT: deletes (or quarantines) files "
+        "no FileField/ImageField row references any more."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed.")
+        parser.add_argument(
+            "--quarantine", action="store_true",
+            help="Move orphans to MEDIA_GC_QUARANTINE_DIR instead of deleting them.",
+        )
+        parser.add_argument(
+            "--grace-hours", type=float, default=24,
+            help="Skip files newer than this, so in-flight uploads and thumbnails are never swept.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--apps", nargs="+", default=list(DEFAULT_APPS))
+
+    def handle(self, *args, **options):
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        references = self.mark(options["apps"], options["batch_size"])
+        referenced = set(references)
+        for name in references:
+            referenced.update(variant_names(name))
+
+        cutoff = time.time() - options["grace_hours"] * 3600
+        orphans = list(self.sweep(media_root, referenced, cutoff))
+        reclaimable = sum(size for _, _, size in orphans)
+
+        if options["verbosity"] > 1:
+            for rel_path, _, size in orphans:
+                self.stdout.write(f"  {rel_path} ({filesizeformat(size)})")
+
+        verb = "Would reclaim" if options["dry_run"] else "Reclaimed"
+        if not options["dry_run"]:
+            self.remove(orphans, options["quarantine"])
+            self.sync_blobs([rel for rel, _, _ in orphans], options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(referenced)} referenced paths, {len(orphans)} orphaned files. "
+            f"{verb} {filesizeformat(reclaimable)}."
+        ))
+
+    def mark(self, app_labels, batch_size):
+        """Count references to every stored file, streaming each FileField column."""
+        references = Counter()
+        for label in app_labels:
+            for model in apps.get_app_config(label).get_models():
+                file_fields = [f for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+                for field in file_fields:
+                    names = (
+                        model._base_manager.exclude(**{field.attname: ""})
+                        .exclude(**{f"{field.attname}__isnull": True})
+                        .values_list(field.attname, flat=True)
+                        .order_by()
+                    )
+                    for name in names.iterator(chunk_size=batch_size):
+                        references[name] += 1
+        return references
+
+    def sweep(self, media_root, referenced, cutoff):
+        quarantine = os.path.abspath(self.quarantine_dir())
+        for dirpath, dirnames, filenames in os.walk(media_root):
+            dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != quarantine]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(path, media_root).replace(os.sep, "/")
+                if rel_path in referenced:
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                yield rel_path, path, stat.st_size
+
+    def remove(self, orphans, quarantine):
+        target_root = os.path.join(self.quarantine_dir(), timezone.now().strftime("%Y%m%d-%H%M%S"))
+        for rel_path, path, _ in orphans:
+            if quarantine:
+                target = os.path.join(target_root, rel_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.remove(path)
+
+    def sync_blobs(self, removed, batch_size):
+        """Drop the MediaBlob rows of swept blobs."""
+        for start in range(0, len(removed), batch_size):
+            MediaBlob.objects.filter(name__in=removed[start:start + batch_size]).delete()
+
+    def quarantine_dir(self):
+        return getattr(
+            settings, "MEDIA_GC_QUARANTINE_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(settings.MEDIA_ROOT)), "media_quarantine"),
+        )
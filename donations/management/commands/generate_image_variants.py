@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from donations.images import generate_variants
+from donations.models import DonationImage, DonationToRequest, RequestItem, User
+from ngos.models import Campaign
+
+IMAGE_FIELDS = (
+    (DonationImage, "image"),
+    (RequestItem, "image"),
+    (DonationToRequest, "image"),
+    (User, "profile_picture"),
+    (Campaign, "image"),
+)
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail/WebP variants for images uploaded before the pipeline existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild variants that already exist.")
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field_name in IMAGE_FIELDS:
+            names = (
+                model.objects.exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__isnull": True})
+                .values_list(field_name, flat=True)
+            )
+            storage = model._meta.get_field(field_name).storage
+            for name in names.iterator(chunk_size=500):
+                try:
+                    written = generate_variants(name, storage, force=options["force"])
+                except Exception as exc:
+                    self.stderr.write(f"{name}: {exc}")
+                    continue
+                total += len(written)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} image variants."))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from donations.notifications import expired, prune
+
+
+class Command(BaseCommand):
+    help = (
+        "Move read notifications older than the retention period to the archive table "
+        "(or delete them), in small batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None,
+            help="Retention in days (default NOTIFICATION_RETENTION_DAYS).",
+        )
+        parser.add_argument(
+            "--delete", action="store_true",
+            help="Delete instead of archiving (default NOTIFICATION_ARCHIVE).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many would be pruned.")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            self.stdout.write(f"{expired(options['days']).count()} notifications would be pruned.")
+            return
+        archive = not options["delete"] and getattr(settings, "NOTIFICATION_ARCHIVE", True)
+        removed = prune(options["days"], archive=archive, batch_size=options["batch_size"], pause=options["pause"])
+        verb = "Archived" if archive else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} notifications."))
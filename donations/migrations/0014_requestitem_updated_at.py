@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0013_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
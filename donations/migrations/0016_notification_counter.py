@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model('donations', 'Notification')
+    NotificationCounter = apps.get_model('donations', 'NotificationCounter')
+    unread = Notification.objects.filter(is_read=False).values('user_id').annotate(n=Count('id'))
+    NotificationCounter.objects.bulk_create(
+        NotificationCounter(user_id=row['user_id'], unread=row['n']) for row in unread
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0015_notification_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
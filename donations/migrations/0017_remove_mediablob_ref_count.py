@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0016_notification_counter'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='mediablob',
+            name='ref_count',
+        ),
+    ]
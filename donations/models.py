@@ -236,6 +236,7 @@ class RequestItem(models.Model):
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # validator for conditional GET of request_detail
     approved_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
@@ -296,13 +297,54 @@ class Notification(models.Model):
     link = models.URLField(blank=True, null=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Repeats of the same event (same user and key) fold into one unread row; see donations/notifications.py
+    key = models.CharField(max_length=100, blank=True, default="")
+    occurrences = models.PositiveIntegerField(default=1)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="notification_user_recent"),
+            models.Index(fields=["is_read", "created_at"], name="notification_read_age"),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message[:30]}"
-    
+
+
+class ArchivedNotification(models.Model):
+    """Read notification moved out of the hot table by ``manage.py prune_notifications``."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_notifications"
+    )
+    message = models.CharField(max_length=255)
+    link = models.URLField(blank=True, null=True)
+    occurrences = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Archived notification for {self.user_id}: {self.message[:30]}"
+
+
+class NotificationCounter(models.Model):
+    """Stored unread count per user, kept in step with Notification (see donations/notifications.py)."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="notification_counter"
+    )
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
 
 class ContactMessage(models.Model):
      name = models.CharField(max_length=100)
@@ -354,3 +396,15 @@ class UserReward(models.Model):
             return 100
         prev_points = max([r.points_required for r in Reward.objects.filter(points_required__lte=self.points)] + [0])
         return int((self.points - prev_points) / (next_reward.points_required - prev_points) * 100)
+
+
+# ===== Content-addressed media blobs =====
+class MediaBlob(models.Model):
+    """One stored upload, shared by every FileField that saved identical bytes."""
+    digest = models.CharField(max_length=64, unique=True)  # sha256 hex
+    name = models.CharField(max_length=255)  # storage path, e.g. blobs/ab/ab12...jpg
+    size = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
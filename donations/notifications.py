@@ -0,0 +1,239 @@
+# donations/notifications.py
+"""
+Creating and retiring site notifications.
+
+``notify(user, message, link, key=..., summary=...)`` folds repeats of the
+same event into one row: while the user has an unread notification with that key
+from the last NOTIFICATION_COALESCE_SECONDS, it counts one more occurrence, moves
+to the top and takes the newest link and ``summary(count)`` as its message (e.g.
+"3 new claims on 'Chair'"), instead of adding a row. The single-event message
+names one person, so it is never kept for a group.
+
+``prune()`` (``manage.py prune_notifications``) keeps the hot table small: read
+notifications older than NOTIFICATION_RETENTION_DAYS move to
+ArchivedNotification, or are deleted, a batch per transaction so writers are
+never blocked for long.
+
+Each user's unread count is stored in NotificationCounter instead of being
+counted on every page: inserts and read/unread transitions adjust it (the
+signals in donations/signals.py), ``mark_read()`` marks a batch read with one
+UPDATE and subtracts what it changed, and a missing counter is rebuilt from the
+table on first use.
+
+``stream()`` feeds the server-sent events endpoint: with LIVE_NOTIFICATIONS on,
+every saved unread notification (new or coalesced) and every read change is
+published after commit to the user's channel on the donature.pubsub broker, if
+that channel has subscribers, and each open stream forwards what arrives on it.
+Event ids are "<created_at in µs>-<id>", so a reconnecting stream replays rows
+coalesced since its last event as well as new ones.
+"""
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from donature.pubsub import get_broker
+from .models import ArchivedNotification, Notification, NotificationCounter
+
+
+def notify(user, message, link=None, key="", summary=None):
+    """
+    Create a notification for ``user``, or coalesce it into a recent unread one
+    with the same key; ``summary(count)`` is then the grouped message.
+    """
+    if key:
+        window = timedelta(seconds=getattr(settings, "NOTIFICATION_COALESCE_SECONDS", 86400))
+        now = timezone.now()
+        with transaction.atomic():
+            existing = (
+                Notification.objects.select_for_update()
+                .filter(user=user, key=key, is_read=False, created_at__gte=now - window)
+                .order_by("-created_at")
+                .first()
+            )
+            if existing is not None:
+                existing.occurrences += 1  # the row is locked, so this is the stored count + 1
+                existing.message = summary(existing.occurrences) if summary else f"{existing.occurrences} new notifications"
+                existing.link, existing.created_at = link, now
+                existing.save(update_fields=["message", "link", "created_at", "occurrences"])
+                return existing
+    return Notification.objects.create(user=user, message=message, link=link, key=key)
+
+
+def expired(days=None):
+    """Read notifications older than ``days`` (default NOTIFICATION_RETENTION_DAYS)."""
+    if days is None:
+        days = getattr(settings, "NOTIFICATION_RETENTION_DAYS", 90)
+    cutoff = timezone.now() - timedelta(days=days)
+    return Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+
+def prune(days=None, archive=True, batch_size=1000, pause=0):
+    """Archive (or delete) expired notifications in batches; returns how many were removed."""
+    queryset = expired(days).order_by("created_at")
+    removed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(queryset.values("id", "user_id", "message", "link", "occurrences", "created_at")[:batch_size])
+            if not batch:
+                break
+            if archive:
+                ArchivedNotification.objects.bulk_create(
+                    ArchivedNotification(**{field: row[field] for field in row if field != "id"}) for row in batch
+                )
+            Notification.objects.filter(id__in=[row["id"] for row in batch]).delete()
+        removed += len(batch)
+        if len(batch) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)  # let queued writers in between batches
+    return removed
+
+
+def unread_count(user):
+    """The user's stored unread count (rebuilt by counting if the counter is missing)."""
+    unread = NotificationCounter.objects.filter(user=user).values_list("unread", flat=True).first()
+    return recount(user) if unread is None else unread
+
+
+def recount(user):
+    """
+    Reset the user's counter from the notifications table; returns the count.
+
+    Runs on the primary, and counts while holding the counter row's lock: an
+    insert or read change committing meanwhile waits for it and then applies
+    its delta on top, instead of being overwritten or counted twice.
+    """
+    counters = NotificationCounter.objects.using("default")
+    with transaction.atomic(using="default"):
+        counters.get_or_create(user=user, defaults={"unread": 0})
+        counter = counters.select_for_update().get(user=user)
+        counter.unread = Notification.objects.using("default").filter(user=user, is_read=False).count()
+        counter.save(update_fields=["unread"])
+    return counter.unread
+
+
+def adjust_unread(user_id, delta):
+    """Add ``delta`` to an existing counter (a missing one is rebuilt later by unread_count)."""
+    NotificationCounter.objects.filter(user_id=user_id).update(unread=Greatest(F("unread") + delta, 0))
+
+
+def mark_read(user, ids=None, up_to_id=None):
+    """Mark the user's notifications ``ids``, or every one up to ``up_to_id``, or all of them, read.
+
+    Returns how many changed from unread to read.
+    """
+    queryset = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    elif up_to_id is not None:
+        queryset = queryset.filter(id__lte=up_to_id)
+    with transaction.atomic():
+        changed = queryset.update(is_read=True)
+        if changed:
+            adjust_unread(user.pk, -changed)
+            publish_unread(user)
+    return changed
+
+
+# ===== Live stream (server-sent events) =====
+
+def channel(user_id):
+    return f"notifications:{user_id}"
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def event_id(note):
+    """Orders events by when a row was created or last coalesced, then by id."""
+    return f"{(note.created_at - _EPOCH) // timedelta(microseconds=1)}-{note.id}"
+
+
+def parse_event_id(value):
+    """``(created_at, id)`` from a Last-Event-ID header made by event_id(), or None."""
+    micros, _, note_id = (value or "").partition("-")
+    if not (micros.isdigit() and note_id.isdigit()):
+        return None
+    return _EPOCH + timedelta(microseconds=int(micros)), int(note_id)
+
+
+def as_event(note, unread=None):
+    data = {
+        "id": note.id,
+        "message": note.message,
+        "link": note.link,
+        "occurrences": note.occurrences,
+        "created_at": note.created_at.isoformat(),
+    }
+    if unread is not None:
+        data["unread"] = unread
+    return {"event": "notification", "id": event_id(note), "data": data}
+
+
+def format_event(event):
+    """One SSE frame."""
+    lines = [f"id: {event['id']}"] if event.get("id") is not None else []
+    lines += [f"event: {event['event']}", f"data: {json.dumps(event['data'])}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _publish(user_id, build):
+    """Send ``build()`` to the user's channel after commit, if live streams are on and one is open."""
+    if not getattr(settings, "LIVE_NOTIFICATIONS", False):
+        return
+
+    def send():
+        broker = get_broker()
+        if broker.has_subscribers(channel(user_id)):
+            broker.publish(channel(user_id), build())
+    transaction.on_commit(send)
+
+
+def publish_notification(note):
+    """Push ``note`` and the new unread count to the user's open streams once the transaction commits."""
+    _publish(note.user_id, lambda: as_event(note, unread_count(note.user)))
+
+
+def publish_unread(user):
+    _publish(user.pk, lambda: {"event": "unread", "data": {"unread": unread_count(user)}})
+
+
+def _missed(user, last_event_id, limit=20):
+    created_at, note_id = last_event_id
+    notes = (
+        Notification.objects.filter(user=user)
+        .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=note_id))
+        .order_by("-created_at", "-id")[:limit]
+    )
+    return list(reversed(notes)), unread_count(user)
+
+
+async def stream(user, last_event_id=None):
+    """
+    SSE frames for ``user``: notifications missed since ``last_event_id`` (the
+    parsed header of a reconnecting EventSource), then live events, with a comment line every
+    NOTIFICATION_STREAM_HEARTBEAT seconds to keep proxies from timing out. Ends
+    after NOTIFICATION_STREAM_MAX_AGE seconds; the browser reconnects by itself.
+    """
+    heartbeat = getattr(settings, "NOTIFICATION_STREAM_HEARTBEAT", 25)
+    max_age = getattr(settings, "NOTIFICATION_STREAM_MAX_AGE", 300)
+    yield f"retry: {getattr(settings, 'NOTIFICATION_STREAM_RETRY', 5) * 1000}\n\n"
+    # Subscribe before catching up, so nothing published meanwhile is lost
+    async with get_broker().subscribe(channel(user.pk)) as subscription:
+        if last_event_id is not None:
+            notes, unread = await sync_to_async(_missed)(user, last_event_id)
+            for note in notes:
+                yield format_event(as_event(note))
+            yield format_event({"event": "unread", "data": {"unread": unread}})
+        deadline = asyncio.get_running_loop().time() + max_age
+        while (remaining := deadline - asyncio.get_running_loop().time()) > 0:
+            message = await subscription.get(timeout=min(heartbeat, remaining))
+            yield format_event(message) if message is not None else ": keep-alive\n\n"
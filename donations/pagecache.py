@@ -0,0 +1,121 @@
+# donations/pagecache.py
+"""
+Full-page cache for the public listing pages, for anonymous visitors only.
+
+``@cache_anonymous_page("items", "campaigns")`` stores the rendered page under
+the full URL (path + query string) and the current *generation* of each named
+group. Writes to the models behind a group call ``invalidate(group)`` (see the
+signals modules), which gives the group a new generation, so every page built
+from it misses from then on and the stale entries simply expire. Nothing has to
+enumerate cached URLs.
+
+The login/signup modals on every page carry a CSRF token, so the token is
+swapped for a placeholder when storing and for the visitor's own token when
+serving. Requests with pending flash messages bypass the cache.
+
+For DATABASE_PIN_SECONDS after a group's generation changes, a miss renders
+from the primary even in a ``@replica_reads`` view: a replica that hasn't caught
+up yet would otherwise store the old data under the new generation.
+"""
+import contextlib
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from donature import db_router
+
+CSRF_PLACEHOLDER = "__DONATURE_CSRF_TOKEN__"
+_CSRF_INPUT = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _timeout():
+    return getattr(settings, "PAGE_CACHE_TIMEOUT", 300)
+
+
+def _generation_key(group):
+    return f"pagecache:gen:{group}"
+
+
+def generations(groups):
+    """Current generation of each group, creating missing ones (e.g. after an eviction)."""
+    keys = [_generation_key(group) for group in groups]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [str(found[key]) for key in keys]
+
+
+def invalidate(*groups):
+    """
+    Start a new generation for ``groups`` now and again when the current
+    transaction commits, so a page rendered from pre-commit data in between
+    isn't served afterwards.
+    """
+    def bump():
+        cache.set_many({_generation_key(group): time.time_ns() for group in groups}, None)
+    bump()
+    transaction.on_commit(bump)
+
+
+def page_key(request, view_name, current):
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"pagecache:{view_name}:{':'.join(current)}:{url}"
+
+
+def _render_source(current):
+    """The primary while any generation is younger than the replication lag allowance."""
+    if not db_router.replica_alias():
+        return contextlib.nullcontext()
+    window_ns = getattr(settings, "DATABASE_PIN_SECONDS", 10) * 1_000_000_000
+    now = time.time_ns()
+    if any(now - int(generation) < window_ns for generation in current):
+        return db_router.use_primary()
+    return contextlib.nullcontext()
+
+
+def _cacheable_request(request):
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cache_anonymous_page(*groups):
+    def decorator(view_func):
+        view_name = f"{view_func.__module__}.{view_func.__name__}"
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _timeout() or not _cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            current = generations(groups)
+            key = page_key(request, view_name, current)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content.replace(CSRF_PLACEHOLDER, get_token(request)),
+                                        content_type=content_type)
+                response["X-Page-Cache"] = "hit"
+                return response
+
+            with _render_source(current):
+                response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                content = _CSRF_INPUT.sub(rf"\g<1>{CSRF_PLACEHOLDER}\g<2>", response.content.decode(response.charset))
+                cache.set(key, (content, response["Content-Type"]), _timeout())
+                response["X-Page-Cache"] = "miss"
+            return response
+        return wrapper
+    return decorator
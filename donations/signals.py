@@ -0,0 +1,118 @@
+# donations/signals.py
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from donature import metrics
+from .images import generate_variants
+from .models import (
+    Category, DonationClaim, DonationImage, DonationItem, DonationToRequest, Notification, RequestItem, User,
+)
+from .notifications import adjust_unread, publish_notification, publish_unread
+from .pagecache import invalidate
+from .tasks import submit_on_commit
+
+
+def queue_image_variants(instance, field_name, update_fields=None):
+    """Generate thumbnails/WebP for ``instance.<field_name>`` after commit."""
+    if update_fields is not None and field_name not in update_fields:
+        return
+    field_file = getattr(instance, field_name)
+    if field_file:
+        submit_on_commit(generate_variants, field_file.name, field_file.storage)
+
+
+@receiver(post_save, sender=DonationImage)
+def donation_image_variants(sender, instance, update_fields=None, **kwargs):
+    queue_image_variants(instance, "image", update_fields)
+
+
+@receiver(post_save, sender=RequestItem)
+def request_item_variants(sender, instance, update_fields=None, **kwargs):
+    queue_image_variants(instance, "image", update_fields)
+
+
+@receiver(post_save, sender=DonationToRequest)
+def donation_to_request_variants(sender, instance, update_fields=None, **kwargs):
+    queue_image_variants(instance, "image", update_fields)
+
+
+@receiver(post_save, sender=User)
+def profile_picture_variants(sender, instance, update_fields=None, **kwargs):
+    queue_image_variants(instance, "profile_picture", update_fields)
+
+
+@receiver(post_init, sender=DonationClaim)
+def remember_claim_status(sender, instance, **kwargs):
+    instance._saved_status = instance.status
+
+
+@receiver(post_save, sender=DonationClaim)
+def count_claims(sender, instance, created, **kwargs):
+    """Feed the claims created/approved counters (approved: on the transition only)"""
+    if created:
+        metrics.CLAIMS_CREATED.inc()
+    if instance.status == "approved" and instance._saved_status != "approved":
+        metrics.CLAIMS_APPROVED.inc()
+    instance._saved_status = instance.status
+
+
+@receiver([post_save, post_delete], sender=DonationImage)
+def touch_donation_item(sender, instance, **kwargs):
+    """Item cards show the first image; a new updated_at refreshes the cached card"""
+    DonationItem.objects.filter(pk=instance.donation_item_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=DonationItem)
+@receiver([post_save, post_delete], sender=DonationImage)
+def invalidate_item_pages(sender, **kwargs):
+    invalidate("items")
+
+
+@receiver([post_save, post_delete], sender=RequestItem)
+@receiver([post_save, post_delete], sender=DonationToRequest)
+def invalidate_request_pages(sender, **kwargs):
+    """A request leaves the open list once somebody donates to it"""
+    invalidate("requests")
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_filtered_pages(sender, **kwargs):
+    invalidate("items", "requests")
+
+
+@receiver(post_save, sender=Category)
+def touch_category_items(sender, instance, created, **kwargs):
+    """Item cards show the category name; a new updated_at refreshes the cached card"""
+    if not created:
+        DonationItem.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_init, sender=Notification)
+def remember_notification_read(sender, instance, **kwargs):
+    instance._saved_is_read = instance.is_read
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_on_save(sender, instance, created, **kwargs):
+    """Keep NotificationCounter in step with single-row inserts and read/unread changes"""
+    was_unread = not created and not instance._saved_is_read
+    is_unread = not instance.is_read
+    if is_unread != was_unread:
+        adjust_unread(instance.user_id, 1 if is_unread else -1)
+    instance._saved_is_read = instance.is_read
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, **kwargs):
+    """New and coalesced notifications go to the user's open streams; read ones only move the badge"""
+    if instance.is_read:
+        publish_unread(instance.user)
+    else:
+        publish_notification(instance)
+
+
+@receiver(post_delete, sender=Notification)
+def count_unread_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread(instance.user_id, -1)
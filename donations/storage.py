@@ -0,0 +1,74 @@
+# donations/storage.py
+"""
+Content-addressed media storage.
+
+Every upload is hashed while it is read and stored once as
+``blobs/<aa>/<sha256><ext>``; saving the same bytes again (re-uploaded photos,
+the same NID scan for donor and NGO accounts, ...) reuses the stored blob, and
+MediaBlob records each digest once. Because a blob name never changes content,
+it can be served with ``Cache-Control: immutable``.
+
+Blobs are not reference-counted: Django never tells storage when a row or a
+FieldFile stops using a file, so a count would only grow. ``delete()`` leaves
+blobs alone (another row may share one) and ``manage.py gc_media`` frees those
+no FileField references any more, by mark-and-sweep.
+
+Thumbnails come in through ``save_variant()`` under their original's name and
+are neither hashed nor recorded.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+from .images import is_variant_name
+
+
+def blob_dir():
+    return getattr(settings, "MEDIA_BLOB_DIR", "blobs")
+
+
+def is_blob_name(name):
+    return bool(name) and name.replace("\\", "/").startswith(blob_dir() + "/")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def __init__(self, **kwargs):
+        # Two writers racing on the same digest write identical bytes, so overwriting is safe.
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def blob_name(self, digest, ext):
+        return f"{blob_dir()}/{digest[:2]}/{digest}{ext.lower()}"
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        hasher = hashlib.sha256()
+        size = 0
+        content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+            size += len(chunk)
+        digest = hasher.hexdigest()
+        blob = self.blob_name(digest, os.path.splitext(name)[1])
+
+        if not self.exists(blob):
+            content.seek(0)
+            blob = super()._save(blob, content)
+        # A concurrent first upload of the same bytes may create the row meanwhile
+        MediaBlob.objects.get_or_create(digest=digest, defaults={"name": blob, "size": size})
+        return blob
+
+    def save_variant(self, name, content):
+        """Store a thumbnail (donations.images) at ``name`` as it is: not hashed, not recorded."""
+        validate_file_name(name, allow_relative_path=True)
+        return super()._save(name, content).replace("\\", "/")
+
+    def delete(self, name):
+        if is_blob_name(name) and not is_variant_name(name):
+            return  # possibly shared; gc_media removes it once nothing references it
+        super().delete(name)
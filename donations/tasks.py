@@ -0,0 +1,42 @@
+# donations/tasks.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "BACKGROUND_TASK_WORKERS", 2),
+            thread_name_prefix="donature-bg",
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    """Run a task and release the DB connection the worker thread opened."""
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(func, "__name__", func))
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func`` on the background worker pool (inline when BACKGROUND_TASKS_EAGER)."""
+    if getattr(settings, "BACKGROUND_TASKS_EAGER", False):
+        return func(*args, **kwargs)
+    return _get_executor().submit(_run, func, args, kwargs)
+
+
+def submit_on_commit(func, *args, **kwargs):
+    """Queue ``func`` once the current transaction commits, so workers see the saved rows."""
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
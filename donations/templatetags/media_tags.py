@@ -0,0 +1,39 @@
+# donations/templatetags/media_tags.py
+from django import template
+from django.utils.html import format_html
+
+from donations.images import has_variants, variant_name, variant_widths
+
+register = template.Library()
+
+DEFAULT_SIZES = "(max-width: 600px) 100vw, 320px"
+
+
+def _srcset(image, ext):
+    return ", ".join(
+        f"{image.storage.url(variant_name(image.name, width, ext))} {width}w"
+        for width in variant_widths()
+    )
+
+
+@register.filter
+def srcset(image, ext="webp"):
+    """``srcset`` value for an ImageField, or "" while the variants are not ready."""
+    if not image or not has_variants(image.name, image.storage):
+        return ""
+    return _srcset(image, ext)
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes=DEFAULT_SIZES, css_class=""):
+    """
+    Render ``<picture>`` with WebP and JPEG srcsets for an uploaded image.
+    Falls back to a plain ``<img>`` of the original until the variants exist.
+    """
+    if not has_variants(image.name, image.storage):
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', image.url, alt, css_class)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        _srcset(image, "webp"), sizes, image.url, _srcset(image, "jpg"), sizes, alt, css_class,
+    )
@@ -1,3 +1,825 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Engine, Template
+from django.templatetags.static import static
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from donature import db_router, metrics, perf, pubsub
+from donature.middleware import CompressionMiddleware
+from donature.querycheck import QueryBudgetExceeded, fingerprint, query_budget
+
+from .forms import RequestItemForm
+from .images import has_variants, process_uploads, variant_name
+from .models import (
+    ArchivedNotification, Category, DonationClaim, DonationImage, DonationItem, MediaBlob, Notification,
+    NotificationCounter, User,
+)
+from .notifications import event_id, mark_read, notify, recount, unread_count
+from .pagecache import cache_anonymous_page, generations, invalidate
+from .views import save_donation_images, serve_media
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp(prefix="donature-test-media-")
+TEST_METRICS_DIR = tempfile.mkdtemp(prefix="donature-test-metrics-")
+_test_settings = override_settings(METRICS_DIR=TEST_METRICS_DIR)
+
+
+def setUpModule():
+    _test_settings.enable()  # every request counts metrics; keep them out of BASE_DIR/var/metrics
+
+
+def tearDownModule():
+    metrics.reset()  # nothing left for the exit-time flush to write
+    _test_settings.disable()
+    shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+    shutil.rmtree(TEST_METRICS_DIR, ignore_errors=True)
+
+
+def make_image(size=(1200, 900), fmt="JPEG", name="photo.jpg", color=(200, 120, 40), exif=None):
+    buffer = io.BytesIO()
+    extra = {"exif": exif} if exif is not None else {}
+    Image.new("RGB", size, color).save(buffer, fmt, **extra)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True, IMAGE_VARIANT_WIDTHS=(320, 640))
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.item = DonationItem.objects.create(
+            title="Chair", description="Wooden chair", donor=self.donor,
+            location="Dhaka", category=Category.objects.create(name="Furniture"),
+        )
+
+    def test_variants_generated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = DonationImage.objects.create(donation_item=self.item, image=make_image())
+
+        name = image.image.name
+        self.assertTrue(has_variants(name, image.image.storage))
+        with image.image.storage.open(variant_name(name, 320, "webp")) as f:
+            thumb = Image.open(f)
+            self.assertEqual(thumb.format, "WEBP")
+            self.assertEqual(thumb.width, 320)
+
+    def test_responsive_image_tag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = DonationImage.objects.create(donation_item=self.item, image=make_image())
+
+        html = Template("{% load media_tags %}{% responsive_image image alt='Chair' %}").render(
+            Context({"image": image.image})
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(".w640.webp 640w", html)
+        self.assertIn(f'src="{image.image.url}"', html)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.item = DonationItem.objects.create(title="Chair", description="Chair", donor=self.donor, location="Dhaka")
+
+    def test_identical_uploads_share_one_blob(self):
+        first = DonationImage.objects.create(donation_item=self.item, image=make_image(name="a.jpg"))
+        second = DonationImage.objects.create(donation_item=self.item, image=make_image(name="b.jpg"))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith("blobs/"))
+        self.assertEqual(MediaBlob.objects.filter(name=first.image.name).count(), 1)
+
+        first.delete()
+        first.image.storage.delete(first.image.name)  # shared: left for gc_media
+        self.assertTrue(second.image.storage.exists(second.image.name))
+
+    def test_upload_named_like_a_thumbnail_is_still_hashed(self):
+        name = default_storage.save("donation_images/photo.w320.jpg", ContentFile(b"photo"))
+        self.assertTrue(name.startswith("blobs/"))
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+
+    def test_variants_keep_their_original_name(self):
+        name = default_storage.save_variant("donation_images/old.w320.jpg", ContentFile(b"thumb"))
+        self.assertEqual(name, "donation_images/old.w320.jpg")
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_blobs_served_with_immutable_cache_headers(self):
+        image = DonationImage.objects.create(donation_item=self.item, image=make_image())
+        response = serve_media(RequestFactory().get("/"), image.image.name, document_root=TEST_MEDIA_ROOT)
+        self.assertIn("immutable", response["Cache-Control"])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class MediaGarbageCollectorTests(TestCase):
+
+    def test_sweeps_only_unreferenced_files(self):
+        donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        item = DonationItem.objects.create(title="Chair", description="Chair", donor=donor, location="Dhaka")
+        with self.captureOnCommitCallbacks(execute=True):
+            kept = DonationImage.objects.create(donation_item=item, image=make_image(size=(500, 400)))
+        orphan = os.path.join(TEST_MEDIA_ROOT, "profile_pics", "old.jpg")
+        os.makedirs(os.path.dirname(orphan), exist_ok=True)
+        with open(orphan, "wb") as f:
+            f.write(b"x" * 10)
+
+        call_command("gc_media", "--grace-hours=0", "--dry-run", stdout=io.StringIO())
+        self.assertTrue(os.path.exists(orphan))
+
+        call_command("gc_media", "--grace-hours=0", stdout=io.StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(kept.image.storage.exists(kept.image.name))
+        self.assertTrue(has_variants(kept.image.name, kept.image.storage))
+
+    def test_frees_blobs_nothing_references(self):
+        donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        item = DonationItem.objects.create(title="Chair", description="Chair", donor=donor, location="Dhaka")
+        image = DonationImage.objects.create(donation_item=item, image=make_image(size=(500, 400)))
+        name = image.image.name
+        image.delete()
+
+        call_command("gc_media", "--grace-hours=0", stdout=io.StringIO())
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class BoundedUploadTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.client.force_login(self.user)
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=2048)
+    def test_oversize_upload_rejected_while_streaming(self):
+        response = self.client.post(
+            "/profile/upload-photo/",
+            {"profile_picture": make_image(size=(800, 800))},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        self.assertFalse(response.json()["success"])
+        self.assertIn("too large", response.json()["message"])
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=10_000)
+    def test_image_dimensions_checked_from_header(self):
+        form = RequestItemForm(
+            data={"title": "Bag", "quantity": 1, "description": "School bag", "urgency": "low"},
+            files={"image": make_image(size=(200, 200))},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("maximum", form.errors["image"][0])
+
+    def test_non_image_rejected(self):
+        form = RequestItemForm(
+            data={"title": "Bag", "quantity": 1, "description": "School bag", "urgency": "low"},
+            files={"image": SimpleUploadedFile("bag.jpg", b"not an image", content_type="image/jpeg")},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("image", form.errors)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class MultiImageDonationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.category = Category.objects.create(name="Furniture")
+        self.client.force_login(self.user)
+
+    def test_donate_item_with_several_images(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees
+        photos = [
+            make_image(size=(400, 300), name="first.jpg", exif=exif),
+            make_image(size=(400, 300), name="second.jpg", color=(10, 10, 10)),
+            make_image(size=(400, 300), name="third.jpg", color=(90, 200, 90)),
+        ]
+        response = self.client.post("/donate/", {
+            "title": "Desk", "category": self.category.id, "quantity": 1,
+            "description": "Study desk", "location": "Dhaka", "urgency": "low",
+            "image": photos,
+        })
+        self.assertEqual(response.status_code, 302)
+
+        item = DonationItem.objects.get(title="Desk")
+        images = list(item.images.order_by("id"))
+        self.assertEqual(len(images), 3)
+        self.assertEqual([image.is_primary for image in images], [True, False, False])
+
+        with images[0].image.open("rb") as f:
+            stored = Image.open(f)
+            self.assertEqual(stored.size, (300, 400))  # EXIF orientation applied
+            self.assertNotIn(0x0112, stored.getexif())
+        self.assertTrue(has_variants(images[0].image.name, images[0].image.storage))
+
+    def test_truncated_photo_is_a_form_error(self):
+        whole = make_image(size=(400, 300)).read()
+        truncated = SimpleUploadedFile("cut.jpg", whole[:len(whole) // 2], content_type="image/jpeg")
+        response = self.client.post("/donate/", {
+            "title": "Desk", "category": self.category.id, "quantity": 1,
+            "description": "Study desk", "location": "Dhaka", "urgency": "low",
+            "image": [make_image(name="ok.jpg"), truncated],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("damaged or incomplete", response.context["form"].errors["image"][0])
+        self.assertFalse(DonationItem.objects.filter(title="Desk").exists())
+
+    @override_settings(MAX_IMAGES_PER_DONATION=2)
+    def test_edits_cannot_grow_the_gallery_past_the_limit(self):
+        item = DonationItem.objects.create(title="Desk", description="Desk", donor=self.user, location="Dhaka",
+                                           category=self.category)
+        save_donation_images(item, process_uploads([make_image(size=(400, 300))]))
+        data = {"title": "Desk", "category": self.category.id, "quantity": 1, "description": "Desk",
+                "location": "Dhaka", "urgency": "low"}
+        response = self.client.post(f"/donation/{item.id}/edit/", {**data, "image": [make_image(name="a.jpg")]})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(f"/donation/{item.id}/edit/", {**data, "image": [make_image(name="b.jpg")]})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("at most 2 images", response.context["form"].errors["image"][0])
+        self.assertEqual(item.images.count(), 2)
+
+    def test_added_photos_refresh_the_card_and_listings(self):
+        item = DonationItem.objects.create(title="Desk", description="Desk", donor=self.user, location="Dhaka")
+        DonationItem.objects.filter(pk=item.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        listing = generations(["items"])
+        save_donation_images(item, process_uploads([make_image(size=(400, 300))]))
+        item.refresh_from_db()
+        self.assertGreater(item.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertNotEqual(generations(["items"]), listing)
+
+
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()  # measure a real render, not an anonymous page-cache hit
+        perf.reset_histograms()
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_request_is_measured(self):
+        with self.assertLogs("donature.perf", "INFO") as logs:
+            response = self.client.get("/")
+
+        timing = response["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn("total;dur=", timing)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line["url_name"], "home")
+        self.assertEqual(line["status"], 200)
+        self.assertGreater(line["queries"], 0)
+        self.assertGreater(line["template_ms"], 0)
+        self.assertIn(f'"{line["queries"]} queries"', timing)
+        self.assertEqual(perf.latency_snapshot()["home"]["count"], 1)
+
+    def test_timings_are_not_sent_by_default(self):
+        with self.assertLogs("donature.perf", "INFO"):
+            response = self.client.get("/")
+        self.assertNotIn("Server-Timing", response)
+
+    def test_request_lines_are_silent_under_the_test_runner(self):
+        self.assertFalse(logging.getLogger("donature.perf").isEnabledFor(logging.INFO))
+
+    def test_cache_hits_and_misses_are_counted(self):
+        stats, token = perf.start_request()
+        try:
+            cache.set("perf-test", 1)
+            cache.get("perf-test")
+            cache.get("perf-test-missing")
+            cache.get_many(["perf-test", "perf-test-missing"])
+        finally:
+            perf.end_request(token)
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (2, 2))
+
+    def test_nested_templates_are_timed_once(self):
+        engine = Engine(loaders=[("django.template.loaders.locmem.Loader", {"row.html": "{{ i }}"})])
+        template = engine.from_string("{% for i in items %}{% include 'row.html' %}{% endfor %}")
+        stats, token = perf.start_request()
+        try:
+            # Every clock read advances one tick; the 3 includes must not read the clock.
+            with mock.patch("donature.perf.time.perf_counter", side_effect=itertools.count()):
+                template.render(Context({"items": range(3)}))
+        finally:
+            perf.end_request(token)
+        self.assertEqual(stats.template_time, 1)
+
+    def test_histogram_percentiles(self):
+        histogram = perf.LatencyHistogram(buckets=(10, 100))
+        for ms in (1, 2, 3, 50, 500):
+            histogram.observe(ms)
+        self.assertEqual(histogram.percentile(0.5), 10)
+        self.assertEqual(histogram.percentile(0.8), 100)
+        self.assertIsNone(histogram.percentile(0.99))
+
+
+class QueryDetectorTests(TestCase):
+    engine = Engine(loaders=[("django.template.loaders.locmem.Loader", {
+        "rows.html": "{% for qs in querysets %}\n{{ qs.first }}{% endfor %}",
+    })])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 5 AND name = 'it''s' AND x IN (%s, %s, %s)"),
+            fingerprint("SELECT *  FROM t WHERE id = 12 AND name = 'bob' AND x IN (%s)"),
+        )
+
+    def test_budget_flags_repeated_queries_with_call_site(self):
+        with self.assertRaises(QueryBudgetExceeded) as caught:
+            with query_budget(max_repeats=2):
+                for user_id in range(4):
+                    User.objects.filter(id=user_id).first()
+        self.assertIn("N+1 suspect: 4x", str(caught.exception))
+        self.assertIn("donations/tests.py", str(caught.exception))
+
+    def test_budget_reports_template_line(self):
+        querysets = [User.objects.filter(id=user_id) for user_id in range(3)]
+        with self.assertRaises(QueryBudgetExceeded) as caught:
+            with query_budget(max_repeats=1):
+                self.engine.get_template("rows.html").render(Context({"querysets": querysets}))
+        self.assertIn("template rows.html:2", str(caught.exception))
+
+    def test_budget_total_queries(self):
+        with query_budget(max_queries=1):
+            User.objects.count()
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(max_queries=1):
+                User.objects.count()
+                Category.objects.count()
+
+    @override_settings(QUERY_DETECTOR={"REPEAT_THRESHOLD": 1, "SLOW_QUERY_MS": 10_000})
+    def test_middleware_logs_findings(self):
+        with self.assertLogs("donature.queries", "WARNING") as logs:
+            self.client.get("/")
+        self.assertTrue(all(line.startswith("WARNING:donature.queries:home: N+1") for line in logs.output))
+
+    def test_findings_reach_a_handler_with_debug_off(self):
+        record = logging.LogRecord("donature.queries", logging.WARNING, __file__, 0, "finding", None, None)
+        handlers = logging.getLogger("donature.queries").handlers
+        self.assertTrue(any(handler.filter(record) for handler in handlers))
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+
+    def add_item(self, title):
+        return DonationItem.objects.create(title=title, description=title, donor=self.donor, location="Dhaka")
+
+    def test_anonymous_pages_are_cached_per_url(self):
+        self.add_item("Chair")
+        first = self.client.get("/explore/")
+        self.assertEqual(first["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            second = self.client.get("/explore/")
+        self.assertEqual(second["X-Page-Cache"], "hit")
+        self.assertContains(second, "Chair")
+        self.assertEqual(self.client.get("/explore/", {"q": "Chair"})["X-Page-Cache"], "miss")
+
+    def test_item_write_invalidates_its_pages(self):
+        self.client.get("/explore/")
+        self.add_item("Bookshelf")
+        response = self.client.get("/explore/")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Bookshelf")
+        self.assertEqual(self.client.get("/donate-to-requests/")["X-Page-Cache"], "miss")
+        self.assertEqual(self.client.get("/donate-to-requests/")["X-Page-Cache"], "hit")
+        self.add_item("Lamp")
+        self.assertEqual(self.client.get("/donate-to-requests/")["X-Page-Cache"], "hit")
+
+    def test_cached_page_gets_the_visitors_csrf_token(self):
+        self.client.get("/about/")
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.get("/about/")
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotIn("__DONATURE_CSRF_TOKEN__", response.content.decode())
+        token = response.content.decode().split('name="csrfmiddlewaretoken" value="', 1)[1].split('"', 1)[0]
+        login = client.post("/login/", {"csrfmiddlewaretoken": token, "username": "donor", "password": "pass"})
+        self.assertNotEqual(login.status_code, 403)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get("/explore/")
+        self.client.force_login(self.donor)
+        self.assertNotIn("X-Page-Cache", self.client.get("/explore/"))
+
+    @override_settings(DATABASE_REPLICA="replica")
+    def test_pages_render_from_the_primary_right_after_an_invalidation(self):
+        router, read_from = db_router.ReplicaRouter(), []
+
+        @db_router.replica_reads
+        @cache_anonymous_page("items")
+        def view(request):
+            read_from.append(router.db_for_read(User))
+            return HttpResponse("page")
+
+        request = RequestFactory().get("/listing/")
+        request.user = AnonymousUser()
+        invalidate("items")
+        view(request)
+        invalidate("items")
+        with self.settings(DATABASE_PIN_SECONDS=0):
+            view(request)
+        self.assertEqual(read_from, [None, "replica"])
+
+
+class DonationCardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.category = Category.objects.create(name="Furniture")
+        self.item = DonationItem.objects.create(title="Chair", description="Chair", donor=self.donor,
+                                                location="Dhaka", category=self.category)
+        self.client.force_login(self.donor)  # logged in: no full-page cache
+
+    def explore(self):
+        return self.client.get("/explore/").content.decode()
+
+    def test_unchanged_card_body_renders_from_cache(self):
+        self.explore()
+        DonationItem.objects.filter(pk=self.item.pk).update(title="Sofa")  # leaves updated_at alone
+        page = self.explore()
+        self.assertIn("Chair", page)
+        self.assertIn("ago", page)  # the relative date is rendered every time
+
+    def test_renamed_category_refreshes_the_card(self):
+        self.explore()
+        self.category.name = "Home"
+        self.category.save()
+        self.assertIn('<span class="category-tag">Home</span>', self.explore())
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.item = DonationItem.objects.create(title="Chair", description="Chair", donor=self.donor, location="Dhaka")
+        self.url = f"/donation/{self.item.id}/"
+
+    def test_unchanged_page_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Last-Modified", first)
+        with self.assertNumQueries(3):  # item, reviews, claims; no rendering
+            repeat = self.client.get(self.url, headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(repeat.status_code, 304)
+        since = self.client.get(self.url, headers={"If-Modified-Since": first["Last-Modified"]})
+        self.assertEqual(since.status_code, 304)
+
+    def test_new_claim_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        claimant = User.objects.create_user(username="claimant", password="pass", user_type="donor/recipient")
+        DonationClaim.objects.create(donation_item=self.item, claimant=claimant, message="Please")
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_logged_in_etag_follows_notifications(self):
+        self.client.force_login(self.donor)
+        first = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", first)
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": first["ETag"]}).status_code, 304)
+        Notification.objects.create(user=self.donor, message="Hello")
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": first["ETag"]}).status_code, 200)
+
+    def test_new_csrf_cookie_changes_the_etag(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": first["ETag"]}).status_code, 304)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = "x" * 32
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": first["ETag"]}).status_code, 200)
+
+    def test_unknown_item_is_still_a_404(self):
+        self.assertEqual(self.client.get("/donation/999/", headers={"If-None-Match": "*"}).status_code, 404)
+
+
+class StaticPipelineTests(TestCase):
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp(prefix="donature-test-static-src-")
+        self.root = tempfile.mkdtemp(prefix="donature-test-static-")
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(self.source, "site"))
+        with open(os.path.join(self.source, "site", "app.css"), "w") as f:
+            f.write(".card { background: url('logo.png'); }\n" * 200)
+        Image.new("RGB", (40, 40), (0, 128, 0)).save(os.path.join(self.source, "site", "logo.png"))
+        overrides = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_collectstatic_fingerprints_and_precompresses(self):
+        css = static("site/app.css")
+        self.assertRegex(css, r"^/static/site/app\.[0-9a-f]{12}\.css$")
+        name = css[len("/static/"):]
+        for suffix in (".br", ".gz"):
+            self.assertTrue(staticfiles_storage.exists(name + suffix))
+        png = static("site/logo.png")[len("/static/"):]
+        self.assertFalse(staticfiles_storage.exists(png + ".br"))
+        with staticfiles_storage.open(name) as f:
+            self.assertIn(png.split("/")[-1], f.read().decode())  # url() rewritten to the hashed name
+
+    def test_serves_negotiated_variant_as_immutable(self):
+        css = static("site/app.css")
+        response = self.client.get(css, headers={"Accept-Encoding": "gzip, deflate, br"})
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertTrue(brotli.decompress(b"".join(response.streaming_content)).startswith(b".card"))
+
+        self.assertEqual(self.client.get(css, headers={"Accept-Encoding": "gzip"})["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Encoding", self.client.get(css))
+        plain = self.client.get("/static/site/app.css")
+        self.assertNotIn("immutable", plain["Cache-Control"])
+        self.assertEqual(self.client.get("/static/../settings.py").status_code, 404)
+
+
+class CompressionMiddlewareTests(TestCase):
+    body = b"<p>Blankets for the winter drive</p>\n" * 100
+
+    def respond(self, response, accept="gzip, deflate, br"):
+        request = RequestFactory().get("/", headers={"Accept-Encoding": accept})
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiates_brotli_then_gzip(self):
+        response = self.client.get("/about/", headers={"Accept-Encoding": "gzip, deflate, br"})
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn(b"</html>", brotli.decompress(response.content))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        response = self.respond(HttpResponse(self.body), accept="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+
+    def test_passes_through_uncompressible_and_small_responses(self):
+        pdf = self.respond(HttpResponse(self.body, content_type="application/pdf"))
+        self.assertNotIn("Content-Encoding", pdf)
+        self.assertNotIn("Content-Encoding", self.respond(HttpResponse(b"<p>ok</p>")))
+        identity = self.respond(HttpResponse(self.body), accept="identity")
+        self.assertNotIn("Content-Encoding", identity)
+        self.assertEqual(identity["Vary"], "Accept-Encoding")
+
+    def test_streaming_response_is_compressed_chunk_by_chunk(self):
+        response = self.respond(StreamingHttpResponse(iter([self.body, b"", self.body])))
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(b"".join(response.streaming_content)), self.body * 2)
+
+    def test_output_length_is_randomised(self):
+        for accept, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+            lengths = set()
+            for _ in range(10):
+                response = self.respond(HttpResponse(self.body), accept=accept)
+                self.assertEqual(decompress(response.content), self.body)
+                lengths.add(len(response.content))
+            self.assertGreater(len(lengths), 1)
+            stream = self.respond(StreamingHttpResponse(iter([self.body, self.body])), accept=accept)
+            self.assertEqual(decompress(b"".join(stream.streaming_content)), self.body * 2)
+
+    def test_etag_is_weakened(self):
+        response = HttpResponse(self.body)
+        response["ETag"] = '"abc"'
+        self.assertEqual(self.respond(response)["ETag"], 'W/"abc"')
+
+
+@override_settings(DATABASE_REPLICA="replica")
+class ReplicaRouterTests(TestCase):
+    router = db_router.ReplicaRouter()
+
+    def read_alias(self, request, write=False):
+        state, token = db_router.start_request(request)
+        try:
+            with db_router.use_replica():
+                if write:
+                    self.router.db_for_write(User)
+                return self.router.db_for_read(User)
+        finally:
+            db_router.end_request(token)
+
+    def test_only_replica_views_read_from_the_replica(self):
+        request = RequestFactory().get("/explore/")
+        self.assertEqual(self.read_alias(request), "replica")
+        state, token = db_router.start_request(request)
+        try:
+            self.assertIsNone(self.router.db_for_read(User))
+        finally:
+            db_router.end_request(token)
+        self.assertEqual(self.router.db_for_write(User), "default")
+
+    def test_reads_after_a_write_use_the_primary(self):
+        self.assertIsNone(self.read_alias(RequestFactory().get("/"), write=True))
+        pinned = RequestFactory().get("/", headers={"Cookie": f"{db_router.PIN_COOKIE}=1"})
+        self.assertIsNone(self.read_alias(pinned))
+
+    def test_mutations_pin_the_client_to_the_primary(self):
+        self.assertNotIn(db_router.PIN_COOKIE, self.client.get("/contact/").cookies)
+        response = self.client.post("/contact/", {"name": "A", "email": "a@example.com", "message": "Hi"})
+        self.assertEqual(response.cookies[db_router.PIN_COOKIE]["max-age"], 10)
+        with self.settings(DATABASE_REPLICA=None):
+            response = self.client.post("/contact/", {"name": "A", "email": "a@example.com", "message": "Hi"})
+            self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="donor", password="pw", user_type="donor/recipient")
+
+    def test_repeats_coalesce_into_one_unread_row(self):
+        summary = lambda count: f"{count} new claims on 'Chair'"
+        first = notify(self.user, "alice claimed 'Chair'", link="/donation/1/", key="item-claims:1", summary=summary)
+        second = notify(self.user, "bob claimed 'Chair'", link="/donation/1/", key="item-claims:1", summary=summary)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(second.occurrences, 2)
+        self.assertEqual(Notification.objects.get().message, "2 new claims on 'Chair'")
+        notify(self.user, "carol claimed 'Chair'", key="item-claims:1", summary=summary)
+        self.assertEqual(Notification.objects.get().message, "3 new claims on 'Chair'")
+
+        Notification.objects.update(is_read=True)
+        self.assertNotEqual(notify(self.user, "carol claimed 'Chair'", key="item-claims:1").pk, first.pk)
+        notify(self.user, "Welcome")
+        notify(self.user, "Welcome")
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_old_repeats_start_a_new_row(self):
+        first = notify(self.user, "a", key="k")
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertNotEqual(notify(self.user, "b", key="k").pk, first.pk)
+
+    def test_prune_archives_old_read_notifications_in_batches(self):
+        for i in range(5):
+            Notification.objects.create(user=self.user, message=f"old {i}", is_read=True)
+        Notification.objects.create(user=self.user, message="old unread")
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=120))
+        Notification.objects.create(user=self.user, message="recent", is_read=True)
+
+        out = io.StringIO()
+        call_command("prune_notifications", "--batch-size", "2", "--pause", "0", stdout=out)
+        self.assertIn("Archived 5 notifications", out.getvalue())
+        self.assertEqual(sorted(Notification.objects.values_list("message", flat=True)), ["old unread", "recent"])
+        self.assertEqual(ArchivedNotification.objects.filter(user=self.user).count(), 5)
+
+        Notification.objects.filter(message="recent").update(created_at=timezone.now() - timedelta(days=120))
+        call_command("prune_notifications", "--delete", stdout=io.StringIO())
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(ArchivedNotification.objects.count(), 5)
+
+
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="donor", password="pw", user_type="donor/recipient")
+        self.assertEqual(unread_count(self.user), 0)  # creates the counter
+
+    def stored(self):
+        return NotificationCounter.objects.get(user=self.user).unread
+
+    def test_counter_follows_inserts_and_transitions(self):
+        notes = [Notification.objects.create(user=self.user, message=f"n{i}") for i in range(3)]
+        notify(self.user, "again", key="k")
+        notify(self.user, "again", key="k")
+        self.assertEqual(self.stored(), 4)
+
+        notes[0].is_read = True
+        notes[0].save()
+        notes[1].delete()
+        self.assertEqual(self.stored(), 2)
+
+        NotificationCounter.objects.all().delete()
+        self.assertEqual(unread_count(self.user), 2)
+
+    @override_settings(DATABASE_REPLICA="replica")
+    def test_rebuild_reads_the_primary(self):
+        Notification.objects.create(user=self.user, message="n")
+        NotificationCounter.objects.all().delete()
+        with db_router.use_replica():
+            self.assertEqual(recount(self.user), 1)
+        self.assertEqual(self.stored(), 1)
+
+    def test_mark_read_by_ids_and_up_to_id(self):
+        ids = [Notification.objects.create(user=self.user, message=f"n{i}").id for i in range(5)]
+        self.assertEqual(mark_read(self.user, ids=ids[:2]), 2)
+        self.assertEqual(mark_read(self.user, ids=ids[:2]), 0)
+        self.assertEqual(mark_read(self.user, up_to_id=ids[3]), 2)
+        self.assertEqual(self.stored(), 1)
+
+    def test_endpoints(self):
+        ids = [Notification.objects.create(user=self.user, message=f"n{i}").id for i in range(3)]
+        self.client.force_login(self.user)
+        response = self.client.get("/notifications/unread-count/")
+        self.assertEqual(response.json(), {"unread": 3})
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        response = self.client.post("/notifications/mark-read/", {"ids": f"{ids[0]},{ids[1]}"})
+        self.assertEqual(response.json(), {"marked": 2, "unread": 1})
+        self.assertEqual(self.client.post("/notifications/mark-read/", {"ids": "x"}).status_code, 400)
+        self.assertEqual(self.client.get("/notifications/mark-read/").status_code, 405)
+
+    @override_settings(NOTIFICATIONS_PER_PAGE=2)
+    def test_page_marks_only_the_visible_page_read(self):
+        for i in range(3):
+            Notification.objects.create(user=self.user, message=f"n{i}")
+        self.client.force_login(self.user)
+        response = self.client.get("/notifications/")
+        self.assertEqual(len(response.context["notifications"]), 2)
+        self.assertEqual(response.context["notifications_unread_count"], 1)
+        self.assertEqual(self.stored(), 1)
+
+
+@override_settings(LIVE_NOTIFICATIONS=True, NOTIFICATION_STREAM_HEARTBEAT=5, NOTIFICATION_STREAM_MAX_AGE=5)
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="donor", password="pw", user_type="donor/recipient")
+
+    def notify_after_commit(self, message):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(user=self.user, message=message)
+
+    async def open_stream(self, **headers):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/notifications/stream/", headers=headers)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = aiter(response.streaming_content)
+        self.assertTrue((await anext(frames)).startswith(b"retry: "))
+        return frames
+
+    async def test_broker_delivers_across_threads(self):
+        broker = pubsub.InProcessBroker()
+        async with broker.subscribe("c") as subscription:
+            await asyncio.to_thread(broker.publish, "c", {"n": 1})
+            self.assertEqual(await subscription.get(timeout=1), {"n": 1})
+            self.assertIsNone(await subscription.get(timeout=0.01))
+        self.assertEqual(broker.publish("c", {"n": 2}), 0)
+
+    async def test_new_notifications_are_pushed(self):
+        frames = await self.open_stream()
+        next_frame = asyncio.ensure_future(anext(frames))
+        channel = f"notifications:{self.user.pk}"
+        for _ in range(100):  # wait until the stream has subscribed
+            if pubsub.get_broker()._subscribers.get(channel):
+                break
+            await asyncio.sleep(0.01)
+        note = await sync_to_async(self.notify_after_commit)("Your claim was approved")
+        frame = (await asyncio.wait_for(next_frame, 2)).decode()
+        self.assertIn(f"id: {event_id(note)}\nevent: notification\n", frame)
+        data = json.loads(frame.split("data: ", 1)[1])
+        self.assertEqual((data["message"], data["unread"]), ("Your claim was approved", 1))
+        await frames.aclose()
+
+    async def test_reconnect_replays_missed_notifications(self):
+        first = await Notification.objects.acreate(user=self.user, message="seen")
+        await Notification.objects.acreate(user=self.user, message="missed")
+        frames = await self.open_stream(**{"Last-Event-ID": event_id(first)})
+        self.assertIn(b'"message": "missed"', await anext(frames))
+        self.assertIn(b'event: unread\ndata: {"unread": 2}', await anext(frames))
+        await frames.aclose()
+
+    async def test_reconnect_replays_coalesced_notifications(self):
+        claims = await sync_to_async(notify)(self.user, "alice claimed 'Chair'", key="item-claims:1")
+        seen = await Notification.objects.acreate(user=self.user, message="seen")
+        await sync_to_async(notify)(self.user, "bob claimed 'Chair'", key="item-claims:1")
+        frames = await self.open_stream(**{"Last-Event-ID": event_id(seen)})
+        frame = (await anext(frames)).decode()
+        self.assertIn(f"-{claims.id}\nevent: notification\n", frame)
+        self.assertIn('"occurrences": 2', frame)
+        await frames.aclose()
+
+    def test_nothing_is_published_without_a_listener(self):
+        with mock.patch.object(pubsub.get_broker(), "publish") as publish:
+            with self.assertNumQueries(2):  # insert and counter update, no unread count for the event
+                self.notify_after_commit("nobody is listening")
+            with self.settings(LIVE_NOTIFICATIONS=False), self.assertNumQueries(2):
+                self.notify_after_commit("streams are off")
+        publish.assert_not_called()
+
+    async def test_stream_requires_login_and_the_setting(self):
+        self.assertEqual((await self.async_client.get("/notifications/stream/")).status_code, 401)
+        await self.async_client.aforce_login(self.user)
+        with self.settings(LIVE_NOTIFICATIONS=False):
+            self.assertEqual((await self.async_client.get("/notifications/stream/")).status_code, 204)
@@ -0,0 +1,130 @@
+# donations/uploads.py
+"""
+Bounded upload handling.
+
+Every uploaded file is streamed to a temporary file (never held in memory) and
+writing stops as soon as it crosses FILE_UPLOAD_MAX_SIZE; the handler then hands
+the form a zero-length ``RejectedUpload`` that fails validation. Images are
+checked from their header only (format, dimensions, decompression bombs), so
+Pillow never decodes pixel data while validating a request.
+"""
+import io
+import warnings
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+
+def max_upload_size():
+    return getattr(settings, "FILE_UPLOAD_MAX_SIZE", 5 * 1024 * 1024)
+
+
+class RejectedUpload(UploadedFile):
+    """Stand-in for a file that was cut off at the size limit."""
+    rejected = True
+
+    def __init__(self, name, content_type, size, charset=None):
+        super().__init__(io.BytesIO(), name, content_type, size, charset)
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejected:
+            return None
+        self.received += len(raw_data)
+        if self.received > max_upload_size():
+            # Drop what we have; the rest of this file is read from the socket and discarded.
+            self.rejected = True
+            self.file.close()
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUpload(self.file_name, self.content_type, self.received, self.charset)
+        return super().file_complete(file_size)
+
+
+def validate_upload_size(upload):
+    if getattr(upload, "rejected", False) or upload.size > max_upload_size():
+        raise ValidationError(
+            f"File is too large. The maximum size is {filesizeformat(max_upload_size())}.",
+            code="file_too_large",
+        )
+
+
+def validate_image_upload(upload):
+    """Check size, format and dimensions from the image header. Returns the opened (undecoded) image."""
+    validate_upload_size(upload)
+    max_pixels = getattr(settings, "IMAGE_UPLOAD_MAX_PIXELS", 40_000_000)
+    allowed_formats = getattr(settings, "IMAGE_UPLOAD_FORMATS", ("JPEG", "PNG", "WEBP", "GIF"))
+
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(upload)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ValidationError("Image dimensions are too large.", code="image_too_large")
+    except Exception:
+        raise ValidationError("Upload a valid image.", code="invalid_image")
+    finally:
+        upload.seek(0)
+
+    if image.format not in allowed_formats:
+        raise ValidationError(f"{image.format} images are not supported.", code="invalid_image_format")
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValidationError(
+            f"Image is {width}x{height} pixels; the maximum is {max_pixels:,} pixels in total.",
+            code="image_too_large",
+        )
+    return image
+
+
+class BoundedImageField(forms.ImageField):
+    """ImageField that validates from the header instead of Image.verify()/full decode."""
+
+    def to_python(self, data):
+        upload = forms.FileField.to_python(self, data)
+        if upload is None:
+            return None
+        image = validate_image_upload(upload)
+        upload.image = image
+        upload.content_type = Image.MIME.get(image.format)
+        return upload
+
+
+class MultipleImageInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleImageField(BoundedImageField):
+    """Accepts several images from one ``<input multiple>``; cleans to a list."""
+
+    def __init__(self, *args, max_files=None, **kwargs):
+        kwargs.setdefault("widget", MultipleImageInput())
+        self.max_files = max_files
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        uploads = data if isinstance(data, (list, tuple)) else [data]
+        uploads = [upload for upload in uploads if upload]
+        clean_one = super().clean
+        if not uploads:
+            clean_one(None, initial)  # raises "required" when the field is required
+            return []
+        if self.max_files and len(uploads) > self.max_files:
+            raise ValidationError(f"You can upload at most {self.max_files} images.", code="too_many_files")
+        return [clean_one(upload, initial) for upload in uploads]
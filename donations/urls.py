@@ -55,4 +55,7 @@ urlpatterns = [
 
     # Notifications
     path('notifications/', views.notifications_page, name='notifications_page'),
+    path('notifications/unread-count/', views.notifications_unread_count, name='notifications_unread_count'),
+    path('notifications/mark-read/', views.notifications_mark_read, name='notifications_mark_read'),
+    path('notifications/stream/', views.notifications_stream, name='notifications_stream'),
 ]
@@ -9,8 +9,10 @@ from django.shortcuts import get_object_or_404
 
 from django.contrib.auth import update_session_auth_hash
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_POST
 
 
 from django.db.models import Q, Avg, Count
@@ -30,6 +32,17 @@ from django.db.models import Q
 
 from django.urls import reverse
 from django.db import transaction
+from django.conf import settings
+from django.views.static import serve
+from PIL import Image
+from .storage import is_blob_name
+from .uploads import validate_image_upload, validate_upload_size
+from .images import process_uploads, store_variants, has_variants
+from .pagecache import cache_anonymous_page, invalidate
+from .conditional import conditional_page, donation_item_validators, request_item_validators
+from .notifications import mark_read, notify, parse_event_id, stream, unread_count
+from donature.db_router import replica_reads
+from django.core.exceptions import ValidationError
 
 
 
@@ -42,6 +55,8 @@ from django.shortcuts import render, redirect
 from donations.models import DonationItem, DonationClaim, RequestItem
 from ngos.models import Campaign
 
+@replica_reads
+@cache_anonymous_page("items", "campaigns")
 def home(request):
     if request.user.is_authenticated and request.user.user_type == 'admin':
         return redirect('admin_dashboard')  # redirect to admin panel
@@ -138,6 +153,13 @@ def signup(request):
             if password1 != password2:
                 messages.error(request, "Passwords do not match.")
                 return redirect("home")
+
+            for upload in request.FILES.values():
+                try:
+                    validate_upload_size(upload)
+                except ValidationError as e:
+                    messages.error(request, f"{upload.name}: {e.messages[0]}")
+                    return redirect("home")
             
             if User.objects.filter(username=username).exists():
                 messages.error(request, "Username already exists.")
@@ -202,6 +224,8 @@ def signup(request):
 
 
 
+@replica_reads
+@cache_anonymous_page()
 def about(request):
     return render(request, "donations/about.html")
 
@@ -246,6 +270,8 @@ def my_rewards(request):
 
 # ===== EXPLORE DONATIONS VIEW =====
 
+@replica_reads
+@cache_anonymous_page("items")
 def explore_donations(request):
     # Show available donations with filtering and search
     donations = DonationItem.objects.filter(status='available').select_related('category', 'donor')
@@ -294,6 +320,8 @@ def explore_donations(request):
     return render(request, "donations/explore_donations.html", context)
 
 # ===== DONATION DETAIL VIEW =====
+@replica_reads
+@conditional_page(donation_item_validators)
 def donation_detail(request, item_id):
     donation_item = get_object_or_404(DonationItem, id=item_id)
     
@@ -327,19 +355,59 @@ def donation_detail(request, item_id):
 
 # ===== DONATE ITEM VIEW  =====
 
+def prepare_donation_images(form):
+    """
+    Decode the form's photos in parallel (rotate, strip EXIF, compress, thumbnails)
+    before anything is saved. The header checks in validation can't see a truncated
+    or corrupt body, so a photo that fails to decode becomes a form error; returns
+    None in that case.
+    """
+    try:
+        return process_uploads(form.cleaned_data.get('image') or [])
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        form.add_error('image', "One of the photos is damaged or incomplete. Please upload it again.")
+        return None
+
+
+def save_donation_images(donation_item, prepared):
+    """
+    Store photos from prepare_donation_images and insert all DonationImage rows
+    with one bulk_create. The first image becomes primary unless the item already has one.
+    bulk_create sends no post_save, so the card refresh and page invalidation
+    from donations/signals.py are done here.
+    """
+    if not prepared:
+        return []
+    field = DonationImage._meta.get_field('image')
+    has_primary = donation_item.images.filter(is_primary=True).exists()
+
+    images = []
+    for index, (content, variants) in enumerate(prepared):
+        name = field.storage.save(field.generate_filename(None, content.name), content)
+        if not has_variants(name, field.storage):
+            store_variants(name, variants, field.storage)
+        images.append(DonationImage(
+            donation_item=donation_item,
+            image=name,
+            is_primary=(index == 0 and not has_primary),
+        ))
+    created = DonationImage.objects.bulk_create(images)
+    DonationItem.objects.filter(pk=donation_item.pk).update(updated_at=timezone.now())
+    invalidate("items")
+    return created
+
+
 @login_required
 def donate_item(request):
     if request.method == "POST":
         form = DonationItemForm(request.POST, request.FILES)
-        if form.is_valid():
-            donation_item = form.save(commit=False)
-            donation_item.donor = request.user
-            donation_item.save()
-
-            # Save single image
-            image = form.cleaned_data.get('image')
-            if image:
-                DonationImage.objects.create(donation_item=donation_item, image=image)
+        if form.is_valid() and (prepared := prepare_donation_images(form)) is not None:
+            # The item and its images are saved together, or not at all
+            with transaction.atomic():
+                donation_item = form.save(commit=False)
+                donation_item.donor = request.user
+                donation_item.save()
+                save_donation_images(donation_item, prepared)
 
             messages.success(request, "Your donation item has been posted successfully!")
             # add points to user
@@ -386,11 +454,13 @@ def claim_donation(request, item_id):
                 donation_item.save()
 
                 
-                Notification.objects.create(
-                    user=donation_item.donor,
-                    message=f"Your donation '{donation_item.title}' has been claimed by {request.user.username}",
-                    link=f"/donation/{donation_item.id}/"
-                    )
+                notify(
+                    donation_item.donor,
+                    f"Your donation '{donation_item.title}' has been claimed by {request.user.username}",
+                    link=f"/donation/{donation_item.id}/",
+                    key=f"item-claims:{donation_item.id}",
+                    summary=lambda count: f"{count} new claims on your donation '{donation_item.title}'",
+                )
 
                 messages.success(request, "Your claim has been submitted successfully!")
                 return redirect('donation_detail', item_id=donation_item.id)
@@ -433,10 +503,12 @@ def submit_review(request, claim_id):
             review.save()
 
             # ✅ Notify donor
-            Notification.objects.create(
-                user=claim.donation_item.donor,
-                message=f"📣 {request.user.username} submitted a review for '{claim.donation_item.title}'.",
-                link=reverse('donation_detail', args=[claim.donation_item.id])
+            notify(
+                claim.donation_item.donor,
+                f"📣 {request.user.username} submitted a review for '{claim.donation_item.title}'.",
+                link=reverse('donation_detail', args=[claim.donation_item.id]),
+                key=f"item-reviews:{claim.donation_item.id}",
+                summary=lambda count: f"📣 {count} new reviews for '{claim.donation_item.title}'.",
             )
 
             messages.success(request, "✅ Thank you for your review!")
@@ -473,6 +545,8 @@ def request_item(request):
 
 
 
+@replica_reads
+@cache_anonymous_page("requests")
 def donate_to_requests(request):
     """
     Show all approved requests from other users that the logged-in user can fulfill.
@@ -539,10 +613,12 @@ def donate_item_to_request(request, request_id):
             user_reward.add_points(20)  # 20 points for item donation to request
 
             # Notification to requester
-            Notification.objects.create(
-                user=request_item.requester,
-                message=f"{request.user.username} has donated '{donation.title}' for your request '{request_item.title}'.",
-                link=reverse('request_detail', args=[request_item.id]) 
+            notify(
+                request_item.requester,
+                f"{request.user.username} has donated '{donation.title}' for your request '{request_item.title}'.",
+                link=reverse('request_detail', args=[request_item.id]),
+                key=f"request-donations:{request_item.id}",
+                summary=lambda count: f"{count} donations for your request '{request_item.title}'.",
             )
 
             messages.success(request, f"Successfully donated '{donation.title}' to {request_item.title}!")
@@ -621,6 +697,8 @@ def delete_request(request, pk):
     return redirect("my_requests")
 
 
+@replica_reads
+@conditional_page(request_item_validators)
 def request_detail(request, pk):
     req = get_object_or_404(RequestItem, pk=pk)
 
@@ -653,7 +731,7 @@ def my_donations(request):
     donated_to_requests = DonationToRequest.objects.filter(donor=request.user).order_by('-created_at')
     
     # Donations to NGO campaigns
-    donated_to_campaigns = NGODonation.objects.filter(donor=request.user).order_by('-donated_at')
+    donated_to_campaigns = NGODonation.objects.completed().filter(donor=request.user).order_by('-donated_at')
     
     # Claims made by the current user
     claims = DonationClaim.objects.filter(claimant=request.user).order_by('-created_at')
@@ -749,6 +827,7 @@ def upload_photo(request):
     if request.method == "POST" and request.FILES.get('profile_picture'):
         try:
             user = request.user
+            validate_image_upload(request.FILES['profile_picture'])
             user.profile_picture = request.FILES['profile_picture']
             user.save()
             
@@ -763,7 +842,10 @@ def upload_photo(request):
                 messages.success(request, "Profile photo updated successfully!")
                 
         except Exception as e:
-            error_msg = f"Error uploading photo: {str(e)}"
+            if isinstance(e, ValidationError):
+                error_msg = f"Error uploading photo: {e.messages[0]}"
+            else:
+                error_msg = f"Error uploading photo: {str(e)}"
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': False, 'message': error_msg})
             else:
@@ -783,20 +865,13 @@ def edit_donation(request, item_id):
     existing_image = donation.images.first()  # get the first image
 
     if request.method == "POST":
-        form = DonationItemForm(request.POST, instance=donation)
-        new_image = request.FILES.get('image')  # single image upload
-
-        if form.is_valid():
-            form.save()
+        form = DonationItemForm(request.POST, request.FILES, instance=donation)
 
-            if new_image:
-                if existing_image:
-                    # Replace old image
-                    existing_image.image = new_image
-                    existing_image.save()
-                else:
-                    # Create new image if none existed
-                    DonationImage.objects.create(donation_item=donation, image=new_image)
+        if form.is_valid() and (prepared := prepare_donation_images(form)) is not None:
+            with transaction.atomic():
+                form.save()
+                # New images are added to the item's gallery
+                save_donation_images(donation, prepared)
 
             messages.success(request, "Donation updated successfully!")
             return redirect('my_donations')
@@ -807,7 +882,8 @@ def edit_donation(request, item_id):
     context = {
         'form': form,
         'donation': donation,
-        'existing_image': existing_image
+        'existing_image': existing_image,
+        'max_images': settings.MAX_IMAGES_PER_DONATION,
     }
     return render(request, 'donations/edit_donation.html', context)
 
@@ -924,19 +1000,66 @@ def my_claims(request):
 
 @login_required
 def notifications_page(request):
-    # সব notification
     notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
+    paginator = Paginator(notifications, getattr(settings, 'NOTIFICATIONS_PER_PAGE', 20))
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-    # সব unread notification mark as read
-    notifications.filter(is_read=False).update(is_read=True)
+    # Only what is on screen becomes read; rows keep their unread highlight for this render
+    mark_read(request.user, ids=[note.id for note in page_obj if not note.is_read])
 
     context = {
-        'notifications': notifications,
-        'notifications_unread_count': 0,  # সব read হয়ে গিয়েছে
+        'notifications': page_obj,
+        'notifications_unread_count': unread_count(request.user),
     }
     return render(request, 'donations/notifications.html', context)
 
 
+@login_required
+@never_cache
+@replica_reads
+def notifications_unread_count(request):
+    """Just the navbar badge number, for polling."""
+    return JsonResponse({'unread': unread_count(request.user)})
+
+
+@login_required
+@require_POST
+def notifications_mark_read(request):
+    """Mark notifications read: ``ids`` (repeated or comma-separated), or everything up to ``up_to_id``, or all."""
+    try:
+        ids = [int(i) for value in request.POST.getlist('ids') for i in value.split(',') if i.strip()] or None
+        up_to_id = int(request.POST['up_to_id']) if request.POST.get('up_to_id') else None
+    except ValueError:
+        return JsonResponse({'error': 'ids and up_to_id must be integers'}, status=400)
+    marked = mark_read(request.user, ids=ids, up_to_id=up_to_id)
+    return JsonResponse({'marked': marked, 'unread': unread_count(request.user)})
+
+
+async def notifications_stream(request):
+    """Server-sent events with the user's new notifications; needs the ASGI server (LIVE_NOTIFICATIONS)."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not getattr(settings, 'LIVE_NOTIFICATIONS', False):
+        return HttpResponse(status=204)  # tells EventSource to stop reconnecting
+    last_event_id = parse_event_id(request.headers.get('Last-Event-ID'))
+    response = StreamingHttpResponse(stream(user, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    return response
+
 
 
 
+
+# ===== Media (development server) =====
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    django.views.static.serve plus far-future caching for content-addressed blobs,
+    whose URL changes whenever their bytes do.
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_blob_name(path):
+        response["Cache-Control"] = f"public, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, immutable"
+    return response
@@ -2,6 +2,11 @@
 ASGI config for donature project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn donature.asgi:application``) and set
+ASYNC_PAYMENT_INITIATION = True so donation initiations don't tie up a worker
+while waiting on the payment gateway, and LIVE_NOTIFICATIONS = True to push
+notifications to the navbar over server-sent events (one idle connection per
+open tab instead of a worker each).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -0,0 +1,41 @@
+# donature/cache_backends.py
+"""
+Django cache backends that report hits and misses to the per-request stats
+(see donature.perf). Drop-in replacements for the stock backends.
+"""
+from django.core.cache.backends.filebased import FileBasedCache as _FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache as _LocMemCache
+from django.core.cache.backends.redis import RedisCache as _RedisCache
+
+from .perf import record_cache
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            record_cache(0, 1)
+            return default
+        record_cache(1)
+        return value
+
+
+class LocMemCache(InstrumentedCacheMixin, _LocMemCache):
+    pass
+
+
+class FileBasedCache(InstrumentedCacheMixin, _FileBasedCache):
+    pass
+
+
+class RedisCache(InstrumentedCacheMixin, _RedisCache):
+    # The other backends implement get_many() on top of get(); Redis does an MGET.
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        record_cache(len(found), len(keys) - len(found))
+        return found
@@ -0,0 +1,141 @@
+# donature/compression.py
+"""
+Content-coding helpers shared by the static pipeline (donature.staticfiles)
+and CompressionMiddleware.
+"""
+import gzip
+import secrets
+import string
+import struct
+import zlib
+
+import brotli
+
+ENCODINGS = ("br", "gzip")  # in order of preference
+
+# Types worth compressing; images, fonts, PDFs and archives are compressed already.
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "application/xhtml+xml",
+    "application/rss+xml",
+    "application/atom+xml",
+    "application/manifest+json",
+    "image/svg+xml",
+    "image/x-icon",
+    "image/vnd.microsoft.icon",
+)
+
+
+def is_compressible(content_type):
+    content_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def accepted_encodings(header):
+    """``{coding: q-value}`` of an Accept-Encoding header."""
+    accepted = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate(header, available=ENCODINGS):
+    """The preferred coding in ``available`` that the client accepts, or None for identity."""
+    accepted = accepted_encodings(header)
+    for coding in available:
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def compress(data, encoding, level=None, max_random_bytes=0):
+    """
+    One-shot compression; ``level`` is the Brotli quality (0-11) or gzip level
+    (1-9). ``max_random_bytes`` pads the output by a random length (see
+    StreamCompressor), for responses that may mix secrets with user input.
+    """
+    if max_random_bytes:
+        compressor = StreamCompressor(encoding, _default_level(encoding, level), max_random_bytes)
+        return compressor.compress(data) + compressor.finish()
+    if encoding == "br":
+        return brotli.compress(data, quality=_default_level(encoding, level))
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=_default_level(encoding, level), mtime=0)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+def _default_level(encoding, level):
+    if level is not None:
+        return level
+    return 11 if encoding == "br" else 9
+
+
+def random_padding(max_random_bytes):
+    """1 to ``max_random_bytes`` random ASCII letters."""
+    length = 1 + secrets.randbelow(max_random_bytes)
+    return "".join(secrets.choice(string.ascii_letters) for _ in range(length)).encode()
+
+
+def _brotli_metadata(data):
+    """A Brotli metadata meta-block carrying ``data`` (1-256 bytes), which decoders skip."""
+    # ISLAST=0, MNIBBLES=0 (coded 3), reserved 0, MSKIPBYTES=1, then MSKIPLEN-1 in 8 bits
+    return (0x16 | (len(data) - 1) << 6).to_bytes(2, "little") + data
+
+
+class StreamCompressor:
+    """
+    Incremental compression for streaming responses; every chunk is flushed so it reaches the client.
+
+    With ``max_random_bytes``, the output is padded by a random length so that
+    its size no longer tells an attacker how well injected text compressed
+    against a secret on the page (BREACH): a random gzip file name, as
+    django.utils.text.compress_string adds, or a Brotli metadata block.
+    """
+
+    def __init__(self, encoding, level, max_random_bytes=0):
+        self.encoding = encoding
+        padding = random_padding(min(max_random_bytes, 256)) if max_random_bytes else b""
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+            self._padding = _brotli_metadata(padding) if padding else b""
+        elif encoding == "gzip":
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            flags = gzip.FNAME if padding else 0
+            # magic, deflate, flags, mtime 0, no extra flags, OS unknown, optional file name
+            self._header = b"\x1f\x8b\x08" + bytes([flags]) + b"\x00" * 5 + b"\xff"
+            if padding:
+                self._header += padding + b"\x00"
+            self._crc = self._size = 0
+        else:
+            raise ValueError(f"Unsupported content coding: {encoding}")
+
+    def compress(self, chunk):
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        self._crc = zlib.crc32(chunk, self._crc)
+        self._size += len(chunk)
+        return self._take_header() + self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            # flush() ends the stream on a meta-block boundary, where a metadata block can go
+            return self._compressor.flush() + self._padding + self._compressor.finish()
+        trailer = struct.pack("<II", self._crc & 0xFFFFFFFF, self._size & 0xFFFFFFFF)
+        return self._take_header() + self._compressor.flush() + trailer
+
+    def _take_header(self):
+        header, self._header = self._header, b""
+        return header
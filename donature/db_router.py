@@ -0,0 +1,126 @@
+# donature/db_router.py
+"""
+Read-replica routing.
+
+Reads go to the replica alias (DATABASE_REPLICA) only inside views marked
+``@replica_reads`` (listings, detail pages, admin dashboards); everything else,
+and every write, uses the primary. Read-your-writes:
+
+* once a request writes anything, its remaining reads use the primary;
+* ReplicaPinMiddleware (donature.middleware) then sets a short-lived cookie
+  (DATABASE_PIN_SECONDS, longer than the expected replication lag), as does
+  every POST/PUT/PATCH/DELETE, so that user's next pages are read from the
+  primary too.
+
+``use_primary()`` sends a block's reads back to the primary inside a replica
+view (donations.pagecache renders on the primary for a short while after an
+invalidation, so a lagging replica's page isn't cached as the new one).
+
+Without DATABASE_REPLICA the router returns None and Django uses ``default``.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE = "db_primary"
+UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class RoutingState:
+    """Per-request routing flags. Mutable, so writes made in a copied context (sync_to_async) still count."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = False
+        self.wrote = False
+
+
+_state = ContextVar("donature_db_routing", default=None)
+
+
+def start_request(request):
+    """Routing state for one request; returns ``(state, token)`` for end_request."""
+    state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+    return state, _state.set(state)
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def needs_pin(request, state):
+    return bool(replica_alias()) and (state.wrote or request.method in UNSAFE_METHODS)
+
+
+def replica_alias():
+    return getattr(settings, "DATABASE_REPLICA", None)
+
+
+@contextmanager
+def use_replica():
+    state = _state.get()
+    token = None
+    if state is None:
+        state = RoutingState()
+        token = _state.set(state)
+    previous, state.replica = state.replica, True
+    try:
+        yield state
+    finally:
+        state.replica = previous
+        if token is not None:
+            _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, even in a ``@replica_reads`` view."""
+    state = _state.get()
+    previous = state.replica if state is not None else False
+    if state is not None:
+        state.replica = False
+    try:
+        yield state
+    finally:
+        if state is not None:
+            state.replica = previous
+
+
+def replica_reads(view_func):
+    """Let a read-only view's queries go to the replica (unless the user is pinned to the primary)."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            with use_replica():
+                return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica or state.pinned or state.wrote:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # the replica holds the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()  # schema arrives through replication
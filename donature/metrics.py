@@ -0,0 +1,232 @@
+# donature/metrics.py
+"""
+A small metrics registry with Prometheus text exposition.
+
+Counters and histograms are kept in memory per process and written, at most
+every METRICS_FLUSH_INTERVAL seconds, to ``<METRICS_DIR>/<pid>.json`` (atomic
+replace). A scrape (panel/metrics/) merges the files of all processes, so every
+gunicorn worker is counted no matter which one answers. Gauges are computed at
+scrape time from a callback (e.g. a COUNT query), so they need no storage.
+
+Files of exited workers are kept so their counts don't vanish; clear METRICS_DIR
+on deploy.
+"""
+import atexit
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_registry = {}
+_last_flush = 0.0
+
+
+def _metrics_dir():
+    return getattr(settings, "METRICS_DIR", None)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        with _lock:
+            _registry[name] = self
+
+    def _key(self, labels):
+        return json.dumps([str(labels.get(label, "")) for label in self.labels])
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        maybe_flush()
+
+    def dump(self):
+        return dict(self.values)
+
+    @staticmethod
+    def merge(total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+        return total
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            row[bisect.bisect_left(self.buckets, value)] += 1
+            row[-1] += value
+        maybe_flush()
+
+    def dump(self):
+        return {key: list(row) for key, row in self.values.items()}
+
+    @staticmethod
+    def merge(total, values):
+        for key, row in values.items():
+            if key in total and len(total[key]) == len(row):
+                total[key] = [a + b for a, b in zip(total[key], row)]
+            else:
+                total[key] = list(row)
+        return total
+
+
+class Gauge(Metric):
+    """Evaluated at scrape time: ``func()`` returns a number (or ``{label values tuple: number}``)."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, func, labels=()):
+        super().__init__(name, help_text, labels)
+        self.func = func
+
+    def collect(self):
+        value = self.func()
+        if isinstance(value, dict):
+            return {json.dumps([str(v) for v in key]): number for key, number in value.items()}
+        return {self._key({}): value}
+
+
+# ===== Multi-process store =====
+
+def maybe_flush(force=False):
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < getattr(settings, "METRICS_FLUSH_INTERVAL", 5):
+        return
+    _last_flush = now
+    with _lock:
+        snapshot = {name: metric.dump() for name, metric in _registry.items() if metric.kind != "gauge"}
+    if not any(snapshot.values()):
+        return  # nothing recorded (e.g. a management command): leave no file behind
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, os.path.join(directory, f"{os.getpid()}.json"))
+
+
+atexit.register(lambda: maybe_flush(force=True))
+
+
+def collect():
+    """``{name: merged values}`` across all processes (just this one without METRICS_DIR)."""
+    directory = _metrics_dir()
+    if not directory:
+        with _lock:
+            return {name: metric.dump() for name, metric in _registry.items() if metric.kind != "gauge"}
+
+    maybe_flush(force=True)
+    merged = {}
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):  # a worker mid-replace, or a truncated file
+            continue
+        for name, values in snapshot.items():
+            metric = _registry.get(name)
+            if metric is not None:
+                merged[name] = metric.merge(merged.get(name, {}), values)
+    return merged
+
+
+# ===== Exposition =====
+
+def _labels(metric, key, extra=()):
+    pairs = list(zip(metric.labels, json.loads(key))) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    merged = collect()
+    lines = []
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if metric.kind == "gauge":
+            for key, value in metric.collect().items():
+                lines.append(f"{metric.name}{_labels(metric, key)} {_number(value)}")
+        elif metric.kind == "counter":
+            for key, value in sorted(merged.get(metric.name, {}).items()):
+                lines.append(f"{metric.name}_total{_labels(metric, key)} {_number(value)}")
+        else:
+            for key, row in sorted(merged.get(metric.name, {}).items()):
+                cumulative = 0
+                for bound, count in zip((*metric.buckets, float("inf")), row):
+                    cumulative += count
+                    lines.append(f"{metric.name}_bucket{_labels(metric, key, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(metric, key)} {_number(row[-1])}")
+                lines.append(f"{metric.name}_count{_labels(metric, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Zero all counters and histograms of this process (tests)."""
+    with _lock:
+        for metric in _registry.values():
+            if metric.kind != "gauge":
+                metric.values.clear()
+
+
+# ===== Platform metrics =====
+
+def _notification_backlog():
+    from donations.models import Notification
+
+    return Notification.objects.filter(is_read=False).count()
+
+
+HTTP_REQUESTS = Counter("donature_http_requests", "HTTP requests by view, method and status.",
+                        labels=("view", "method", "status"))
+HTTP_LATENCY = Histogram("donature_http_request_duration_seconds", "Request latency by view.", labels=("view",))
+CLAIMS_CREATED = Counter("donature_claims_created", "Donation claims created.")
+CLAIMS_APPROVED = Counter("donature_claims_approved", "Donation claims approved.")
+DONATION_AMOUNT = Histogram("donature_ngo_donation_amount_bdt", "Completed NGO donation amounts (BDT).",
+                            buckets=(100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000))
+GATEWAY_LATENCY = Histogram("donature_gateway_request_duration_seconds", "SSLCommerz API call latency.",
+                            labels=("operation",))
+GATEWAY_ERRORS = Counter("donature_gateway_errors", "Failed SSLCommerz API calls (incl. open circuit).",
+                         labels=("operation",))
+NOTIFICATION_BACKLOG = Gauge("donature_notification_backlog", "Unread notifications.", _notification_backlog)
@@ -0,0 +1,271 @@
+# donature/middleware.py
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from . import db_router, metrics, perf, profiling, querycheck
+from .compression import StreamCompressor, compress, is_compressible, negotiate
+
+logger = logging.getLogger("donature.perf")
+
+
+class PerformanceMiddleware:
+    """
+    Measures every request: total latency, SQL count/time, template render time
+    and cache hits/misses. Adds a Server-Timing header (visible in the browser's
+    network panel) when SERVER_TIMING_HEADER or DEBUG is on, logs one JSON line
+    to the ``donature.perf`` logger at INFO (shown when PERF_LOG_LEVEL allows it)
+    and feeds the per-URL-name latency histograms in donature.perf. N+1 and slow-query
+    findings (donature.querycheck) are logged to ``donature.queries``. Keep it
+    first in MIDDLEWARE so the total includes the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        perf.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            perf.install_query_timer(connection)
+        stats, report, tokens = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.end(tokens)
+        return self.finish(request, response, stats, report)
+
+    async def __acall__(self, request):
+        stats, report, tokens = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.end(tokens)
+        return self.finish(request, response, stats, report)
+
+    def start(self):
+        stats, stats_token = perf.start_request()
+        report = querycheck.request_report()
+        report_token = perf.push_report(report) if report is not None else None
+        return stats, report, (stats_token, report_token)
+
+    def end(self, tokens):
+        stats_token, report_token = tokens
+        if report_token is not None:
+            perf.pop_report(report_token)
+        perf.end_request(stats_token)
+
+    def finish(self, request, response, stats, report):
+        total_ms = stats.elapsed() * 1000
+        db_ms = stats.db_time * 1000
+        template_ms = stats.template_time * 1000
+        match = getattr(request, "resolver_match", None)
+        url_name = (match.view_name if match else None) or "<unresolved>"
+
+        if getattr(settings, "SERVER_TIMING_HEADER", False) or settings.DEBUG:
+            response.headers["Server-Timing"] = ", ".join([
+                f'db;dur={db_ms:.1f};desc="{stats.queries} queries"',
+                f"tpl;dur={template_ms:.1f}",
+                f'cache;desc="{stats.cache_hits} hits, {stats.cache_misses} misses"',
+                f"total;dur={total_ms:.1f}",
+            ])
+
+        if report is not None:
+            querycheck.check_request(report, url_name)
+        perf.observe_request(url_name, total_ms, stats.queries)
+        metrics.HTTP_REQUESTS.inc(view=url_name, method=request.method, status=response.status_code)
+        metrics.HTTP_LATENCY.observe(total_ms / 1000, view=url_name)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "url_name": url_name,
+                "status": response.status_code,
+                "total_ms": round(total_ms, 2),
+                "db_ms": round(db_ms, 2),
+                "queries": stats.queries,
+                "template_ms": round(template_ms, 2),
+                "cache_hits": stats.cache_hits,
+                "cache_misses": stats.cache_misses,
+            }))
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Profiles a request carrying a valid signed ``?_profile=`` token (created by an
+    admin in the panel) and stores the result under PROFILE_DIR. The file name is
+    returned in an ``X-Profile`` header. Place it right after PerformanceMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = self.requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        with profiling.ProfiledRequest(mode) as run:
+            response = self.get_response(request)
+        response.headers["X-Profile"] = run.save(request)
+        return response
+
+    async def __acall__(self, request):
+        mode = self.requested_mode(request)
+        if mode is None:
+            return await self.get_response(request)
+        with profiling.ProfiledRequest(mode) as run:
+            response = await self.get_response(request)
+        response.headers["X-Profile"] = run.save(request)
+        return response
+
+    @staticmethod
+    def requested_mode(request):
+        token = request.GET.get(profiling.TOKEN_PARAM)
+        return profiling.read_token(token) if token else None
+
+
+class CompressionMiddleware:
+    """
+    Compresses text responses with Brotli or gzip, whichever the client prefers
+    in Accept-Encoding. Images, PDFs, archives, responses that already carry a
+    Content-Encoding (precompressed static files) and event streams pass through.
+    Streaming responses are compressed chunk by chunk, flushing each chunk.
+    Levels trade CPU for bytes (see ``manage.py benchmark_compression``); the
+    defaults favour latency since every response is compressed on the fly.
+    Pages carry the CSRF token next to reflected input (search terms), so every
+    body is padded by up to COMPRESSION_MAX_RANDOM_BYTES random bytes, as
+    Django's GZipMiddleware does against BREACH.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    @staticmethod
+    def level(encoding):
+        if encoding == "br":
+            return getattr(settings, "COMPRESSION_BROTLI_QUALITY", 4)
+        return getattr(settings, "COMPRESSION_GZIP_LEVEL", 6)
+
+    def compress(self, request, response):
+        content_type = response.get("Content-Type", "")
+        if (response.has_header("Content-Encoding") or not is_compressible(content_type)
+                or content_type.startswith("text/event-stream")):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+
+        level = self.level(encoding)
+        padding = getattr(settings, "COMPRESSION_MAX_RANDOM_BYTES", 100)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.acompress_stream(response.streaming_content, encoding, level, padding)
+            else:
+                response.streaming_content = self.compress_stream(response.streaming_content, encoding, level, padding)
+            del response.headers["Content-Length"]
+        else:
+            if len(response.content) < getattr(settings, "COMPRESSION_MIN_SIZE", 512):
+                return response
+            compressed = compress(response.content, encoding, level, padding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and not etag.startswith("W/"):
+            response.headers["ETag"] = "W/" + etag  # the bytes differ from the uncompressed representation
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def compress_stream(chunks, encoding, level, max_random_bytes):
+        compressor = StreamCompressor(encoding, level, max_random_bytes)
+        for chunk in chunks:
+            if chunk:
+                yield compressor.compress(chunk)
+        yield compressor.finish()
+
+    @staticmethod
+    async def acompress_stream(chunks, encoding, level, max_random_bytes):
+        compressor = StreamCompressor(encoding, level, max_random_bytes)
+        async for chunk in chunks:
+            if chunk:
+                yield compressor.compress(chunk)
+        yield compressor.finish()
+
+
+class ReplicaPinMiddleware:
+    """
+    Tracks database writes per request (donature.db_router) and, after one or
+    after any unsafe method, pins the client to the primary for
+    DATABASE_PIN_SECONDS with a cookie. Place it above SessionMiddleware so
+    session saves count as writes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = db_router.start_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = db_router.start_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        return self.finish(request, response, state)
+
+    @staticmethod
+    def finish(request, response, state):
+        if db_router.needs_pin(request, state):
+            response.set_cookie(
+                db_router.PIN_COOKIE, "1", max_age=getattr(settings, "DATABASE_PIN_SECONDS", 10),
+                httponly=True, samesite="Lax",
+            )
+        return response
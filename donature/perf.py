@@ -0,0 +1,190 @@
+# donature/perf.py
+"""
+Per-request performance counters.
+
+PerformanceMiddleware puts a ``RequestStats`` into a context variable for the
+duration of a request; the hooks below add to it from wherever the work
+happens: a DB execute wrapper (SQL count and time), a wrapper around
+``Template.render`` (template time, outermost render only) and the
+instrumented cache backends in ``donature.cache_backends`` (hits/misses).
+Context variables follow the request into ``sync_to_async`` threads, so async
+views are measured too. Outside a request every hook is a no-op.
+
+Query reports (donature.querycheck) can be pushed alongside, every executed
+query is passed to each active report.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.template import base as template_base
+
+_current = ContextVar("donature_request_stats", default=None)
+_reports = ContextVar("donature_query_reports", default=())
+
+
+class RequestStats:
+    __slots__ = ("started", "queries", "db_time", "template_time", "template_depth", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_stats():
+    return _current.get()
+
+
+def push_report(report):
+    return _reports.set(_reports.get() + (report,))
+
+
+def pop_report(token):
+    _reports.reset(token)
+
+
+# ===== Hooks =====
+
+def record_cache(hits, misses=0):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def query_timer(execute, sql, params, many, context):
+    stats = _current.get()
+    reports = _reports.get()
+    if stats is None and not reports:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+        for report in reports:
+            report.observe(sql, elapsed * 1000)
+
+
+def install_query_timer(connection, **kwargs):
+    # Kept on the connection for its lifetime (rather than per request via the
+    # execute_wrapper() context manager) so queries from sync_to_async threads,
+    # which use their own connections, are counted as well.
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+_original_render = template_base.Template.render
+
+
+def _timed_render(self, context):
+    stats = _current.get()
+    # {% include %} and inclusion tags render nested templates: time the outermost only
+    if stats is None or stats.template_depth:
+        return _original_render(self, context)
+    stats.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        stats.template_depth -= 1
+        stats.template_time += time.perf_counter() - start
+
+
+_installed = False
+
+
+def install():
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    template_base.Template.render = _timed_render
+    connection_created.connect(install_query_timer, dispatch_uid="donature.perf.query_timer")
+
+
+# ===== Latency histograms =====
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (ms); the last count is the +Inf bucket."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+
+    def observe(self, ms, queries=0):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.queries += queries
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (None for the +Inf bucket)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else 0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "queries_per_request": round(self.queries / self.count, 2) if self.count else 0,
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe_request(url_name, ms, queries):
+    with _histograms_lock:
+        histogram = _histograms.get(url_name)
+        if histogram is None:
+            histogram = _histograms[url_name] = LatencyHistogram()
+        histogram.observe(ms, queries)
+
+
+def latency_snapshot():
+    with _histograms_lock:
+        return {url_name: histogram.snapshot() for url_name, histogram in sorted(_histograms.items())}
+
+
+def reset_histograms():
+    with _histograms_lock:
+        _histograms.clear()
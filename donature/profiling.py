@@ -0,0 +1,185 @@
+# donature/profiling.py
+"""
+On-demand profiling of a single request.
+
+An admin creates a signed, expiring link in the panel (Profiles); opening it
+adds ``?_profile=<token>`` and ProfilerMiddleware runs that one request under
+cProfile (``.prof``, open with pstats/snakeviz) or a sampling profiler
+(``.folded`` stacks, open with speedscope or flamegraph.pl). Requests without
+the parameter pay for a single dict lookup.
+
+A link works once, and only while the admin who created it still is one: the
+middleware runs before authentication, so the token itself carries the admin's
+pk and a nonce that is spent in the cache on first use.
+"""
+import cProfile
+import io
+import os
+import pstats
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.text import slugify
+
+TOKEN_PARAM = "_profile"
+MODES = ("cprofile", "sample")
+_SALT = "donature.profiling"
+
+
+def profile_dir():
+    return settings.PROFILE_DIR
+
+
+def make_token(user, mode="cprofile"):
+    return signing.TimestampSigner(salt=_SALT).sign(f"{user.pk}:{mode}:{secrets.token_urlsafe(8)}")
+
+
+def read_token(token):
+    """The profiling mode of a valid, unexpired, unused token from an active admin, else None."""
+    max_age = getattr(settings, "PROFILER_TOKEN_MAX_AGE", 15 * 60)
+    try:
+        value = signing.TimestampSigner(salt=_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return None
+    pk, mode, nonce = (value.split(":") + ["", ""])[:3]
+    if mode not in MODES or not nonce:
+        return None
+    if not get_user_model().objects.filter(pk=pk, user_type="admin", is_active=True).exists():
+        return None
+    if not cache.add(f"profiling:used:{nonce}", True, max_age):
+        return None
+    return mode
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread every ``interval`` seconds from a helper thread."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, "PROFILER_SAMPLE_INTERVAL", 0.005)
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def enable(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="donature-sampler", daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        base_dir = str(settings.BASE_DIR)
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = code.co_filename
+                if filename.startswith(base_dir):
+                    filename = os.path.relpath(filename, base_dir)
+                stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump_stats(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _start(mode):
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            return profiler
+        except ValueError:  # another request in this process is already under cProfile
+            pass
+    profiler = SamplingProfiler()
+    profiler.enable()
+    return profiler
+
+
+def save(profiler, request, elapsed):
+    """Write the profile to PROFILE_DIR and prune old ones. Returns the file name."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    match = getattr(request, "resolver_match", None)
+    label = slugify((match.view_name if match else None) or request.path) or "root"
+    stamp = timezone.now().strftime("%Y%m%d-%H%M%S-%f")
+    ext = "prof" if isinstance(profiler, cProfile.Profile) else "folded"
+    name = f"{stamp}_{label}_{elapsed * 1000:.0f}ms.{ext}"
+    profiler.dump_stats(os.path.join(directory, name))
+    _prune(directory)
+    return name
+
+
+def _prune(directory):
+    keep = getattr(settings, "PROFILE_KEEP", 50)
+    for name in [p["name"] for p in list_profiles()][keep:]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles():
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith((".prof", ".folded")):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append({
+                "name": name,
+                "size": stat.st_size,
+                "created": datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone()),
+            })
+    return sorted(profiles, key=lambda p: p["name"], reverse=True)
+
+
+def profile_path(name):
+    """Absolute path of a stored profile, or None (also for anything that isn't a plain listed file)."""
+    if name not in {p["name"] for p in list_profiles()}:
+        return None
+    return os.path.join(profile_dir(), name)
+
+
+class ProfiledRequest:
+    """``with ProfiledRequest(mode) as run: ...`` then ``run.save(request)``."""
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profiler = _start(self.mode)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.elapsed = time.perf_counter() - self.started
+
+    def save(self, request):
+        return save(self.profiler, request, self.elapsed)
+
+
+def summary(name, limit=40):
+    """Top functions by cumulative time of a stored cProfile profile, as text."""
+    out = io.StringIO()
+    pstats.Stats(profile_path(name), stream=out).strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
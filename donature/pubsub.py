@@ -0,0 +1,112 @@
+# donature/pubsub.py
+"""
+Publish/subscribe for pushing events to open connections (the notification
+stream in donations/notifications.py).
+
+``get_broker()`` returns the NOTIFICATION_BROKER instance. ``publish()`` is
+plain sync code, safe to call from any thread (views, signal handlers,
+on_commit callbacks); ``subscribe()`` is an async context manager used on the
+ASGI event loop.
+
+InProcessBroker only reaches subscribers in the same process: enough for one
+ASGI worker. Several workers need a broker backed by a shared channel (e.g.
+Redis pub/sub) implementing the same methods.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """Messages delivered to one subscriber, in order, while inside ``async with``."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self._entry = None
+
+    async def __aenter__(self):
+        self._entry = (asyncio.get_running_loop(), asyncio.Queue(self.broker.max_queue))
+        self.broker.add_subscriber(self.channel, self._entry)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.remove_subscriber(self.channel, self._entry)
+
+    async def get(self, timeout=None):
+        """The next message, or None if nothing arrived within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self._entry[1].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def has_subscribers(self, channel):
+        """Whether a message on ``channel`` would reach anyone (lets publishers skip building it)."""
+        return True  # a broker that can't tell cheaply always publishes
+
+    def subscribe(self, channel):
+        """Async context manager yielding a subscription (``await subscription.get(timeout)``) to ``channel``."""
+        raise NotImplementedError
+
+
+def _offer(queue, message):
+    if queue.full():
+        queue.get_nowait()  # a subscriber that stopped reading loses its oldest message, not the newest
+    queue.put_nowait(message)
+
+
+class InProcessBroker(Broker):
+    """Fan-out to asyncio queues on the subscribers' event loops."""
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:  # loop already closed; its subscription is about to go away
+                pass
+        return len(subscribers)
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._subscribers.get(channel))
+
+    def subscribe(self, channel):
+        return Subscription(self, channel)
+
+    def add_subscriber(self, channel, entry):
+        with self._lock:
+            self._subscribers[channel].add(entry)
+
+    def remove_subscriber(self, channel, entry):
+        with self._lock:
+            self._subscribers[channel].discard(entry)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "NOTIFICATION_BROKER", "donature.pubsub.InProcessBroker")
+                _broker = import_string(path)()
+    return _broker
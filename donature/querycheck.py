@@ -0,0 +1,161 @@
+# donature/querycheck.py
+"""
+N+1 and slow-query detection.
+
+Every query of a request is reduced to a fingerprint (literals and IN-lists
+collapsed), so ``SELECT ... WHERE donation_item_id = 1`` and ``... = 2`` count
+as the same statement. A fingerprint seen QUERY_DETECTOR["REPEAT_THRESHOLD"]
+times in one request is an N+1 suspect; a query slower than
+QUERY_DETECTOR["SLOW_QUERY_MS"] is reported as slow. Stacks are inspected only
+for those (never for ordinary queries), to name the project frame that issued
+the query and the template line being rendered, which keeps the detector cheap
+enough to leave on in production.
+
+PerformanceMiddleware checks every request and logs findings to the
+``donature.queries`` logger. Tests can use ``query_budget()`` to fail when a
+block of code goes over budget.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from . import perf
+
+logger = logging.getLogger("donature.queries")
+
+DEFAULTS = {
+    "ENABLED": True,
+    "REPEAT_THRESHOLD": 5,
+    "SLOW_QUERY_MS": 100,
+    "RAISE": False,
+}
+
+_STRING = re.compile(r"'(?:''|[^'])*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|\d+)\s*,?)+\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+_SKIP_FILES = (os.path.abspath(__file__), os.path.abspath(perf.__file__))
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "QUERY_DETECTOR", {})}
+
+
+def fingerprint(sql):
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def call_site():
+    """``(project frame, template line)`` of the code running the current query, either may be None."""
+    base_dir = os.path.abspath(str(settings.BASE_DIR))
+    code_site = template_site = None
+    frame = sys._getframe(1)
+    while frame is not None and (code_site is None or template_site is None):
+        filename = frame.f_code.co_filename
+        if template_site is None and frame.f_code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            origin, token = getattr(node, "origin", None), getattr(node, "token", None)
+            if origin is not None and token is not None:
+                template_site = f"{origin.template_name}:{token.lineno}"
+        if (code_site is None and filename.startswith(base_dir) and "site-packages" not in filename
+                and filename not in _SKIP_FILES):
+            code_site = f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return code_site, template_site
+
+
+class QueryReport:
+
+    def __init__(self, repeat_threshold=None, slow_query_ms=None):
+        options = config()
+        self.repeat_threshold = repeat_threshold or options["REPEAT_THRESHOLD"]
+        self.slow_query_ms = slow_query_ms or options["SLOW_QUERY_MS"]
+        self.total = 0
+        self.counts = Counter()
+        self.sites = {}
+        self.slow = []
+
+    def observe(self, sql, ms):
+        self.total += 1
+        key = fingerprint(sql)
+        self.counts[key] += 1
+        if self.counts[key] == self.repeat_threshold:
+            self.sites[key] = call_site()
+        if ms >= self.slow_query_ms:
+            self.slow.append((key, ms, call_site()))
+
+    def repeated(self):
+        return [(key, self.counts[key], site) for key, site in self.sites.items()]
+
+    def problems(self):
+        found = [
+            f"N+1 suspect: {count}x {key}{_describe(site)}" for key, count, site in self.repeated()
+        ]
+        found += [f"Slow query ({ms:.0f} ms): {key}{_describe(site)}" for key, ms, site in self.slow]
+        return found
+
+
+def _describe(site):
+    code_site, template_site = site
+    parts = [f"at {code_site}" if code_site else None, f"template {template_site}" if template_site else None]
+    parts = [part for part in parts if part]
+    return f" ({', '.join(parts)})" if parts else ""
+
+
+def request_report():
+    """A report for PerformanceMiddleware, or None when the detector is disabled."""
+    return QueryReport() if config()["ENABLED"] else None
+
+
+def check_request(report, url_name):
+    problems = report.problems()
+    if not problems:
+        return
+    for problem in problems:
+        logger.warning("%s: %s", url_name, problem)
+    if config()["RAISE"]:
+        raise QueryBudgetExceeded(f"{url_name}: " + "; ".join(problems))
+
+
+@contextmanager
+def query_budget(max_queries=None, max_repeats=None, slow_query_ms=None):
+    """
+    Fail (QueryBudgetExceeded) if the block runs more than ``max_queries`` queries,
+    any fingerprint more than ``max_repeats`` times, or a query slower than
+    ``slow_query_ms``::
+
+        with query_budget(max_repeats=2):
+            self.client.get("/")
+    """
+    perf.install()
+    for connection in connections.all(initialized_only=True):
+        perf.install_query_timer(connection)
+    # Sites are captured from the first repeat above the allowance on.
+    report = QueryReport(
+        repeat_threshold=max_repeats + 1 if max_repeats is not None else sys.maxsize,
+        slow_query_ms=slow_query_ms if slow_query_ms is not None else float("inf"),
+    )
+    token = perf.push_report(report)
+    try:
+        yield report
+    finally:
+        perf.pop_report(token)
+
+    problems = report.problems()
+    if max_queries is not None and report.total > max_queries:
+        problems.insert(0, f"{report.total} queries, budget is {max_queries}")
+    if problems:
+        raise QueryBudgetExceeded("\n".join(problems))
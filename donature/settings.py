@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +54,10 @@ AUTH_USER_MODEL = 'donations.User'
 
 
 MIDDLEWARE = [
+    'donature.middleware.PerformanceMiddleware',
+    'donature.middleware.ProfilerMiddleware',
+    'donature.middleware.CompressionMiddleware',
+    'donature.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +90,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
 
                 'donations.context_processors.notifications_context',
+                'donations.context_processors.card_cache_context',
                 'custom_admin.views.admin_context',
             ],
         },
@@ -97,12 +105,66 @@ WSGI_APPLICATION = 'donature.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profile selected by DONATURE_DB: 'sqlite' (default) or 'postgres' (needs psycopg; connection
+# from DONATURE_DB_NAME/_USER/_PASSWORD/_HOST/_PORT). Connections are kept for
+# DONATURE_DB_CONN_MAX_AGE seconds and health-checked before reuse.
+# Compare profiles with `manage.py benchmark_db_writes`.
+DATABASE_PROFILE = os.environ.get('DONATURE_DB', 'sqlite')
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DONATURE_DB_CONN_MAX_AGE', 60))
+
+if DATABASE_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DONATURE_DB_NAME', 'donature'),
+            'USER': os.environ.get('DONATURE_DB_USER', 'donature'),
+            'PASSWORD': os.environ.get('DONATURE_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DONATURE_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DONATURE_DB_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
     }
-}
+elif DATABASE_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DONATURE_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # WAL: readers don't block the writer; NORMAL sync is durable in WAL mode
+                # except for the last commits on power loss; 128 MiB memory-mapped reads.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=134217728;'
+                    'PRAGMA busy_timeout=5000;'
+                ),
+                # Take the write lock at BEGIN, so concurrent transactions wait (busy_timeout)
+                # instead of failing with "database is locked" when upgrading a read lock.
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 5,
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DONATURE_DB profile {DATABASE_PROFILE!r} (use 'sqlite' or 'postgres')")
+
+# Optional read replica for @replica_reads views (donature/db_router.py): DONATURE_DB_REPLICA_HOST
+# for postgres, DONATURE_DB_REPLICA_NAME (a file kept in sync with the primary) for sqlite.
+# After a write the user reads from the primary for DATABASE_PIN_SECONDS (> replication lag).
+DATABASE_REPLICA = None
+DATABASE_PIN_SECONDS = 10
+_replica = {'HOST': os.environ.get('DONATURE_DB_REPLICA_HOST')} if DATABASE_PROFILE == 'postgres' \
+    else {'NAME': os.environ.get('DONATURE_DB_REPLICA_NAME')}
+if all(_replica.values()):
+    DATABASE_REPLICA = 'replica'
+    DATABASES[DATABASE_REPLICA] = {**DATABASES['default'], **_replica, 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['donature.db_router.ReplicaRouter']
 
 
 # Password validation
@@ -153,12 +215,31 @@ STATICFILES_DIRS = [
 
 # Where collectstatic will copy files for production
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Serve STATIC_ROOT from Django (precompressed, immutable for fingerprinted names).
+# Turn off when a web server or CDN serves STATIC_ROOT directly.
+SERVE_STATIC = True
+STATIC_IMMUTABLE_MAX_AGE = 31536000  # 1 year; hashed names change whenever the content does
 
 
 # ========== Media files (User uploaded content) ==========
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are stored once per unique content under MEDIA_ROOT/blobs/ (see donations/storage.py)
+STORAGES = {
+    "default": {
+        "BACKEND": "donations.storage.ContentAddressedStorage",
+    },
+    # Fingerprinted names plus .br/.gz variants written by collectstatic (see donature/staticfiles.py)
+    "staticfiles": {
+        "BACKEND": "donature.staticfiles.CompressedManifestStaticFilesStorage",
+    },
+}
+MEDIA_BLOB_DIR = "blobs"
+MEDIA_IMMUTABLE_MAX_AGE = 31536000  # 1 year; blob URLs change whenever their content does
+# `manage.py gc_media --quarantine` moves unreferenced uploads here instead of deleting them
+MEDIA_GC_QUARANTINE_DIR = os.path.join(BASE_DIR, 'media_quarantine')
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -168,6 +249,153 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 
+# Uploads always stream to temp files; a file is cut off and rejected as soon
+# as it crosses FILE_UPLOAD_MAX_SIZE (see donations/uploads.py).
+FILE_UPLOAD_HANDLERS = ['donations.uploads.BoundedTemporaryFileUploadHandler']
+FILE_UPLOAD_MAX_SIZE = 5242880  # 5MB per file
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000  # ~ 8000 x 5000, checked from the header
+IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+
+# Donation photos are auto-rotated, EXIF-stripped and recompressed on a thread pool
+MAX_IMAGES_PER_DONATION = 8
+IMAGE_PROCESSING_WORKERS = 4
+IMAGE_UPLOAD_MAX_DIMENSION = 2048
+IMAGE_UPLOAD_QUALITY = 85
+
+
+# ========== Background tasks ==========
+# Thread pool used for work that must not run on the request thread
+# (image variants, ...). Set BACKGROUND_TASKS_EAGER = True to run inline.
+BACKGROUND_TASK_WORKERS = 2
+BACKGROUND_TASKS_EAGER = False
+
+
+# ========== Notifications ==========
+# Repeats of one event (same key) within this window fold into a single unread row
+NOTIFICATION_COALESCE_SECONDS = 86400
+# `manage.py prune_notifications` (run daily) moves read notifications older than
+# this to ArchivedNotification; with NOTIFICATION_ARCHIVE = False it deletes them.
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_ARCHIVE = True
+# Notifications page size; unread counts come from NotificationCounter, not COUNT(*)
+NOTIFICATIONS_PER_PAGE = 20
+# Live notifications over server-sent events (notifications/stream/). The stream is an async
+# view: enable it only when serving donature.asgi:application (e.g. uvicorn); otherwise the
+# navbar polls notifications/unread-count/. InProcessBroker reaches one process only.
+LIVE_NOTIFICATIONS = False
+NOTIFICATION_BROKER = 'donature.pubsub.InProcessBroker'
+NOTIFICATION_STREAM_HEARTBEAT = 25   # seconds between keep-alive comments
+NOTIFICATION_STREAM_MAX_AGE = 300    # seconds before a stream ends and the browser reconnects
+NOTIFICATION_STREAM_RETRY = 5        # seconds the browser waits before reconnecting
+
+
+# ========== Image variants ==========
+# Widths (px) of the JPEG + WebP thumbnails generated next to every upload
+IMAGE_VARIANT_WIDTHS = (320, 640)
+IMAGE_VARIANT_QUALITY = 80
+
+
+
+# ========== Caching & instrumentation ==========
+# The instrumented backends report hits/misses to PerformanceMiddleware
+CACHES = {
+    'default': {
+        'BACKEND': 'donature.cache_backends.LocMemCache',
+    }
+}
+# Anonymous full-page cache (donations/pagecache.py), seconds; 0 disables it.
+PAGE_CACHE_TIMEOUT = 300
+# Donation/campaign card fragments ({% cache %} keyed on id + updated_at). Bump the
+# version whenever the card markup changes.
+CARD_CACHE_TIMEOUT = 3600
+CARD_CACHE_VERSION = 1
+# Part of the ETag of conditional detail pages (donations/conditional.py); bump when their templates change.
+PAGE_VALIDATOR_VERSION = 1
+# On-the-fly response compression (donature.middleware.CompressionMiddleware); compare
+# levels with `manage.py benchmark_compression`.
+COMPRESSION_BROTLI_QUALITY = 4   # 0-11
+COMPRESSION_GZIP_LEVEL = 6       # 1-9
+COMPRESSION_MIN_SIZE = 512       # bytes; smaller bodies are sent as they are
+COMPRESSION_MAX_RANDOM_BYTES = 100  # random padding per response against BREACH; 0 disables it
+# Per-request Server-Timing header (db / tpl / cache / total). Every visitor can read it,
+# so it is only sent when this is on or DEBUG is.
+SERVER_TIMING_HEADER = False
+
+# N+1 / slow-query detector (donature/querycheck.py), findings go to the 'donature.queries' logger.
+# RAISE turns findings into QueryBudgetExceeded errors (useful in tests / local dev).
+QUERY_DETECTOR = {
+    'ENABLED': True,
+    'REPEAT_THRESHOLD': 5,   # same normalized query this many times in one request
+    'SLOW_QUERY_MS': 100,
+    'RAISE': False,
+}
+
+# Metrics (donature/metrics.py), scraped at /panel/metrics/ by admins or with
+# "Authorization: Bearer $DONATURE_METRICS_TOKEN". Each process flushes its
+# counters to METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds.
+METRICS_DIR = os.path.join(BASE_DIR, 'var', 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('DONATURE_METRICS_TOKEN')
+
+# On-demand request profiles (admin panel > Profiles), signed links expire after PROFILER_TOKEN_MAX_AGE s
+PROFILE_DIR = os.path.join(BASE_DIR, 'var', 'profiles')
+PROFILE_KEEP = 50
+PROFILER_TOKEN_MAX_AGE = 15 * 60
+PROFILER_SAMPLE_INTERVAL = 0.005
+
+# `manage.py test` or pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+# One JSON line per request on the 'donature.perf' logger, at INFO: set
+# DONATURE_PERF_LOG_LEVEL=INFO to see them (off under the test runner). Query findings
+# are not tied to DEBUG: N+1 / slow queries matter most in production.
+PERF_LOG_LEVEL = 'CRITICAL' if TESTING else os.environ.get('DONATURE_PERF_LOG_LEVEL', 'WARNING')
+PERF_LOG_HANDLERS = ['null'] if TESTING else ['console']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+        'null': {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'loggers': {
+        'donature.perf': {
+            'handlers': PERF_LOG_HANDLERS,
+            'level': PERF_LOG_LEVEL,
+            'propagate': False,
+        },
+        'donature.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+
+# ========== Donation receipts ==========
+# Rendered PDFs are cached here (private: not under MEDIA_ROOT)
+RECEIPT_CACHE_DIR = os.path.join(BASE_DIR, 'var', 'receipts')
+# Render receipts in the background right after settlement (else on first download)
+RECEIPT_WARMING = True
+# 'xhtml2pdf' or 'weasyprint' (see `manage.py benchmark_receipts`)
+RECEIPT_PDF_ENGINE = 'xhtml2pdf'
+
+# Annual statements (`manage.py generate_statements`, admin panel > Statements)
+STATEMENT_OUTPUT_DIR = os.path.join(BASE_DIR, 'var', 'statements')
+STATEMENT_PDF_ENGINE = RECEIPT_PDF_ENGINE
+# Render processes; None = one per CPU
+STATEMENT_PROCESSES = None
 
 
 # ===== SSLCommerz Payment Gateway Settings =====
@@ -180,6 +408,29 @@ else:
     SSL_COMMERZ_STORE_PASS = "live_store_pass"
     SSL_COMMERZ_IS_SANDBOX = False
 
+SSL_COMMERZ_API_URL = (
+    "https://sandbox.sslcommerz.com" if SSL_COMMERZ_IS_SANDBOX else "https://securepay.sslcommerz.com"
+)
+# Gateway client (ngos/gateway.py): pooled keep-alive session, retries, circuit breaker
+SSL_COMMERZ_CONNECT_TIMEOUT = 3.05
+SSL_COMMERZ_READ_TIMEOUT = 10
+SSL_COMMERZ_RETRIES = 2
+SSL_COMMERZ_BACKOFF = 0.3
+SSL_COMMERZ_POOL_SIZE = 10
+# Consecutive failures before failing fast, and seconds before a trial call
+SSL_COMMERZ_CIRCUIT_FAILURES = 5
+SSL_COMMERZ_CIRCUIT_RESET = 30
+# How long settled tran_ids are remembered, so callback replays skip the database
+SSL_COMMERZ_SETTLED_CACHE_TIMEOUT = 60 * 60 * 24
+# Use the async donate view; enable when serving donature.asgi:application (e.g. uvicorn)
+ASYNC_PAYMENT_INITIATION = False
+
+# Payment reconciliation (`manage.py reconcile_payments`), all times in seconds
+PAYMENT_RECONCILE_AFTER = 15 * 60      # pending this long before we ask the gateway
+PAYMENT_RECONCILE_BATCH = 500
+PAYMENT_RECONCILE_WORKERS = 8          # keep <= SSL_COMMERZ_POOL_SIZE
+PAYMENT_PENDING_EXPIRY = 60 * 60 * 24  # unpaid after this long -> failed
+
 
 
 
@@ -0,0 +1,110 @@
+# donature/staticfiles.py
+"""
+Fingerprinted, precompressed static files.
+
+``collectstatic`` with CompressedManifestStaticFilesStorage writes content-hashed
+copies (``app.3f2a9c.css``, rewritten url() references, staticfiles.json) and
+next to every compressible hashed file a Brotli ``.br`` and a gzip ``.gz``
+variant, kept only when smaller. ``serve_static`` (mounted at STATIC_URL when
+SERVE_STATIC is on) picks the variant the client accepts and marks hashed
+names immutable for STATIC_IMMUTABLE_MAX_AGE; any other name gets a short
+max-age so it is revalidated.
+
+Without a manifest (runserver, tests) ``{% static %}`` falls back to the plain
+names instead of failing.
+"""
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .compression import ENCODINGS, compress, is_compressible, negotiate
+
+EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+MIN_COMPRESS_SIZE = 256  # bytes; smaller files don't gain anything worth a second lookup
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def is_hashed_name(self, name):
+        """Whether ``name`` is a fingerprinted name from the manifest (safe to cache forever)."""
+        if getattr(self, "_hashed_names", None) is None:
+            self._hashed_names = frozenset(self.hashed_files.values())
+        return name in self._hashed_names
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:  # not collected yet
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        self._hashed_names = None
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            for compressed_name in self.compress_file(name):
+                yield name, compressed_name, True
+
+    def compress_file(self, name):
+        """Write the smaller-than-original .br/.gz variants of ``name``; returns their names."""
+        content_type, _ = mimetypes.guess_type(name)
+        if not is_compressible(content_type):
+            return []
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+        written = []
+        for encoding in ENCODINGS:
+            compressed_name = name + EXTENSIONS[encoding]
+            compressed = compress(data, encoding)
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            if len(compressed) < len(data) * 0.95:
+                with open(self.path(compressed_name), "wb") as f:
+                    f.write(compressed)
+                written.append(compressed_name)
+        return written
+
+
+def serve_static(request, path):
+    """Serve a file from STATIC_ROOT, precompressed when possible."""
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Static file not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Static file not found")
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    encoding = None
+    if is_compressible(content_type):
+        available = [coding for coding in ENCODINGS if os.path.isfile(full_path + EXTENSIONS[coding])]
+        encoding = negotiate(request.headers.get("Accept-Encoding"), available)
+    served_path = full_path + EXTENSIONS[encoding] if encoding else full_path
+
+    stat = os.stat(served_path)
+    if not was_modified_since(request.headers.get("If-Modified-Since"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    response = FileResponse(open(served_path, "rb"), content_type=content_type or "application/octet-stream")
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    if is_compressible(content_type):
+        response["Vary"] = "Accept-Encoding"
+    is_hashed_name = getattr(staticfiles_storage, "is_hashed_name", None)
+    if is_hashed_name is not None and is_hashed_name(path):
+        response["Cache-Control"] = f"public, max-age={settings.STATIC_IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response["Cache-Control"] = "public, max-age=60"
+    return response
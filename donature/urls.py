@@ -15,10 +15,12 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path,include
+from django.urls import path, include, re_path
 
 from django.conf import settings
 from django.conf.urls.static import static
+from donations.views import serve_media
+from donature.staticfiles import serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,6 +31,10 @@ urlpatterns = [
 ]
 
 
+# Collected static files (runserver serves app static dirs itself while DEBUG is on)
+if settings.SERVE_STATIC:
+    urlpatterns += [re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.*)$", serve_static)]
+
 # Media files during development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Campaign, CampaignCategory, NGODonation, NGOProfile
+from donations.uploads import BoundedImageField
 
 
 # ===== NGO PROFILE FORM =====
@@ -32,6 +33,7 @@ class CampaignForm(forms.ModelForm):
     class Meta:
         model = Campaign
         fields = ['title', 'description', 'image', 'goal_amount', 'end_date', 'category']  # category added
+        field_classes = {'image': BoundedImageField}
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control', 
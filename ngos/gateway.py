@@ -0,0 +1,191 @@
+# ngos/gateway.py
+"""
+SSLCommerz API client.
+
+All gateway calls share one process-wide ``requests.Session`` so connections
+(and their TLS handshakes) are reused across requests. Connect and read
+timeouts are separate and short, transient failures (connection errors,
+502/503/504) are retried with exponential backoff, and a circuit breaker stops
+us from tying up request threads on a gateway that is down: after
+SSL_COMMERZ_CIRCUIT_FAILURES consecutive failures calls fail fast for
+SSL_COMMERZ_CIRCUIT_RESET seconds, then a single trial call decides whether the
+circuit closes again.
+"""
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from donature import metrics
+
+INITIATE_PATH = "/gwprocess/v4/api.php"
+VALIDATION_PATH = "/validator/api/validationserverAPI.php"
+TRANSACTION_QUERY_PATH = "/validator/api/merchantTransIDvalidationAPI.php"
+OPERATIONS = {INITIATE_PATH: "initiate", VALIDATION_PATH: "validate", TRANSACTION_QUERY_PATH: "query"}
+
+
+class GatewayError(Exception):
+    pass
+
+
+class CircuitOpenError(GatewayError):
+    pass
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.clock() - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                raise CircuitOpenError("Payment gateway is unavailable, please try again shortly.")
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class SSLCommerzClient:
+
+    def __init__(self, base_url, store_id, store_passwd, connect_timeout=3.05, read_timeout=10.0,
+                 retries=2, backoff=0.3, pool_size=10, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.store_id = store_id
+        self.store_passwd = store_passwd
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = self._build_session(retries, backoff, pool_size)
+
+    @staticmethod
+    def _build_session(retries, backoff, pool_size):
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            # Re-sending an initiation only opens another unpaid session, so POST is safe to retry.
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request(self, method, path, **kwargs):
+        """Call the gateway and return its decoded JSON body, raising GatewayError on any failure."""
+        operation = OPERATIONS.get(path, path)
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            metrics.GATEWAY_ERRORS.inc(operation=operation)
+            raise
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            self.breaker.record_failure()
+            metrics.GATEWAY_ERRORS.inc(operation=operation)
+            raise GatewayError(f"Payment gateway request failed: {exc}") from exc
+        finally:
+            metrics.GATEWAY_LATENCY.observe(time.perf_counter() - start, operation=operation)
+        self.breaker.record_success()
+        return payload
+
+    def initiate_payment(self, data):
+        """Open a payment session and return the hosted GatewayPageURL to redirect the donor to."""
+        payload = self.request("POST", INITIATE_PATH, data={
+            "store_id": self.store_id,
+            "store_passwd": self.store_passwd,
+            **data,
+        })
+        gateway_url = payload.get("GatewayPageURL")
+        if not gateway_url:
+            raise GatewayError(payload.get("failedreason") or "Payment initiation failed. Try again.")
+        return gateway_url
+
+    def validate_transaction(self, val_id):
+        """Look up a payment by the ``val_id`` the gateway sent to our callback."""
+        return self.request("GET", VALIDATION_PATH, params=self._query(val_id=val_id))
+
+    def query_transaction(self, tran_id):
+        """
+        Latest gateway record for one of our tran_ids (``status`` is VALID, VALIDATED,
+        FAILED, CANCELLED, EXPIRED, ...), or None if the donor never reached the gateway.
+        """
+        payload = self.request("GET", TRANSACTION_QUERY_PATH, params=self._query(tran_id=tran_id))
+        elements = payload.get("element") or []
+        return elements[0] if elements else None
+
+    def _query(self, **params):
+        return {**params, "store_id": self.store_id, "store_passwd": self.store_passwd, "format": "json"}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SSLCommerzClient(
+                    base_url=settings.SSL_COMMERZ_API_URL,
+                    store_id=settings.SSL_COMMERZ_STORE_ID,
+                    store_passwd=settings.SSL_COMMERZ_STORE_PASS,
+                    connect_timeout=getattr(settings, "SSL_COMMERZ_CONNECT_TIMEOUT", 3.05),
+                    read_timeout=getattr(settings, "SSL_COMMERZ_READ_TIMEOUT", 10.0),
+                    retries=getattr(settings, "SSL_COMMERZ_RETRIES", 2),
+                    backoff=getattr(settings, "SSL_COMMERZ_BACKOFF", 0.3),
+                    pool_size=getattr(settings, "SSL_COMMERZ_POOL_SIZE", 10),
+                    breaker=CircuitBreaker(
+                        failure_threshold=getattr(settings, "SSL_COMMERZ_CIRCUIT_FAILURES", 5),
+                        reset_timeout=getattr(settings, "SSL_COMMERZ_CIRCUIT_RESET", 30.0),
+                    ),
+                )
+    return _client
+
+
+@receiver(setting_changed)
+def _reset_client(setting, **kwargs):
+    global _client
+    if setting.startswith("SSL_COMMERZ_"):
+        _client = None
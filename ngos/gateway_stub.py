@@ -0,0 +1,150 @@
+# ngos/gateway_stub.py
+"""
+A local stand-in for the SSLCommerz API, for tests and latency benchmarks.
+
+It answers session initiation, validation by val_id and the query by tran_id
+on a background thread. Initiated transactions stay PENDING until a test calls
+``pay(tran_id)`` (or ``pay(tran_id, "FAILED")``...), standing in for the donor on
+the hosted payment page. ``latency`` adds a fixed delay per request and
+``fail_next(n)`` makes the next ``n`` requests return 503, to exercise retries
+and the circuit breaker.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .gateway import INITIATE_PATH, TRANSACTION_QUERY_PATH, VALIDATION_PATH
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients can reuse connections
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        if self.server.stub.before_request(self):
+            return
+        if urlparse(self.path).path != INITIATE_PATH:
+            return self.send_json({"status": "FAILED", "failedreason": "Unknown endpoint"}, 404)
+        self.send_json(self.server.stub.initiate(form))
+
+    def do_GET(self):
+        if self.server.stub.before_request(self):
+            return
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == VALIDATION_PATH:
+            return self.send_json(self.server.stub.validate(query.get("val_id", "")))
+        if url.path == TRANSACTION_QUERY_PATH:
+            return self.send_json(self.server.stub.query(query.get("tran_id", "")))
+        self.send_json({"status": "INVALID_TRANSACTION"}, 404)
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubGateway:
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.transactions = {}  # tran_id -> {"val_id", "status", "form"}
+        self._failures = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="gateway-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count):
+        with self._lock:
+            self._failures = count
+
+    def before_request(self, handler):
+        """Count the request, apply latency and injected failures. True if already answered."""
+        with self._lock:
+            self.requests += 1
+            fail = self._failures > 0
+            self._failures -= fail
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            handler.send_json({"status": "FAILED", "failedreason": "Service unavailable"}, 503)
+        return fail
+
+    def initiate(self, form):
+        if not form.get("tran_id") or not form.get("total_amount"):
+            return {"status": "FAILED", "failedreason": "Missing tran_id or total_amount"}
+        val_id = uuid.uuid4().hex
+        with self._lock:
+            self.transactions[form["tran_id"]] = {"val_id": val_id, "status": "PENDING", "form": form}
+        return {
+            "status": "SUCCESS",
+            "sessionkey": uuid.uuid4().hex,
+            "GatewayPageURL": f"{self.url}/pay/{val_id}",
+        }
+
+    def pay(self, tran_id, status="VALID"):
+        """Finish a payment as the donor would on the hosted page. Returns its val_id."""
+        with self._lock:
+            record = self.transactions[tran_id]
+            record["status"] = status
+            return record["val_id"]
+
+    def _element(self, record):
+        form = record["form"]
+        return {
+            "status": record["status"],
+            "val_id": record["val_id"],
+            "tran_id": form["tran_id"],
+            "amount": form["total_amount"],
+            "currency": form.get("currency", "BDT"),
+            "value_a": form.get("value_a", ""),
+            "value_b": form.get("value_b", ""),
+            "value_c": form.get("value_c", ""),
+        }
+
+    def validate(self, val_id):
+        with self._lock:
+            record = next((r for r in self.transactions.values() if r["val_id"] == val_id), None)
+            if record is None or record["status"] not in ("VALID", "VALIDATED"):
+                return {"status": "INVALID_TRANSACTION"}
+            return self._element(record)
+
+    def query(self, tran_id):
+        with self._lock:
+            record = self.transactions.get(tran_id)
+            if record is None or record["status"] == "PENDING":
+                return {"APIConnect": "DONE", "no_of_trans_found": 0, "element": []}
+            return {"APIConnect": "DONE", "no_of_trans_found": 1, "element": [self._element(record)]}
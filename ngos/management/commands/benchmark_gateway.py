@@ -0,0 +1,49 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from ngos.gateway import INITIATE_PATH, SSLCommerzClient
+from ngos.gateway_stub import StubGateway
+
+
+class Command(BaseCommand):
+    help = "Compare per-call requests.post against the pooled gateway client."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--url", help="Gateway base URL (default: start a local stub).")
+        parser.add_argument("--latency", type=float, default=0.0, help="Stub response delay in seconds.")
+
+    def handle(self, *args, **options):
+        stub = None
+        url = options["url"]
+        if not url:
+            stub = StubGateway(latency=options["latency"]).start()
+            url = stub.url
+        try:
+            client = SSLCommerzClient(url, "bench", "bench", retries=0, pool_size=options["concurrency"])
+            self.stdout.write(f"{'mode':<10} {'req/s':>9} {'mean ms':>9} {'p95 ms':>9}")
+            self.run("fresh", lambda data: requests.post(url + INITIATE_PATH, data=data, timeout=10).json(), options)
+            self.run("pooled", client.initiate_payment, options)
+        finally:
+            if stub:
+                stub.stop()
+
+    def run(self, mode, call, options):
+        def timed(i):
+            start = time.perf_counter()
+            call({"tran_id": f"bench_{i}", "total_amount": "100.0"})
+            return (time.perf_counter() - start) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            timings = sorted(pool.map(timed, range(options["requests"])))
+        elapsed = time.perf_counter() - started
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{mode:<10} {len(timings) / elapsed:>9.0f} {statistics.mean(timings):>9.1f} {p95:>9.1f}"
+        )
@@ -0,0 +1,57 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from donations.models import User
+from ngos.models import Campaign, NGODonation
+from ngos.receipts import ENGINES, RECEIPT_TEMPLATE, ReceiptError, render_pdf
+
+
+class Command(BaseCommand):
+    help = "Compare receipt render time and size for the available PDF engines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--donation", type=int, help="Render this NGODonation instead of a sample one.")
+        parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+
+    def handle(self, *args, **options):
+        donation = self.get_donation(options["donation"])
+        self.stdout.write(f"{'engine':<12} {'mean ms':>9} {'p95 ms':>9} {'min ms':>9} {'size KB':>9}")
+
+        for engine in options["engines"]:
+            timings = []
+            try:
+                render_pdf(RECEIPT_TEMPLATE, {"donation": donation}, engine)  # warm-up (imports, fonts)
+                for _ in range(options["iterations"]):
+                    start = time.perf_counter()
+                    pdf = render_pdf(RECEIPT_TEMPLATE, {"donation": donation}, engine)
+                    timings.append((time.perf_counter() - start) * 1000)
+            except ReceiptError as exc:
+                self.stdout.write(f"{engine:<12} unavailable: {exc}")
+                continue
+
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f"{engine:<12} {statistics.mean(timings):>9.1f} {p95:>9.1f} "
+                f"{timings[0]:>9.1f} {len(pdf) / 1024:>9.1f}"
+            )
+
+    def get_donation(self, donation_id):
+        if donation_id:
+            try:
+                return NGODonation.objects.select_related("campaign", "donor").get(id=donation_id)
+            except NGODonation.DoesNotExist:
+                raise CommandError(f"NGODonation {donation_id} does not exist")
+        # Unsaved sample objects: nothing is written to the database.
+        donor = User(id=1, username="sample_donor")
+        campaign = Campaign(id=1, title="Winter Clothes Drive", ngo=User(username="sample_ngo"))
+        return NGODonation(
+            id=1, campaign=campaign, donor=donor, amount=Decimal("1500.00"),
+            payment_method="SSLCommerz", transaction_id="1_1_sample", donated_at=timezone.now(),
+            message="Stay warm!",
+        )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ngos.statements import KINDS, generate_year
+
+
+class Command(BaseCommand):
+    help = "Render per-donor and per-NGO donation statements for a year into a zip archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, default=timezone.now().year - 1,
+                            help="Calendar year to cover (default: last year).")
+        parser.add_argument("--kind", choices=[*KINDS, "all"], default="all")
+        parser.add_argument("--processes", type=int, help="Render processes (default: STATEMENT_PROCESSES or CPU count).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        path, written = generate_year(options["year"], options["kind"], options["processes"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} statement(s) to {path} in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from ngos.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = "Settle or fail stale pending donations by asking the payment gateway about them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, help="Minutes a donation must have been pending "
+                                                           "(default: PAYMENT_RECONCILE_AFTER).")
+        parser.add_argument("--limit", type=int, help="Rows per batch (default: PAYMENT_RECONCILE_BATCH).")
+        parser.add_argument("--workers", type=int, help="Concurrent gateway lookups.")
+        parser.add_argument("--loop", action="store_true", help="Keep running, one batch every --interval.")
+        parser.add_argument("--interval", type=int, default=300, help="Seconds between batches with --loop.")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(minutes=options["older_than"]) if options["older_than"] is not None else None
+        while True:
+            started = time.perf_counter()
+            outcome = reconcile(older_than, options["limit"], options["workers"])
+            summary = ", ".join(f"{count} {name}" for name, count in sorted(outcome.items())) or "nothing to do"
+            self.stdout.write(f"Reconciled in {time.perf_counter() - started:.1f}s: {summary}")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
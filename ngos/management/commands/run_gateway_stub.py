@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ngos.gateway_stub import StubGateway
+
+
+class Command(BaseCommand):
+    help = "Serve a local SSLCommerz stand-in (point SSL_COMMERZ_API_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay every response.")
+
+    def handle(self, *args, **options):
+        stub = StubGateway(port=options["port"], latency=options["latency"])
+        self.stdout.write(f"Stub gateway listening on {stub.url} (Ctrl+C to stop)")
+        try:
+            stub.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0007_ngodonation_account_input_ngodonation_payer_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -54,6 +54,7 @@ class Campaign(models.Model):
     is_active = models.BooleanField(default=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # part of the card fragment cache key
     approved_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
@@ -90,6 +91,12 @@ class CampaignUpdate(models.Model):
 
 
 # ===== NGO Donation (Donations made to NGO campaigns) =====
+class NGODonationQuerySet(models.QuerySet):
+    def completed(self):
+        """Paid donations; pending and failed rows are payment attempts, not donations."""
+        return self.filter(payment_status='completed')
+
+
 class NGODonation(models.Model):
     campaign = models.ForeignKey(
         'Campaign',
@@ -131,5 +138,7 @@ class NGODonation(models.Model):
         default='pending'
     )
 
+    objects = NGODonationQuerySet.as_manager()
+
     def __str__(self):
         return f"Donation of {self.amount} to {self.campaign.title} by {self.donor.username}"
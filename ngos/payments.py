@@ -0,0 +1,178 @@
+# ngos/payments.py
+"""
+Settling SSLCommerz payments.
+
+The gateway retries its success callback and IPN, and donors refresh the
+success page, so the same transaction arrives several times. ``settle_payment``
+turns the first arrival into a completed NGODonation (plus campaign total,
+reward points, NGO notification and receipt) inside one transaction and makes
+every later arrival a no-op. Settled tran_ids are remembered in the cache, so a
+replay returns without touching the database at all; the unique
+``transaction_id`` row lock remains the real guard when the cache is cold.
+Callbacks are settled only after the gateway's validation API confirms them.
+"""
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+
+from donations.models import User, UserReward
+from donations.notifications import notify
+from donations.pagecache import invalidate
+from donations.tasks import submit_on_commit
+from donature import metrics
+from .gateway import GatewayError, get_client
+from .models import Campaign, NGODonation
+from .receipts import warm_receipt
+
+logger = logging.getLogger(__name__)
+
+DONATION_REWARD_POINTS = 30
+PAID_STATUSES = {"VALID", "VALIDATED"}  # gateway record statuses of a successful payment
+
+
+class PaymentError(Exception):
+    pass
+
+
+def processed_key(tran_id):
+    return f"ssl:done:{tran_id}"
+
+
+def parse_transaction_id(tran_id):
+    """``<campaign_id>_<user_id>_<nonce>`` -> ``(campaign_id, user_id)``."""
+    try:
+        campaign_id, user_id, _ = str(tran_id).split("_")
+        return int(campaign_id), int(user_id)
+    except (TypeError, ValueError):
+        raise PaymentError("Invalid transaction ID format.")
+
+
+def adjust_collected_amount(campaign_id, delta):
+    """Add ``delta`` to a campaign's total in SQL, so concurrent donations don't overwrite each other."""
+    Campaign.objects.filter(pk=campaign_id).update(
+        collected_amount=Greatest(F("collected_amount") + delta, Value(Decimal("0"))),
+        updated_at=timezone.now(),
+    )
+    invalidate("campaigns")  # update() sends no post_save
+
+
+def settle_callback(data, client=None):
+    """
+    Settle a success callback / IPN once the gateway confirms it. Returns the donation id.
+
+    The POSTed fields are only a claim (anybody can post ``status=VALID``): the
+    payment is looked up by its ``val_id`` with the validation API and settled
+    only if that record is paid, carries the same tran_id and the amount we
+    recorded at initiation. Every initiation records a pending row, so a
+    callback without one is rejected (and logged) rather than settled for
+    whatever amount the gateway reports.
+    """
+    status = str(data.get("status", "")).strip().upper()
+    if status not in ("VALID", "SUCCESS"):
+        raise PaymentError(f"Payment failed (status={status})")
+    tran_id = data.get("tran_id")
+    donation_id = cache.get(processed_key(tran_id))
+    if donation_id is not None:  # replay of a verified callback
+        return donation_id
+    if not data.get("val_id"):
+        raise PaymentError("Missing val_id; the payment can't be verified.")
+
+    try:
+        record = (client or get_client()).validate_transaction(data["val_id"])
+    except GatewayError as e:
+        raise PaymentError(f"Could not verify the payment with the gateway: {e}")
+    if record.get("status") not in PAID_STATUSES or record.get("tran_id") != tran_id:
+        raise PaymentError("The gateway did not confirm this payment.")
+    try:
+        amount = Decimal(str(record.get("amount")))
+    except InvalidOperation:
+        raise PaymentError("The gateway returned an invalid amount.")
+    recorded = NGODonation.objects.filter(transaction_id=tran_id).values_list("amount", flat=True).first()
+    if recorded is None:
+        logger.warning("Gateway confirmed %s (%s) but no donation was initiated with that tran_id", tran_id, amount)
+        raise PaymentError("No donation was started for this payment.")
+    if amount != recorded:
+        raise PaymentError("The paid amount does not match the donation.")
+
+    return settle_payment(
+        tran_id,
+        amount,
+        message=record.get("value_b", ""),
+        is_anonymous=record.get("value_c", "False") == "True",
+    )
+
+
+def settle_payment(tran_id, amount, message="", is_anonymous=False):
+    """Mark ``tran_id`` as paid exactly once. Returns the donation id."""
+    key = processed_key(tran_id)
+    donation_id = cache.get(key)
+    if donation_id is not None:
+        return donation_id
+
+    campaign_id, donor_id = parse_transaction_id(tran_id)
+    with transaction.atomic():
+        donation = NGODonation.objects.select_for_update().filter(transaction_id=tran_id).first()
+        if donation is None:
+            donation = _create_completed(tran_id, campaign_id, donor_id, amount, message, is_anonymous)
+        elif donation.payment_status != "completed":
+            donation.payment_status = "completed"
+            donation.save(update_fields=["payment_status"])
+            adjust_collected_amount(donation.campaign_id, donation.amount)
+            _on_completed(donation)
+        donation_id = donation.id
+        transaction.on_commit(
+            lambda: cache.set(key, donation_id, getattr(settings, "SSL_COMMERZ_SETTLED_CACHE_TIMEOUT", 86400))
+        )
+    return donation_id
+
+
+def _create_completed(tran_id, campaign_id, donor_id, amount, message, is_anonymous):
+    if not Campaign.objects.filter(pk=campaign_id).exists() or not User.objects.filter(pk=donor_id).exists():
+        raise PaymentError("Unknown campaign or donor for this transaction.")
+    try:
+        # Savepoint: a concurrent delivery of the same callback may insert the row first.
+        with transaction.atomic():
+            donation = NGODonation.objects.create(
+                campaign_id=campaign_id,
+                donor_id=donor_id,
+                amount=amount,
+                transaction_id=tran_id,
+                payment_method="SSLCommerz",
+                payment_status="completed",
+                message=message,
+                is_anonymous=is_anonymous,
+            )  # collected_amount is updated by the post_save signal
+    except IntegrityError:
+        return NGODonation.objects.select_for_update().get(transaction_id=tran_id)
+    _on_completed(donation)
+    return donation
+
+
+def _on_completed(donation):
+    """Side effects of a donation becoming completed; runs once per transaction."""
+    donation = NGODonation.objects.select_related("campaign__ngo", "donor").get(pk=donation.pk)
+    campaign = donation.campaign
+
+    user_reward, _ = UserReward.objects.get_or_create(user=donation.donor)
+    user_reward.add_points(DONATION_REWARD_POINTS)
+
+    notify(
+        campaign.ngo,
+        f"{donation.donor.username} donated ৳{donation.amount} to your campaign '{campaign.title}'",
+        link=reverse('campaign_detail', args=[campaign.id]),
+        key=f"campaign-donations:{campaign.id}",
+        summary=lambda count: f"{count} new donations to your campaign '{campaign.title}'",
+    )
+
+    # Render the receipt now so the download is served from disk
+    if getattr(settings, "RECEIPT_WARMING", True):
+        submit_on_commit(warm_receipt, donation.id)
+    amount = float(donation.amount)
+    transaction.on_commit(lambda: metrics.DONATION_AMOUNT.observe(amount))
@@ -0,0 +1,109 @@
+# ngos/receipts.py
+"""
+Donation receipt PDFs.
+
+Rendering a receipt costs hundreds of milliseconds, so each PDF is rendered once
+and kept on disk under RECEIPT_CACHE_DIR, keyed by donation id and a version
+derived from the receipt template and render engine (editing the template or
+switching engines naturally invalidates old files). Receipts are rendered
+eagerly on the background pool right after a successful payment.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.loader import get_template
+
+from .models import NGODonation
+
+RECEIPT_TEMPLATE = "ngos/receipt_pdf.html"
+
+
+class ReceiptError(Exception):
+    pass
+
+
+# ===== Render engines =====
+
+def render_xhtml2pdf(html, base_url=None):
+    from xhtml2pdf import pisa
+
+    result = io.BytesIO()
+    pdf = pisa.pisaDocument(io.BytesIO(html.encode("UTF-8")), result)
+    if pdf.err:
+        raise ReceiptError(f"xhtml2pdf reported {pdf.err} error(s)")
+    return result.getvalue()
+
+
+def render_weasyprint(html, base_url=None):
+    from weasyprint import HTML
+
+    return HTML(string=html, base_url=base_url).write_pdf()
+
+
+ENGINES = {
+    "xhtml2pdf": render_xhtml2pdf,
+    "weasyprint": render_weasyprint,
+}
+
+
+def engine_name(name=None):
+    name = name or getattr(settings, "RECEIPT_PDF_ENGINE", "xhtml2pdf")
+    if name not in ENGINES:
+        raise ReceiptError(f"Unknown PDF engine '{name}', choose from {', '.join(ENGINES)}")
+    return name
+
+
+def render_pdf(template_name, context, engine=None, base_url=None):
+    engine = engine_name(engine)
+    html = get_template(template_name).render(context)
+    try:
+        return ENGINES[engine](html, base_url=base_url)
+    except ReceiptError:
+        raise
+    except Exception as exc:  # ImportError for a missing engine, renderer bugs, ...
+        raise ReceiptError(f"{engine} failed: {exc}") from exc
+
+
+# ===== Receipt cache =====
+
+@lru_cache(maxsize=None)
+def template_version(template_name, engine):
+    source = get_template(template_name).template.source
+    return hashlib.sha1(f"{engine}:{source}".encode("utf-8")).hexdigest()[:12]
+
+
+def receipt_path(donation_id, engine=None):
+    engine = engine_name(engine)
+    version = template_version(RECEIPT_TEMPLATE, engine)
+    return os.path.join(settings.RECEIPT_CACHE_DIR, f"receipt_{donation_id}_{version}.pdf")
+
+
+def get_receipt_path(donation, engine=None):
+    """Path of the cached receipt for ``donation``, rendering it first on a miss."""
+    path = receipt_path(donation.id, engine)
+    if os.path.exists(path):
+        return path
+
+    pdf = render_pdf(RECEIPT_TEMPLATE, {"donation": donation}, engine)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temp file first so concurrent readers never see a half-written PDF.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+    return path
+
+
+def warm_receipt(donation_id):
+    """Background task: render the receipt before the donor asks for it."""
+    donation = (
+        NGODonation.objects.select_related("campaign", "donor")
+        .filter(id=donation_id, payment_status="completed")
+        .first()
+    )
+    if donation is not None:
+        get_receipt_path(donation)
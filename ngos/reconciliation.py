@@ -0,0 +1,96 @@
+# ngos/reconciliation.py
+"""
+Reconciling pending donations with the gateway.
+
+A pending NGODonation is recorded when a payment is initiated. If the donor's
+browser never makes it back to ssl_success (closed tab, dropped connection)
+and the IPN is lost, the row would stay pending forever. ``reconcile``
+picks up pending rows older than PAYMENT_RECONCILE_AFTER, asks the gateway
+about them concurrently on a bounded thread pool (the threads only do HTTP
+over the shared pooled session, never touch the database), then settles the
+paid ones and fails the dead ones from the calling thread.
+"""
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .gateway import GatewayError, get_client
+from .models import NGODonation
+from .payments import PAID_STATUSES, PaymentError, settle_payment
+
+logger = logging.getLogger(__name__)
+
+DEAD_STATUSES = {"FAILED", "CANCELLED", "EXPIRED"}
+
+
+def stale_pending(older_than=None, limit=None):
+    """``[(transaction_id, amount)]`` of the oldest pending donations not touched for ``older_than``."""
+    older_than = older_than or timedelta(seconds=getattr(settings, "PAYMENT_RECONCILE_AFTER", 15 * 60))
+    limit = limit or getattr(settings, "PAYMENT_RECONCILE_BATCH", 500)
+    return list(
+        NGODonation.objects.filter(payment_status="pending", donated_at__lt=timezone.now() - older_than)
+        .exclude(transaction_id=None)
+        .order_by("donated_at")
+        .values_list("transaction_id", "amount", "donated_at")[:limit]
+    )
+
+
+def _lookup(client, tran_id):
+    try:
+        return tran_id, client.query_transaction(tran_id)
+    except GatewayError as exc:
+        return tran_id, exc
+
+
+def reconcile(older_than=None, limit=None, workers=None, client=None):
+    """Reconcile one batch of stale pending donations. Returns a Counter of outcomes."""
+    client = client or get_client()
+    workers = workers or getattr(settings, "PAYMENT_RECONCILE_WORKERS", 8)
+    expire_before = timezone.now() - timedelta(seconds=getattr(settings, "PAYMENT_PENDING_EXPIRY", 24 * 60 * 60))
+    pending = {tran_id: (amount, started) for tran_id, amount, started in stale_pending(older_than, limit)}
+    outcome = Counter()
+    if not pending:
+        return outcome
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="donature-reconcile") as pool:
+        results = list(pool.map(lambda tran_id: _lookup(client, tran_id), pending))
+
+    paid, dead = [], []
+    for tran_id, record in results:
+        amount, started = pending[tran_id]
+        if isinstance(record, GatewayError):
+            logger.warning("Could not reconcile %s: %s", tran_id, record)
+            outcome["error"] += 1
+        elif record is not None and record.get("status") in PAID_STATUSES:
+            if Decimal(str(record.get("amount", "0"))) != amount:
+                logger.warning("Amount mismatch for %s: gateway says %s, we recorded %s",
+                               tran_id, record.get("amount"), amount)
+                outcome["mismatch"] += 1
+            else:
+                paid.append((tran_id, amount))
+        elif (record is not None and record.get("status") in DEAD_STATUSES) or started < expire_before:
+            dead.append(tran_id)
+        else:
+            outcome["pending"] += 1
+
+    # One transaction per batch: a single commit instead of one per row.
+    with transaction.atomic():
+        for tran_id, amount in paid:
+            try:
+                settle_payment(tran_id, amount)
+                outcome["settled"] += 1
+            except PaymentError as exc:
+                logger.warning("Could not settle %s: %s", tran_id, exc)
+                outcome["error"] += 1
+        if dead:
+            # Guard on status: a callback may have settled some of these meanwhile.
+            outcome["failed"] = NGODonation.objects.filter(
+                transaction_id__in=dead, payment_status="pending"
+            ).update(payment_status="failed")
+    return outcome
@@ -1,21 +1,47 @@
 # ngos/signals.py
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import NGODonation, Campaign
+from django.utils import timezone
+from .models import NGODonation, NGOProfile, Campaign
+from donations.pagecache import invalidate
+from donations.signals import queue_image_variants
+from .payments import adjust_collected_amount
 
 @receiver(post_save, sender=NGODonation)
 def update_campaign_collected_on_save(sender, instance, created, **kwargs):
-    """Update campaign collected_amount after new donation"""
-    if created:
-        campaign = instance.campaign
-        campaign.collected_amount += instance.amount
-        campaign.save(update_fields=["collected_amount"])
+    """Add a donation that is created already completed (pending ones are added when settled)"""
+    if created and instance.payment_status == "completed":
+        adjust_collected_amount(instance.campaign_id, instance.amount)
 
 @receiver(post_delete, sender=NGODonation)
 def update_campaign_collected_on_delete(sender, instance, **kwargs):
-    """Adjust campaign collected_amount if a donation is deleted"""
-    campaign = instance.campaign
-    campaign.collected_amount -= instance.amount
-    if campaign.collected_amount < 0:
-        campaign.collected_amount = 0
-    campaign.save(update_fields=["collected_amount"])
+    """Adjust campaign collected_amount if a completed donation is deleted"""
+    if instance.payment_status == "completed":
+        adjust_collected_amount(instance.campaign_id, -instance.amount)
+
+
+@receiver(post_save, sender=Campaign)
+def campaign_image_variants(sender, instance, update_fields=None, **kwargs):
+    """Build thumbnails/WebP for a new or replaced campaign image"""
+    queue_image_variants(instance, "image", update_fields)
+
+
+@receiver(post_save, sender=NGODonation)
+@receiver(post_delete, sender=NGODonation)
+def touch_campaign_on_donation(sender, instance, **kwargs):
+    """Cards and the detail page count and list completed donations, so any status change shows there"""
+    Campaign.objects.filter(pk=instance.campaign_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=NGOProfile)
+def touch_ngo_campaigns(sender, instance, **kwargs):
+    """Campaign cards show the NGO name"""
+    Campaign.objects.filter(ngo_id=instance.user_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Campaign)
+@receiver([post_save, post_delete], sender=NGODonation)
+@receiver(post_save, sender=NGOProfile)
+def invalidate_campaign_pages(sender, **kwargs):
+    """Campaign cards show totals and donor counts, so donations count as campaign writes"""
+    invalidate("campaigns")
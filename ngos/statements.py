@@ -0,0 +1,147 @@
+# ngos/statements.py
+"""
+Annual donation statements.
+
+Completed NGODonation rows for a period are streamed from the database ordered
+by donor (or NGO), grouped into one plain-dict statement per recipient and
+rendered to PDF on a multiprocessing pool. Finished PDFs are appended to a zip
+archive as they arrive, so memory stays bounded by the pool's in-flight
+statements rather than by the number of donors.
+"""
+import contextlib
+import multiprocessing
+import os
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+
+import django
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NGODonation
+from .receipts import render_pdf
+
+STATEMENT_TEMPLATE = "ngos/statement_pdf.html"
+KINDS = ("donor", "ngo")
+
+
+def year_period(year):
+    """Aware ``[start, end)`` datetimes covering calendar ``year``."""
+    return timezone.make_aware(datetime(year, 1, 1)), timezone.make_aware(datetime(year + 1, 1, 1))
+
+
+def archive_path(year, kind="all"):
+    return os.path.join(settings.STATEMENT_OUTPUT_DIR, f"statements_{year}_{kind}.zip")
+
+
+def list_archives():
+    """Finished archives in STATEMENT_OUTPUT_DIR, newest first (``.part`` files are in progress)."""
+    directory = settings.STATEMENT_OUTPUT_DIR
+    if not os.path.isdir(directory):
+        return []
+    archives = []
+    for name in os.listdir(directory):
+        if name.endswith(".zip"):
+            stat = os.stat(os.path.join(directory, name))
+            archives.append({
+                "name": name,
+                "size": stat.st_size,
+                "modified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone()),
+            })
+    return sorted(archives, key=lambda archive: archive["modified"], reverse=True)
+
+
+def iter_statements(kind, start, end, chunk_size=2000):
+    """Yield one statement dict per donor/NGO with completed donations in [start, end)."""
+    owner = "donor" if kind == "donor" else "campaign__ngo"
+    rows = (
+        NGODonation.objects.filter(payment_status="completed", donated_at__gte=start, donated_at__lt=end)
+        .order_by(f"{owner}_id", "donated_at")
+        .values(
+            "id", "amount", "donated_at", "transaction_id", "is_anonymous",
+            owner_id=F(f"{owner}_id"),
+            owner_name=F(f"{owner}__username"),
+            campaign_title=F("campaign__title"),
+            ngo_name=F("campaign__ngo__ngoprofile__ngo_name"),
+            donor_name=F("donor__username"),
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    for owner_id, group in groupby(rows, key=lambda row: row["owner_id"]):
+        lines = list(group)
+        yield {
+            "kind": kind,
+            "owner_id": owner_id,
+            "owner_name": lines[0]["owner_name"],
+            "period_start": start,
+            "period_end": end,
+            "lines": lines,
+            "total": sum((line["amount"] for line in lines), Decimal("0")),
+            "count": len(lines),
+        }
+
+
+def render_statement(statement):
+    """Worker entry point: returns (archive member name, PDF bytes)."""
+    pdf = render_pdf(STATEMENT_TEMPLATE, {"statement": statement}, getattr(settings, "STATEMENT_PDF_ENGINE", None))
+    name = f"{statement['kind']}s/{statement['kind']}_{statement['owner_id']}_{statement['owner_name']}.pdf"
+    return name, pdf
+
+
+def generate_statements(output_path, start, end, kinds=KINDS, processes=None, chunk_size=2000):
+    """
+    Render statements for ``kinds`` into a zip archive at ``output_path``.
+    Returns the number of statements written.
+    """
+    processes = processes or getattr(settings, "STATEMENT_PROCESSES", None) or os.cpu_count()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.part"
+
+    def statements():
+        for kind in kinds:
+            yield from iter_statements(kind, start, end, chunk_size)
+
+    written = 0
+    # Feed the pool a bounded window at a time; Pool.imap would drain the whole
+    # generator (and the DB cursor) into its task queue up front.
+    window = processes * 16
+    # "spawn" keeps workers independent of the parent's threads and open DB connections.
+    # The initializer must not live in this module: unpickling it would import the
+    # models before the worker has set Django up.
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Pool(processes, initializer=django.setup, initargs=(False,)) as pool, \
+                zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for batch in _batched(statements(), window):
+                for name, pdf in pool.imap_unordered(render_statement, batch, chunksize=4):
+                    archive.writestr(name, pdf)
+                    written += 1
+    except BaseException:
+        # A leftover .part reads as "being generated" in the admin panel
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return written
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_year(year, kind="all", processes=None):
+    """Build the archive for one calendar year; used by the command and the admin panel."""
+    start, end = year_period(year)
+    kinds = KINDS if kind == "all" else (kind,)
+    path = archive_path(year, kind)
+    return path, generate_statements(path, start, end, kinds, processes)
@@ -1,3 +1,445 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from donations.models import Notification, User, UserReward
+from donature import metrics
+from .models import Campaign, NGODonation
+from . import payments, receipts, statements, views
+from .reconciliation import reconcile
+from .gateway import CircuitBreaker, CircuitOpenError, GatewayError, SSLCommerzClient
+from .gateway_stub import StubGateway
+
+TEST_RECEIPT_DIR = tempfile.mkdtemp(prefix="donature-test-receipts-")
+TEST_METRICS_DIR = tempfile.mkdtemp(prefix="donature-test-metrics-")
+_test_settings = override_settings(METRICS_DIR=TEST_METRICS_DIR)
+
+
+def setUpModule():
+    _test_settings.enable()  # every request counts metrics; keep them out of BASE_DIR/var/metrics
+
+
+def tearDownModule():
+    metrics.reset()  # nothing left for the exit-time flush to write
+    _test_settings.disable()
+    shutil.rmtree(TEST_RECEIPT_DIR, ignore_errors=True)
+    shutil.rmtree(TEST_METRICS_DIR, ignore_errors=True)
+
+
+def make_campaign(ngo_username="ngo"):
+    ngo = User.objects.create_user(username=ngo_username, password="pass", user_type="ngo", is_approved=True)
+    return Campaign.objects.create(
+        ngo=ngo, title="Winter Drive", description="Blankets", goal_amount=Decimal("10000"), status="approved",
+    )
+
+
+@override_settings(RECEIPT_CACHE_DIR=TEST_RECEIPT_DIR, BACKGROUND_TASKS_EAGER=True)
+class ReceiptCacheTests(TestCase):
+
+    def setUp(self):
+        shutil.rmtree(TEST_RECEIPT_DIR, ignore_errors=True)  # donation ids are reused between tests
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.donation = NGODonation.objects.create(
+            campaign=make_campaign(), donor=self.donor, amount=Decimal("500"),
+            transaction_id="1_1_abc", payment_status="completed",
+        )
+        self.client.force_login(self.donor)
+
+    def test_receipt_rendered_once_then_served_from_disk(self):
+        render = mock.Mock(wraps=receipts.render_xhtml2pdf)
+        with mock.patch.dict(receipts.ENGINES, {"xhtml2pdf": render}):
+            first = self.client.get(f"/ngos/receipt/{self.donation.id}/")
+            second = self.client.get(f"/ngos/receipt/{self.donation.id}/")
+
+        self.assertEqual(first["Content-Type"], "application/pdf")
+        self.assertEqual(b"".join(first.streaming_content), b"".join(second.streaming_content))
+        self.assertEqual(render.call_count, 1)
+
+    def test_engine_is_part_of_cache_key(self):
+        self.assertNotEqual(
+            receipts.receipt_path(self.donation.id, "xhtml2pdf"),
+            receipts.receipt_path(self.donation.id, "weasyprint"),
+        )
+
+
+class StatementTests(TestCase):
+
+    def setUp(self):
+        self.campaign = make_campaign()
+        self.alice = User.objects.create_user(username="alice", password="pass", user_type="donor/recipient")
+        self.bob = User.objects.create_user(username="bob", password="pass", user_type="donor/recipient")
+        for i, (donor, amount, status) in enumerate([
+            (self.alice, "100", "completed"),
+            (self.alice, "250", "completed"),
+            (self.bob, "40", "completed"),
+            (self.bob, "999", "pending"),
+        ]):
+            NGODonation.objects.create(
+                campaign=self.campaign, donor=donor, amount=Decimal(amount),
+                transaction_id=f"tx_{i}", payment_status=status,
+            )
+        self.start, self.end = statements.year_period(timezone.now().year)
+
+    def test_statements_grouped_per_owner_with_completed_donations_only(self):
+        donor_statements = {s["owner_name"]: s for s in statements.iter_statements("donor", self.start, self.end)}
+        self.assertEqual(donor_statements["alice"]["total"], Decimal("350"))
+        self.assertEqual(donor_statements["alice"]["count"], 2)
+        self.assertEqual(donor_statements["bob"]["total"], Decimal("40"))
+
+        (ngo_statement,) = statements.iter_statements("ngo", self.start, self.end)
+        self.assertEqual(ngo_statement["owner_name"], "ngo")
+        self.assertEqual(ngo_statement["count"], 3)
+
+    def test_period_excludes_other_years(self):
+        NGODonation.objects.update(donated_at=timezone.make_aware(datetime(2001, 6, 1)))
+        self.assertEqual(list(statements.iter_statements("donor", self.start, self.end)), [])
+
+    def test_generate_statements_writes_zip_archive(self):
+        output = os.path.join(TEST_RECEIPT_DIR, "statements.zip")
+        written = statements.generate_statements(output, self.start, self.end, processes=1)
+
+        self.assertEqual(written, 3)
+        with zipfile.ZipFile(output) as archive:
+            names = sorted(archive.namelist())
+            self.assertTrue(archive.read(names[0]).startswith(b"%PDF"))
+        self.assertEqual(len(names), 3)
+        self.assertTrue(any(name.startswith("ngos/") for name in names))
+        self.assertFalse(os.path.exists(output + ".part"))
+
+    def test_failed_run_leaves_no_part_file(self):
+        output = os.path.join(TEST_RECEIPT_DIR, "failed.zip")
+        with mock.patch.object(statements, "iter_statements", side_effect=RuntimeError("db went away")):
+            with self.assertRaises(RuntimeError):
+                statements.generate_statements(output, self.start, self.end, processes=1)
+        self.assertFalse(os.path.exists(output + ".part"))
+        self.assertFalse(os.path.exists(output))
+
+
+@override_settings(RECEIPT_CACHE_DIR=TEST_RECEIPT_DIR)
+class PendingDonationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.campaign = make_campaign()
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.paid = NGODonation.objects.create(
+            campaign=self.campaign, donor=self.donor, amount=Decimal("300"),
+            transaction_id="t_paid", payment_status="completed",
+        )
+        self.pending = NGODonation.objects.create(
+            campaign=self.campaign, donor=self.donor, amount=Decimal("7777"),
+            transaction_id="t_pending", payment_status="pending",
+        )
+
+    def test_pending_donations_are_not_counted_listed_or_receipted(self):
+        response = self.client.get(f"/ngos/campaign/{self.campaign.id}/")
+        self.assertEqual(response.context["campaign"].donors_count, 1)
+        self.assertEqual(response.context["campaign"].total_raised, Decimal("300"))
+        self.assertNotContains(response, "7777")
+
+        explore = self.client.get("/ngos/explore-campaigns/")
+        self.assertEqual(explore.context["campaigns"][0].donors_count, 1)
+
+        self.client.force_login(self.donor)
+        self.assertEqual(list(self.client.get("/my-donations/").context["donated_to_campaigns"]), [self.paid])
+        self.assertEqual(self.client.get(f"/ngos/receipt/{self.pending.id}/").status_code, 404)
+
+        self.client.force_login(self.campaign.ngo)
+        self.assertEqual(list(self.client.get("/ngos/donation-history/").context["donations"]), [self.paid])
+
+
+class GatewayClientTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def make_client(self, **kwargs):
+        kwargs.setdefault("backoff", 0)
+        return SSLCommerzClient(self.stub.url, "store", "pass", **kwargs)
+
+    def test_initiation_returns_gateway_page(self):
+        url = self.make_client().initiate_payment({"tran_id": "1_1_abc", "total_amount": 100})
+        self.assertTrue(url.startswith(f"{self.stub.url}/pay/"))
+
+    def test_transient_errors_are_retried(self):
+        self.stub.fail_next(2)
+        self.make_client(retries=2).initiate_payment({"tran_id": "1_1_abc", "total_amount": 100})
+
+    def test_circuit_opens_after_repeated_failures(self):
+        client = self.make_client(retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        self.stub.fail_next(2)
+        for _ in range(2):
+            with self.assertRaises(GatewayError):
+                client.initiate_payment({"tran_id": "1_1_abc", "total_amount": 100})
+
+        seen = self.stub.requests
+        with self.assertRaises(CircuitOpenError):
+            client.initiate_payment({"tran_id": "1_1_abc", "total_amount": 100})
+        self.assertEqual(self.stub.requests, seen)
+
+    def test_half_open_circuit_closes_after_successful_trial(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        now[0] = 31
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()  # only one trial call at a time
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_donate_redirects_to_gateway(self):
+        campaign = make_campaign()
+        donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.client.force_login(donor)
+        with override_settings(SSL_COMMERZ_API_URL=self.stub.url):
+            response = self.client.post(f"/ngos/campaign/{campaign.id}/donate/", {"amount": "250", "payment_method": "card"})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith(f"{self.stub.url}/pay/"))
+        self.assertEqual(NGODonation.objects.get(donor=donor).payment_status, "pending")
+
+    async def test_async_donate_redirects_to_gateway(self):
+        campaign = await sync_to_async(make_campaign)()
+        donor = await User.objects.acreate(username="donor", user_type="donor/recipient")
+        request = AsyncRequestFactory().post(
+            f"/ngos/campaign/{campaign.id}/donate/", {"amount": "250", "payment_method": "card"}
+        )
+        request.user = donor
+
+        async def auser():
+            return donor
+        request.auser = auser
+
+        with override_settings(SSL_COMMERZ_API_URL=self.stub.url):
+            response = await views.donate_to_campaign_async(request, campaign_id=campaign.id)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith(f"{self.stub.url}/pay/"))
+        donation = await NGODonation.objects.aget(donor=donor)
+        self.assertEqual(donation.payment_status, "pending")
+
+
+@override_settings(RECEIPT_CACHE_DIR=TEST_RECEIPT_DIR, BACKGROUND_TASKS_EAGER=True)
+class PaymentSettlementTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(override_settings(SSL_COMMERZ_API_URL=self.stub.url, SSL_COMMERZ_BACKOFF=0))
+        self.campaign = make_campaign()
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.tran_id = f"{self.campaign.id}_{self.donor.id}_abc123"
+        self.stub.initiate({"tran_id": self.tran_id, "total_amount": "500.00", "value_b": "Hi"})
+        val_id = self.stub.pay(self.tran_id)
+        self.callback = {"tran_id": self.tran_id, "val_id": val_id, "status": "VALID", "amount": "500.00"}
+        self.pending = NGODonation.objects.create(  # as donate_to_campaign records it before redirecting
+            campaign=self.campaign, donor=self.donor, amount=Decimal("500"), transaction_id=self.tran_id,
+            payment_method="SSLCommerz", payment_status="pending",
+        )
+
+    def assert_settled_once(self):
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.collected_amount, Decimal("500"))
+        self.assertEqual(NGODonation.objects.filter(transaction_id=self.tran_id).count(), 1)
+        self.assertEqual(UserReward.objects.get(user=self.donor).points, payments.DONATION_REWARD_POINTS)
+        self.assertEqual(Notification.objects.filter(user=self.campaign.ngo).count(), 1)
+
+    def test_replayed_success_callback_is_idempotent(self):
+        first = self.client.post("/ngos/ssl-success/", self.callback)
+        second = self.client.post("/ngos/ssl-success/", self.callback)
+
+        self.assertEqual(first["Location"], second["Location"])
+        self.assert_settled_once()
+
+    def test_replay_skips_database_once_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            donation_id = payments.settle_callback(self.callback)
+        with self.assertNumQueries(0):
+            self.assertEqual(payments.settle_callback(self.callback), donation_id)
+
+    def test_replay_with_cold_cache_does_no_side_effects(self):
+        payments.settle_callback(self.callback)
+        cache.clear()
+        payments.settle_callback(self.callback)
+        self.assert_settled_once()
+
+    def test_ipn_and_success_callback_settle_the_same_donation(self):
+        self.assertEqual(self.client.post("/ngos/ssl-ipn/", self.callback).status_code, 200)
+        self.client.get("/ngos/ssl-success/", self.callback)
+        self.assert_settled_once()
+
+    def test_pending_donation_is_counted_when_settled(self):
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.collected_amount, 0)
+
+        payments.settle_callback(self.callback)
+        self.assert_settled_once()
+
+    def test_failed_status_and_bad_tran_id_are_rejected(self):
+        self.assertEqual(self.client.post("/ngos/ssl-ipn/", {**self.callback, "status": "FAILED"}).status_code, 400)
+        self.assertEqual(self.client.post("/ngos/ssl-ipn/", {**self.callback, "tran_id": "nope"}).status_code, 400)
+        self.assertFalse(NGODonation.objects.completed().exists())
+
+    def test_unverified_callbacks_are_rejected(self):
+        pending = NGODonation.objects.create(
+            campaign=self.campaign, donor=self.donor, amount=Decimal("900"),
+            transaction_id=f"{self.campaign.id}_{self.donor.id}_other", payment_status="pending",
+        )
+        self.stub.initiate({"tran_id": pending.transaction_id, "total_amount": "900"})
+        forged = [
+            {**self.callback, "val_id": ""},                               # no val_id at all
+            {**self.callback, "val_id": "made-up"},                        # unknown to the gateway
+            {**self.callback, "tran_id": pending.transaction_id},          # someone else's val_id
+        ]
+        for callback in forged:
+            self.assertEqual(self.client.post("/ngos/ssl-ipn/", callback).status_code, 400)
+
+        unpaid = {**self.callback, "tran_id": pending.transaction_id,
+                  "val_id": self.stub.transactions[pending.transaction_id]["val_id"]}
+        self.assertEqual(self.client.post("/ngos/ssl-ipn/", unpaid).status_code, 400)  # still PENDING there
+        self.assertEqual(NGODonation.objects.get(pk=pending.pk).payment_status, "pending")
+        self.assertFalse(UserReward.objects.filter(user=self.donor).exists())
+
+    def test_amount_mismatch_is_rejected(self):
+        NGODonation.objects.filter(pk=self.pending.pk).update(amount=Decimal("5000"))
+        with self.assertRaisesMessage(payments.PaymentError, "does not match"):
+            payments.settle_callback(self.callback)
+        self.assertEqual(NGODonation.objects.get().payment_status, "pending")
+
+    def test_callback_without_a_pending_donation_is_rejected(self):
+        NGODonation.objects.all().delete()
+        with self.assertLogs("ngos.payments", "WARNING"), \
+                self.assertRaisesMessage(payments.PaymentError, "No donation was started"):
+            payments.settle_callback(self.callback)
+        self.assertFalse(NGODonation.objects.exists())
+
+
+@override_settings(RECEIPT_CACHE_DIR=TEST_RECEIPT_DIR, BACKGROUND_TASKS_EAGER=True)
+class ReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubGateway().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.campaign = make_campaign()
+        self.gateway = SSLCommerzClient(self.stub.url, "store", "pass", backoff=0)
+
+    def initiate(self, username, amount="100"):
+        donor = User.objects.create_user(username=username, password="pass", user_type="donor/recipient")
+        self.client.force_login(donor)
+        with override_settings(SSL_COMMERZ_API_URL=self.stub.url):
+            self.client.post(f"/ngos/campaign/{self.campaign.id}/donate/", {"amount": amount, "payment_method": "card"})
+        return NGODonation.objects.get(donor=donor).transaction_id
+
+    def age_pending(self, **delta):
+        NGODonation.objects.update(donated_at=timezone.now() - timedelta(**delta))
+
+    def test_stale_pending_donations_are_settled_or_failed(self):
+        paid = self.initiate("paid", "300")
+        cancelled = self.initiate("cancelled")
+        abandoned = self.initiate("abandoned")
+        self.stub.pay(paid)
+        self.stub.pay(cancelled, "CANCELLED")
+        self.age_pending(hours=1)
+
+        outcome = reconcile(client=self.gateway)
+
+        self.assertEqual(outcome, {"settled": 1, "failed": 1, "pending": 1})
+        statuses = dict(NGODonation.objects.values_list("transaction_id", "payment_status"))
+        self.assertEqual(statuses, {paid: "completed", cancelled: "failed", abandoned: "pending"})
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.collected_amount, Decimal("300"))
+
+    def test_recent_and_expired_pending_donations(self):
+        recent = self.initiate("recent")
+        self.stub.pay(recent)
+        self.assertEqual(reconcile(client=self.gateway), {})
+
+        self.age_pending(days=2)
+        self.stub.pay(recent, "PENDING")
+        reconcile(client=self.gateway)
+        self.assertEqual(NGODonation.objects.get(transaction_id=recent).payment_status, "failed")
+
+    def test_amount_mismatch_is_left_pending(self):
+        tran_id = self.initiate("donor")
+        self.stub.transactions[tran_id]["form"]["total_amount"] = "1.0"
+        self.stub.pay(tran_id)
+        self.age_pending(hours=1)
+
+        with self.assertLogs("ngos.reconciliation", "WARNING"):
+            self.assertEqual(reconcile(client=self.gateway), {"mismatch": 1})
+        self.assertEqual(NGODonation.objects.get(transaction_id=tran_id).payment_status, "pending")
+
+
+class CampaignCardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.campaign = make_campaign()
+        self.donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        self.client.force_login(self.donor)  # logged in: no full-page cache
+
+    def explore(self):
+        return self.client.get("/ngos/explore-campaigns/").content.decode()
+
+    def test_unchanged_cards_render_from_cache(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.assertIn("Winter Drive", self.explore())
+        with CaptureQueriesContext(connection) as warm:
+            self.explore()
+        self.assertLess(len(warm), len(cold))  # the NGO profile lookups are skipped
+
+    def test_donation_refreshes_the_card(self):
+        self.explore()
+        NGODonation.objects.create(campaign=self.campaign, donor=self.donor, amount=Decimal("250"),
+                                   transaction_id="t1", payment_status="completed")
+        self.assertIn("৳250.00", self.explore())
+
+
+class CampaignConditionalGetTests(TestCase):
+
+    def test_donation_changes_the_etag(self):
+        campaign = make_campaign()
+        donor = User.objects.create_user(username="donor", password="pass", user_type="donor/recipient")
+        url = f"/ngos/campaign/{campaign.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+
+        NGODonation.objects.create(campaign=campaign, donor=donor, amount=Decimal("100"), transaction_id="t1")
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 200)
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Served through donature/asgi.py, the async variant doesn't hold a worker during the gateway call
+donate_view = views.donate_to_campaign_async if settings.ASYNC_PAYMENT_INITIATION else views.donate_to_campaign
+
 urlpatterns = [
 
     # ===== NGO Campaign Management =====
@@ -10,7 +14,7 @@ urlpatterns = [
     path("my-campaigns/", views.my_campaigns, name="my_campaigns"),
     path('explore-campaigns/', views.explore_campaigns, name='explore_campaigns'),
     path('campaign/<int:campaign_id>/', views.campaign_detail, name='campaign_detail'),
-    path("campaign/<int:campaign_id>/donate/", views.donate_to_campaign, name="donate_to_campaign"),
+    path("campaign/<int:campaign_id>/donate/", donate_view, name="donate_to_campaign"),
     path('campaign/<int:campaign_id>/add-update/', views.add_campaign_update, name='add_campaign_update'),
 
     # ===== Donation / Receipt =====
@@ -21,6 +25,7 @@ urlpatterns = [
     path('ssl-success/', views.ssl_success, name='ssl_success'),
     path('ssl-fail/', views.ssl_fail, name='ssl_fail'),
     path('ssl-cancel/', views.ssl_cancel, name='ssl_cancel'),
+    path('ssl-ipn/', views.ssl_ipn, name='ssl_ipn'),
 
     path('donation-success/<int:donation_id>/', views.donation_success_page, name='donation_success_page'),
 path('donation-error/', views.donation_error_page, name='donation_error_page'),
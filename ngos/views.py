@@ -1,4 +1,5 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Campaign, NGODonation
@@ -10,24 +11,30 @@ from django.db.models import Count, Sum
 from django.utils import timezone
 from django.db.models import Q, Count,F
 
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-import io
+from django.http import HttpResponse, HttpResponseBadRequest, FileResponse
+from django.views.decorators.http import require_POST
 from .models import NGODonation
+from .gateway import GatewayError, get_client
+from .payments import PaymentError, settle_callback
+from .receipts import ReceiptError, get_receipt_path
 from donations.models import Notification
+from donations.pagecache import cache_anonymous_page
+from donations.conditional import activity, conditional_page, latest
+from donature.db_router import replica_reads
 from django.urls import reverse
 
 
 from decimal import Decimal
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-import requests
 import uuid
 from django.contrib.auth import get_user_model
 from django.shortcuts import redirect
 from urllib.parse import urlencode
 
+# Donor counts and totals only include paid donations
+COMPLETED_DONATIONS = Q(donations__payment_status='completed')
+
 @login_required
 def create_campaign(request):
     if request.user.user_type != 'ngo':
@@ -105,6 +112,8 @@ def my_campaigns(request):
 
 
 
+@replica_reads
+@cache_anonymous_page("campaigns")
 def explore_campaigns(request):
     # Filters
     search_query = request.GET.get('q', '')
@@ -131,7 +140,7 @@ def explore_campaigns(request):
         campaigns = campaigns.filter(ngo__id=selected_ngo)
 
     # Annotate donors count
-    campaigns = campaigns.annotate(donors_count=Count('donations'))
+    campaigns = campaigns.annotate(donors_count=Count('donations', filter=COMPLETED_DONATIONS))
 
     # Order by approved_at descending (latest first) → fixes UnorderedObjectListWarning
     campaigns = campaigns.order_by('-approved_at')
@@ -166,12 +175,26 @@ def explore_campaigns(request):
     return render(request, 'ngos/explore_campaigns.html', context)
 
 
+def campaign_validators(request, campaign_id):
+    """updated_at moves with every donation (see signals), collected_amount guards direct SQL edits"""
+    campaign = Campaign.objects.filter(
+        id=campaign_id, status='approved', is_active=True
+    ).values_list('updated_at', 'collected_amount').first()
+    if campaign is None:
+        return None
+    updated_at, collected_amount = campaign
+    updates = activity(CampaignUpdate.objects.filter(campaign_id=campaign_id), 'created_at')
+    return [updated_at, str(collected_amount), updates], latest(updated_at, updates[1])
+
+
+@replica_reads
+@conditional_page(campaign_validators)
 def campaign_detail(request, campaign_id):
     # Get campaign
     campaign = get_object_or_404(
         Campaign.objects.annotate(
-            donors_count=Count('donations'),
-            total_raised=Sum('donations__amount')
+            donors_count=Count('donations', filter=COMPLETED_DONATIONS),
+            total_raised=Sum('donations__amount', filter=COMPLETED_DONATIONS)
         ),
         id=campaign_id,
         status='approved',
@@ -187,7 +210,7 @@ def campaign_detail(request, campaign_id):
 
 
     # Donations for this campaign
-    donations = NGODonation.objects.filter(campaign=campaign).order_by('-donated_at')
+    donations = NGODonation.objects.completed().filter(campaign=campaign).select_related('donor').order_by('-donated_at')
 
     # Updates for this campaign (optional)
     updates = CampaignUpdate.objects.filter(campaign=campaign).order_by('-created_at')
@@ -204,6 +227,60 @@ def campaign_detail(request, campaign_id):
 
 
 
+def start_donation(request, campaign, form):
+    """Record the pending donation for a valid form; returns the SSLCommerz initiation data."""
+    amount = form.cleaned_data['amount']
+    is_anonymous = form.cleaned_data.get('is_anonymous', False)
+    payer_name = '' if is_anonymous else form.cleaned_data.get('payer_name', '')
+    account_input = '' if is_anonymous else form.cleaned_data.get('account_input', '')
+    message = form.cleaned_data.get('message', '')
+    tran_id = f"{campaign.id}_{request.user.id}_{uuid.uuid4().hex[:8]}"  # Unique ID
+
+    # Recorded before redirecting so callbacks and reconcile_payments have a row to settle
+    NGODonation.objects.create(
+        campaign=campaign,
+        donor=request.user,
+        amount=amount,
+        transaction_id=tran_id,
+        payment_method="SSLCommerz",
+        payment_status="pending",
+        message=message,
+        payer_name=payer_name,
+        account_input=account_input,
+        is_anonymous=is_anonymous,
+    )
+
+    # SSLCommerz request data (store credentials are added by the gateway client)
+    return {
+        "total_amount": float(amount),
+        "currency": "BDT",
+        "tran_id": tran_id,
+        "success_url": request.build_absolute_uri(reverse('ssl_success')),
+        "fail_url": request.build_absolute_uri(reverse('ssl_fail')),
+        "cancel_url": request.build_absolute_uri(reverse('ssl_cancel')),
+        "ipn_url": request.build_absolute_uri(reverse('ssl_ipn')),
+        "cus_name": request.user.username,
+        "cus_email": request.user.email or 'test@test.com',
+        "cus_add1": "Dhaka",
+        "cus_city": "Dhaka",
+        "cus_postcode": "1200",
+        "cus_country": "Bangladesh",
+        "cus_phone": "01700000000",
+        "product_name": campaign.title,
+        "product_category": "Donation",
+        "product_profile": "non-physical-goods",
+        "value_a": str(campaign.id),
+        "shipping_method": "NO",
+        "value_b": message,  # <-- message passed here
+        "value_c": str(is_anonymous),  # <-- pass anonymous flag
+    }
+
+
+def initiation_failed(request, tran_id, error):
+    NGODonation.objects.filter(transaction_id=tran_id).update(payment_status="failed")
+    messages.error(request, f"Payment error: {error}")
+
+
 @login_required
 def donate_to_campaign(request, campaign_id):
     campaign = get_object_or_404(Campaign, id=campaign_id, status="approved", is_active=True)
@@ -215,109 +292,63 @@ def donate_to_campaign(request, campaign_id):
     form = NGODonationForm(request.POST or None)
 
     if request.method == "POST" and form.is_valid():
-        amount = form.cleaned_data['amount']
-        is_anonymous = form.cleaned_data.get('is_anonymous', False)
-        payer_name = '' if is_anonymous else form.cleaned_data.get('payer_name', '')
-        account_input = '' if is_anonymous else form.cleaned_data.get('account_input', '')
-        message = form.cleaned_data.get('message', '')
-        tran_id = f"{campaign.id}_{request.user.id}_{uuid.uuid4().hex[:8]}"  # Unique ID
-        
-
-        # SSLCommerz request data
-        data = {
-            "store_id": settings.SSL_COMMERZ_STORE_ID,
-            "store_passwd": settings.SSL_COMMERZ_STORE_PASS,
-            "total_amount": float(amount),
-            "currency": "BDT",
-            "tran_id": tran_id,
-            "success_url": request.build_absolute_uri(reverse('ssl_success')),
-            "fail_url": request.build_absolute_uri(reverse('ssl_fail')),
-            "cancel_url": request.build_absolute_uri(reverse('ssl_cancel')),
-            "cus_name": request.user.username,
-            "cus_email": request.user.email or 'test@test.com',
-            "cus_add1": "Dhaka",
-            "cus_city": "Dhaka",
-            "cus_postcode": "1200",
-            "cus_country": "Bangladesh",
-            "cus_phone": "01700000000",
-            "product_name": campaign.title,
-            "product_category": "Donation",
-            "product_profile": "non-physical-goods",
-            "value_a": str(campaign.id),
-            "shipping_method": "NO",
-            "value_b": message,  # <-- message passed here
-            "value_c": str(is_anonymous),  # <-- pass anonymous flag
-        }
-
+        data = start_donation(request, campaign, form)
         try:
-            url = "https://sandbox.sslcommerz.com/gwprocess/v4/api.php"
-            response = requests.post(url, data=data, timeout=10)
-            res_json = response.json()
-            gateway_url = res_json.get("GatewayPageURL")
-
-            if gateway_url:
-                return redirect(gateway_url)
-            else:
-                messages.error(request, "Payment initiation failed. Try again.")
-        except Exception as e:
-            messages.error(request, f"Payment error: {e}")
+            return redirect(get_client().initiate_payment(data))
+        except GatewayError as e:
+            initiation_failed(request, data["tran_id"], e)
 
     return render(request, "ngos/donate_to_campaign.html", {"campaign": campaign, "form": form})
 
+
+@login_required
+async def donate_to_campaign_async(request, campaign_id):
+    """
+    donate_to_campaign for ASGI deployments (ASYNC_PAYMENT_INITIATION): the gateway
+    round trip runs on a worker thread, so the event loop keeps serving other
+    donors meanwhile instead of a whole WSGI worker waiting on SSLCommerz.
+    """
+    campaign = await aget_object_or_404(Campaign, id=campaign_id, status="approved", is_active=True)
+    user = await request.auser()
+
+    if user.id == campaign.ngo_id:
+        messages.error(request, "⚠️ You cannot donate to your own campaign.")
+        return redirect("campaign_detail", campaign_id=campaign.id)
+
+    form = NGODonationForm(request.POST or None)
+
+    if request.method == "POST" and await sync_to_async(form.is_valid)():
+        data = await sync_to_async(start_donation)(request, campaign, form)
+        try:
+            # Not thread-sensitive: initiations must not queue behind each other on the ORM thread.
+            gateway_url = await sync_to_async(get_client().initiate_payment, thread_sensitive=False)(data)
+            return redirect(gateway_url)
+        except GatewayError as e:
+            await sync_to_async(initiation_failed)(request, data["tran_id"], e)
+
+    return await sync_to_async(render)(request, "ngos/donate_to_campaign.html", {"campaign": campaign, "form": form})
+
 # ===== Callbacks =====
 
 @csrf_exempt
 def ssl_success(request):
     data = request.POST or request.GET
-    tran_id = data.get("tran_id")
-    status = str(data.get("status", "")).strip().upper()
-    amount_str = data.get("amount", "0")
     try:
-        amount = Decimal(amount_str)
-    except:
-        amount = Decimal(0)
+        donation_id = settle_callback(data)
+    except PaymentError as e:
+        return redirect(reverse('donation_error_page') + "?" + urlencode({"msg": str(e)}))
+    return redirect('donation_success_page', donation_id=donation_id)
 
-    # ✅ Only proceed if status is VALID or SUCCESS
-    if status not in ["VALID", "SUCCESS"]:
-        return redirect(reverse('donation_error_page') + "?" + urlencode({"msg": f"Payment failed (status={status})"}))
 
-    # Validate tran_id
+@csrf_exempt
+@require_POST
+def ssl_ipn(request):
+    """Server-to-server notification; settles the payment even if the donor never returns to us."""
     try:
-        campaign_id, user_id, _ = tran_id.split("_")
-    except Exception:
-        return redirect(reverse('donation_error_page') + "?" + urlencode({"msg": "Invalid transaction ID format."}))
-
-    campaign = get_object_or_404(Campaign, id=campaign_id)
-    User = get_user_model()
-    donor = get_object_or_404(User, id=user_id)
-
-    donation_message = data.get("value_b", "")
-    is_anonymous = data.get("value_c", "False") == "True"  # convert string to boolean
-
-    # Create donation (success only)
-    donation = NGODonation.objects.create(
-        campaign=campaign,
-        donor=donor,
-        amount=amount,
-        transaction_id=tran_id,
-        payment_method="SSLCommerz",
-        payment_status="completed",
-        message=donation_message,
-        is_anonymous=is_anonymous
-    )
-
-    # Reward points
-    user_reward, _ = UserReward.objects.get_or_create(user=donor)
-    user_reward.add_points(30)
-
-    # Notification to NGO
-    Notification.objects.create(
-        user=campaign.ngo,
-        message=f"{donor.username} donated ৳{amount} to your campaign '{campaign.title}'",
-        link=reverse('campaign_detail', args=[campaign.id])
-    )
-
-    return redirect('donation_success_page', donation_id=donation.id)
+        settle_callback(request.POST)
+    except PaymentError as e:
+        return HttpResponseBadRequest(str(e))
+    return HttpResponse("OK")
 
 
 @csrf_exempt
@@ -364,19 +395,20 @@ def donation_error_page(request):
 
 @login_required
 def download_receipt(request, donation_id):
-    donation = get_object_or_404(NGODonation, id=donation_id, donor=request.user)
-
-    template = get_template("ngos/receipt_pdf.html")
-    html = template.render({"donation": donation})
-
-    result = io.BytesIO()
-    pdf = pisa.pisaDocument(io.BytesIO(html.encode("UTF-8")), result)
+    # Only paid donations have a receipt
+    donation = get_object_or_404(NGODonation.objects.completed(), id=donation_id, donor=request.user)
 
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type="application/pdf")
-        response['Content-Disposition'] = f'attachment; filename="receipt_{donation.id}.pdf"'
-        return response
-    return HttpResponse("Error generating PDF", status=500)
+    try:
+        path = get_receipt_path(donation)
+    except ReceiptError:
+        return HttpResponse("Error generating PDF", status=500)
+
+    return FileResponse(
+        open(path, "rb"),
+        as_attachment=True,
+        filename=f"receipt_{donation.id}.pdf",
+        content_type="application/pdf",
+    )
 
 
 
@@ -415,7 +447,7 @@ def ngo_donation_history(request):
         return render(request, '403.html')  # or redirect with message
 
     # Get all donations to campaigns of this NGO
-    donations = NGODonation.objects.filter(campaign__ngo=request.user).order_by('-donated_at')
+    donations = NGODonation.objects.completed().filter(campaign__ngo=request.user).order_by('-donated_at')
 
     context = {
         'donations': donations,